@@ -0,0 +1,64 @@
+import hashlib
+from django.conf import settings
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.decorators import method_decorator
+from django.utils.http import quote_etag
+
+PROCESS_LOCAL_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+def cache_is_shared(alias='default'):
+    """Кэш общий для всех воркеров (Redis, Memcached, БД), а не память процесса"""
+    return settings.CACHES[alias]['BACKEND'] not in PROCESS_LOCAL_BACKENDS
+
+
+def cache_policy(max_age=0, stale_while_revalidate=0, etag=None, public=True):
+    """
+    HTTP-кэширование GET-ответов view (функции или класса).
+
+    etag - функция (request, *args, **kwargs) -> версия ресурса. Если она задана,
+    условный запрос получает 304 до выполнения view; иначе ETag считается
+    по телу ответа, и 304 экономит только трафик.
+    """
+    def apply_headers(response, tag):
+        response['ETag'] = tag
+        visibility = {'public': True} if public else {'private': True}
+        patch_cache_control(
+            response,
+            max_age=max_age,
+            stale_while_revalidate=stale_while_revalidate,
+            **visibility,
+        )
+        return response
+
+    def decorator(func):
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return func(request, *args, **kwargs)
+
+            tag = None
+            if etag is not None:
+                version = etag(request, *args, **kwargs)
+                if version is not None:
+                    tag = quote_etag(str(version))
+                    not_modified = get_conditional_response(request, etag=tag)
+                    if not_modified is not None:
+                        return apply_headers(not_modified, tag)
+
+            response = func(request, *args, **kwargs)
+            if response.status_code != 200 or response.streaming:
+                return response
+            if tag is None:
+                tag = quote_etag(hashlib.sha256(response.content).hexdigest()[:32])
+            apply_headers(response, tag)
+            return get_conditional_response(request, etag=tag, response=response)
+        return wrapper
+
+    def decorate(view):
+        if isinstance(view, type):
+            return method_decorator(decorator, name='get')(view)
+        return decorator(view)
+    return decorate
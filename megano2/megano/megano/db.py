@@ -0,0 +1,30 @@
+import functools
+import random
+import time
+from django.db import OperationalError, transaction
+
+LOCKED_MESSAGES = ('database is locked', 'database table is locked')
+
+
+def is_lock_error(error):
+    return any(message in str(error) for message in LOCKED_MESSAGES)
+
+
+def retry_on_lock(attempts=5, base_delay=0.05):
+    """
+    Выполняет функцию в транзакции и повторяет ее с экспоненциальной паузой,
+    если SQLite ответил "database is locked". Остальные ошибки пробрасываются сразу.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            for attempt in range(attempts):
+                try:
+                    with transaction.atomic():
+                        return func(*args, **kwargs)
+                except OperationalError as e:
+                    if not is_lock_error(e) or attempt == attempts - 1:
+                        raise
+                    time.sleep(base_delay * 2 ** attempt * (1 + random.random()))
+        return wrapper
+    return decorator
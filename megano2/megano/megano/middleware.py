@@ -0,0 +1,319 @@
+import gzip
+import hashlib
+import json
+import logging
+import re
+import time
+from collections import Counter
+from contextlib import ExitStack
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+from django.contrib.auth.models import AnonymousUser
+from django.contrib.sessions.backends.base import SessionBase
+from django.http import JsonResponse
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from user.tokens import ACCESS, InvalidToken, bearer_token, read_token, token_user
+from .routers import is_replica_read_view, replica_configured, replica_healthy, use_replica
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+logger = logging.getLogger('megano.queries')
+
+IN_LIST_RE = re.compile(r'IN \((?:%s, )*%s\)')
+LITERAL_RE = re.compile(r"'(?:[^']|'')*'|\b\d+\b")
+# Управление транзакцией - не запрос к данным; под тестами atomic() дает
+# SAVEPOINT/RELEASE вместо BEGIN/COMMIT, и бюджеты считались бы по-разному
+TRANSACTION_RE = re.compile(r'^\s*(?:BEGIN|COMMIT|ROLLBACK|SAVEPOINT|RELEASE)\b', re.IGNORECASE)
+
+
+def session_free(view):
+    """Помечает публичную view (функцию или класс), которой не нужны сессия и пользователь"""
+    view.session_free = True
+    return view
+
+
+def is_session_free_view(view_func):
+    view_class = getattr(view_func, 'view_class', None)
+    return getattr(view_func, 'session_free', False) or getattr(view_class, 'session_free', False)
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+def sql_fingerprint(sql):
+    """SQL без литералов и с свернутыми IN-списками - одинаков для запросов N+1"""
+    sql = IN_LIST_RE.sub('IN (...)', sql)
+    return LITERAL_RE.sub('?', sql)
+
+
+class QueryStats:
+    """execute_wrapper, считающий запросы и время БД за один запрос к API"""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.fingerprints = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - started
+            if not TRANSACTION_RE.match(sql):
+                self.count += 1
+                self.fingerprints[sql_fingerprint(sql)] += 1
+
+    def duplicates(self):
+        return {sql: count for sql, count in self.fingerprints.most_common() if count > 1}
+
+
+class QueryInstrumentationMiddleware:
+    """
+    Пишет число запросов, время БД, дубли SQL и время остального кода
+    (в основном сериализации) для каждого именованного роута.
+    Результат уходит в заголовок Server-Timing и в лог megano.queries.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.enabled = getattr(settings, 'QUERY_INSTRUMENTATION', settings.DEBUG)
+
+    def __call__(self, request):
+        if not self.enabled:
+            return self.get_response(request)
+
+        stats = QueryStats()
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(connections[alias].execute_wrapper(stats))
+            response = self.get_response(request)
+        total = time.perf_counter() - started
+
+        match = getattr(request, 'resolver_match', None)
+        url_name = match.url_name if match else None
+        duplicates = stats.duplicates()
+
+        response['Server-Timing'] = ', '.join([
+            f'db;dur={stats.duration * 1000:.1f};desc="{stats.count} queries"',
+            f'app;dur={(total - stats.duration) * 1000:.1f}',
+            f'total;dur={total * 1000:.1f}',
+        ])
+        logger.info(json.dumps({
+            'url_name': url_name,
+            'method': request.method,
+            'status': response.status_code,
+            'queries': stats.count,
+            'db_ms': round(stats.duration * 1000, 1),
+            'app_ms': round((total - stats.duration) * 1000, 1),
+            'total_ms': round(total * 1000, 1),
+            'duplicates': duplicates,
+        }, ensure_ascii=False))
+
+        self.check_budget(url_name, request.method, stats)
+        return response
+
+    def check_budget(self, url_name, method, stats):
+        """Бюджет "роут:МЕТОД" важнее общего бюджета роута"""
+        budgets = getattr(settings, 'QUERY_BUDGETS', {})
+        budget = budgets.get(f'{url_name}:{method}', budgets.get(url_name))
+        if budget is None or stats.count <= budget:
+            return
+        message = f"{url_name} {method}: {stats.count} queries, budget {budget}"
+        if getattr(settings, 'QUERY_BUDGET_STRICT', False):
+            raise QueryBudgetExceeded(message)
+        logger.warning(message)
+
+
+class ReplicaReadMiddleware:
+    """
+    GET-запросы к view, помеченным replica_read, читают с реплики.
+    После успешной записи посетитель на REPLICA_STICKY_SECONDS закрепляется
+    за основной базой (cookie), чтобы сразу видеть свои изменения.
+    Реплика с отставанием больше REPLICA_MAX_LAG не используется.
+    """
+    cookie_name = 'read_primary'
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request._replica_token = None
+        try:
+            response = self.get_response(request)
+        finally:
+            if request._replica_token is not None:
+                use_replica.reset(request._replica_token)
+
+        if (replica_configured() and request.method not in ('GET', 'HEAD', 'OPTIONS')
+                and response.status_code < 400):
+            response.set_cookie(
+                self.cookie_name, '1',
+                max_age=getattr(settings, 'REPLICA_STICKY_SECONDS', 10),
+                httponly=True,
+                samesite='Lax',
+            )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if (request.method in ('GET', 'HEAD')
+                and replica_configured()
+                and is_replica_read_view(view_func)
+                and self.cookie_name not in request.COOKIES
+                and replica_healthy()):
+            request._replica_token = use_replica.set(True)
+
+
+class TokenAuthenticationMiddleware:
+    """
+    Запросы к /api/ с заголовком Authorization: Bearer аутентифицируются
+    по подписанному токену без чтения сессии и пользователя из БД.
+    Без заголовка работает обычная сессия (в том числе для admin/).
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.prefix = getattr(settings, 'TOKEN_AUTH_PATH_PREFIX', '/api/')
+
+    def __call__(self, request):
+        request.auth_token = None
+        token = bearer_token(request) if request.path.startswith(self.prefix) else None
+        if token is not None:
+            try:
+                request.auth_token = read_token(token, ACCESS)
+            except InvalidToken as e:
+                return JsonResponse({"error": str(e)}, status=401, headers={'WWW-Authenticate': 'Bearer'})
+            request.user = token_user(request.auth_token)
+            # Токен в заголовке браузер сам не подставит, CSRF здесь не нужен
+            request._dont_enforce_csrf_checks = True
+        return self.get_response(request)
+
+
+class SessionFreeMiddleware:
+    """
+    Для view, помеченных session_free, сессия не читается и не создается:
+    ответ не получает Set-Cookie и Vary: Cookie, а GET кэшируется общими
+    прокси на SESSION_FREE_MAX_AGE секунд, если view не задала свою политику
+    через cache_policy. Стоит перед SessionMiddleware, чтобы чистить
+    заголовки после нее.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.max_age = getattr(settings, 'SESSION_FREE_MAX_AGE', 60)
+
+    def __call__(self, request):
+        request.session_free = False
+        response = self.get_response(request)
+        if not request.session_free:
+            return response
+
+        for name in list(response.cookies):
+            if name == settings.SESSION_COOKIE_NAME:
+                del response.cookies[name]
+        if response.has_header('Vary'):
+            vary = [value.strip() for value in response['Vary'].split(',')]
+            vary = [value for value in vary if value.lower() != 'cookie']
+            if vary:
+                response['Vary'] = ', '.join(vary)
+            else:
+                del response['Vary']
+        if (request.method in ('GET', 'HEAD') and response.status_code == 200
+                and not response.has_header('Cache-Control')):
+            patch_cache_control(response, public=True, max_age=self.max_age)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if not is_session_free_view(view_func):
+            return
+        request.session_free = True
+        # Пустая сессия без ключа: обращение к ней не идет в хранилище
+        request.session = SessionBase()
+        if getattr(request, 'auth_token', None) is None:
+            request.user = AnonymousUser()
+
+
+def accepted_encodings(header):
+    """Кодировки из Accept-Encoding с q > 0; кривой q считается нулем"""
+    accepted = set()
+    for coding in header.split(','):
+        name, *params = [part.strip() for part in coding.split(';')]
+        q = 1.0
+        for param in params:
+            key, _, value = param.partition('=')
+            if key.strip().lower() == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if name and q > 0:
+            accepted.add(name.lower())
+    return accepted
+
+
+def compress(body, encoding):
+    if encoding == 'br':
+        return brotli.compress(body, quality=5)
+    return gzip.compress(body, compresslevel=6, mtime=0)
+
+
+class CompressionMiddleware:
+    """
+    Сжимает ответы больше COMPRESSION_MIN_SIZE байт в br (если установлен
+    пакет brotli) или gzip по Accept-Encoding. Ответы с ETag от cache_policy
+    сжимаются один раз: результат лежит в кэше по URL, ETag и кодировке.
+    """
+    compressible_types = ('application/json', 'text/')
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.min_size = getattr(settings, 'COMPRESSION_MIN_SIZE', 1024)
+        self.cache_timeout = getattr(settings, 'COMPRESSION_CACHE_TIMEOUT', 300)
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if (response.streaming
+                or response.has_header('Content-Encoding')
+                or not response.get('Content-Type', '').startswith(self.compressible_types)
+                or len(response.content) < self.min_size):
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        encoding = self.negotiate(request)
+        if encoding is None:
+            return response
+
+        etag = response.get('ETag')
+        key = None
+        if etag and request.method == 'GET':
+            path_hash = hashlib.sha1(request.get_full_path().encode()).hexdigest()
+            key = f'compressed:{encoding}:{path_hash}:{etag}'
+        body = cache.get(key) if key else None
+        if body is None:
+            body = compress(response.content, encoding)
+            if key:
+                cache.set(key, body, self.cache_timeout)
+        if len(body) >= len(response.content):
+            return response
+
+        response.content = body
+        response['Content-Length'] = str(len(body))
+        response['Content-Encoding'] = encoding
+        if etag and not etag.startswith('W/'):
+            # Тело изменилось, поэтому ETag больше не побайтовый
+            response['ETag'] = f'W/{etag}'
+        return response
+
+    def negotiate(self, request):
+        accepted = accepted_encodings(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        if brotli is not None and 'br' in accepted:
+            return 'br'
+        if 'gzip' in accepted:
+            return 'gzip'
+        return None
@@ -0,0 +1,61 @@
+from django.core.paginator import EmptyPage, Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+
+
+class ApproximateCount(int):
+    """Неточное число строк; в шаблоне админки выводится как «10000+»"""
+    template = '{}+'
+
+    def __str__(self):
+        return self.template.format(int(self))
+
+
+class EstimatedCount(ApproximateCount):
+    template = '~{}'
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Пагинатор для больших таблиц в админке: вместо COUNT(*) по всей таблице
+    берет оценку PostgreSQL (pg_class.reltuples) для нефильтрованного списка
+    и ограниченный подсчет до max_count строк для остальных случаев.
+    Страница за пределами оценки (?p=) не отбрасывается: для нее строки
+    считаются точно.
+    """
+    max_count = 10000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        estimate = self.estimate_table_rows(queryset)
+        if estimate is not None and estimate > self.max_count:
+            return EstimatedCount(estimate)
+        count = queryset[:self.max_count + 1].count()
+        if count > self.max_count:
+            return ApproximateCount(self.max_count)
+        return count
+
+    def validate_number(self, number):
+        try:
+            return super().validate_number(number)
+        except EmptyPage:
+            if not isinstance(self.count, ApproximateCount):
+                raise
+        self.__dict__['count'] = self.object_list.count()
+        self.__dict__.pop('num_pages', None)
+        return super().validate_number(number)
+
+    def estimate_table_rows(self, queryset):
+        if queryset.query.where or queryset.query.distinct:
+            return None
+        connection = connections[queryset.db]
+        if connection.vendor != 'postgresql':
+            return None
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass",
+                [queryset.model._meta.db_table]
+            )
+            row = cursor.fetchone()
+        return row[0] if row and row[0] > 0 else None
@@ -0,0 +1,96 @@
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from django.conf import settings
+from django.db import DatabaseError, connections
+
+logger = logging.getLogger(__name__)
+
+REPLICA_ALIAS = 'replica'
+
+use_replica = ContextVar('use_replica', default=False)
+
+_lag_checked_at = 0.0
+_replica_healthy = True
+
+
+def replica_configured():
+    return REPLICA_ALIAS in settings.DATABASES
+
+
+def replica_read(view):
+    """Помечает view (функцию или класс) как безопасную для чтения с реплики"""
+    view.replica_read = True
+    return view
+
+
+def is_replica_read_view(view_func):
+    view_class = getattr(view_func, 'view_class', None)
+    return getattr(view_func, 'replica_read', False) or getattr(view_class, 'replica_read', False)
+
+
+def replica_lag():
+    """
+    Отставание реплики в секундах. Если весь полученный WAL уже применен,
+    реплика догнала основную базу: время последней транзакции при простое
+    основной базы растет и не означает отставания.
+    """
+    connection = connections[REPLICA_ALIAS]
+    if connection.vendor != 'postgresql':
+        return 0.0
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT CASE"
+            " WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0"
+            " ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)"
+            " END"
+        )
+        return float(cursor.fetchone()[0])
+
+
+def replica_healthy():
+    """Проверяет отставание не чаще раза в REPLICA_LAG_CHECK_INTERVAL секунд на процесс"""
+    global _lag_checked_at, _replica_healthy
+    now = time.monotonic()
+    if now - _lag_checked_at < getattr(settings, 'REPLICA_LAG_CHECK_INTERVAL', 5):
+        return _replica_healthy
+    _lag_checked_at = now
+    try:
+        lag = replica_lag()
+    except DatabaseError:
+        logger.warning("replica is unavailable, reading from primary", exc_info=True)
+        _replica_healthy = False
+    else:
+        _replica_healthy = lag <= getattr(settings, 'REPLICA_MAX_LAG', 10)
+        if not _replica_healthy:
+            logger.warning("replica lag %.1fs exceeds threshold, reading from primary", lag)
+    return _replica_healthy
+
+
+@contextmanager
+def replica_reads():
+    """Чтения внутри блока уходят на реплику, если она есть"""
+    token = use_replica.set(True)
+    try:
+        yield
+    finally:
+        use_replica.reset(token)
+
+
+class ReplicaRouter:
+    """Запись и миграции - только в default, чтения - на реплику внутри replica_reads()"""
+
+    def db_for_read(self, model, **hints):
+        if use_replica.get() and replica_configured():
+            return REPLICA_ALIAS
+        return 'default'
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == 'default'
@@ -11,7 +11,9 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
 from pathlib import Path
+import base64
 import os
+import sys
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -26,6 +28,9 @@ SECRET_KEY = "django-insecure-*8s$w99ix!yl8^52(gjk(*x@a6h)l1a+jo1-9onda_zag)-n=i
 # SECURITY WARNING: don't run with debug turned on in production!
 DEBUG = True
 
+# Запуск через manage.py test
+TESTING = sys.argv[1:2] == ["test"]
+
 ALLOWED_HOSTS = []
 
 
@@ -46,11 +51,16 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "megano.middleware.QueryInstrumentationMiddleware",
+    "megano.middleware.CompressionMiddleware",
+    "megano.middleware.ReplicaReadMiddleware",
     "django.middleware.security.SecurityMiddleware",
+    "megano.middleware.SessionFreeMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "megano.middleware.TokenAuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
@@ -77,13 +87,100 @@ WSGI_APPLICATION = "megano.wsgi.application"
 
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
-
-DATABASES = {
-    "default": {
-        "ENGINE": "django.db.backends.sqlite3",
-        "NAME": BASE_DIR / "db.sqlite3",
+# DB_ENGINE=postgresql требует psycopg 3: pip install "psycopg[binary,pool]"
+
+DB_ENGINE = os.environ.get("DB_ENGINE", "sqlite")
+
+if DB_ENGINE == "postgresql":
+    DATABASES = {
+        "default": {
+            "ENGINE": "django.db.backends.postgresql",
+            "NAME": os.environ.get("DB_NAME", "megano"),
+            "USER": os.environ.get("DB_USER", "megano"),
+            "PASSWORD": os.environ.get("DB_PASSWORD", ""),
+            "HOST": os.environ.get("DB_HOST", "localhost"),
+            "PORT": os.environ.get("DB_PORT", "5432"),
+            "CONN_MAX_AGE": int(os.environ.get("DB_CONN_MAX_AGE", "60")),
+            "CONN_HEALTH_CHECKS": True,
+            "OPTIONS": {},
+        }
+    }
+    if os.environ.get("DB_POOL") == "True":
+        # Пул psycopg сам держит соединения, постоянные соединения Django с ним несовместимы
+        DATABASES["default"]["CONN_MAX_AGE"] = 0
+        DATABASES["default"]["OPTIONS"]["pool"] = {
+            "min_size": int(os.environ.get("DB_POOL_MIN_SIZE", "2")),
+            "max_size": int(os.environ.get("DB_POOL_MAX_SIZE", "10")),
+        }
+    if os.environ.get("DB_REPLICA_HOST"):
+        DATABASES["replica"] = {
+            **DATABASES["default"],
+            "HOST": os.environ["DB_REPLICA_HOST"],
+            "PORT": os.environ.get("DB_REPLICA_PORT", DATABASES["default"]["PORT"]),
+            "TEST": {"MIRROR": "default"},
+        }
+else:
+    DATABASES = {
+        "default": {
+            "ENGINE": "django.db.backends.sqlite3",
+            "NAME": os.environ.get("DB_NAME", BASE_DIR / "db.sqlite3"),
+        }
+    }
+    if os.environ.get("SQLITE_TUNING") == "True":
+        # WAL позволяет читать во время записи, IMMEDIATE берет блокировку записи в начале
+        # транзакции и не дает ей упасть с "database is locked" при повышении блокировки,
+        # timeout - это busy_timeout в секундах.
+        DATABASES["default"]["OPTIONS"] = {
+            "init_command": (
+                "PRAGMA journal_mode=WAL;"
+                "PRAGMA synchronous=NORMAL;"
+                "PRAGMA mmap_size=134217728;"
+                "PRAGMA cache_size=-20000;"
+                "PRAGMA temp_store=MEMORY;"
+            ),
+            "transaction_mode": "IMMEDIATE",
+            "timeout": int(os.environ.get("SQLITE_BUSY_TIMEOUT", "20")),
+        }
+    if os.environ.get("DB_REPLICA_NAME"):
+        DATABASES["replica"] = {
+            "ENGINE": "django.db.backends.sqlite3",
+            "NAME": os.environ["DB_REPLICA_NAME"],
+            "TEST": {"MIRROR": "default"},
+        }
+
+# Чтения с реплики включаются для view, помеченных megano.routers.replica_read
+DATABASE_ROUTERS = ["megano.routers.ReplicaRouter"]
+REPLICA_MAX_LAG = float(os.environ.get("REPLICA_MAX_LAG", "10"))
+REPLICA_LAG_CHECK_INTERVAL = 5
+REPLICA_STICKY_SECONDS = 10
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+
+if os.environ.get("REDIS_URL"):
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": os.environ["REDIS_URL"],
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        }
     }
-}
+
+
+# Sessions
+# https://docs.djangoproject.com/en/5.2/topics/http/sessions/
+# cached_db читает сессию из кэша и пишет в БД только при изменении,
+# "cache" и "signed_cookies" не обращаются к БД вовсе.
+
+SESSION_ENGINE = os.environ.get(
+    "DJANGO_SESSION_ENGINE", "django.contrib.sessions.backends.cached_db"
+)
 
 
 # Password validation
@@ -104,6 +201,56 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+PASSWORD_HASH_ITERATIONS = int(os.environ.get("PASSWORD_HASH_ITERATIONS", "1000000"))
+PASSWORD_HASHERS = [
+    "user.hashers.ConfigurablePBKDF2PasswordHasher",
+    "django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher",
+    "django.contrib.auth.hashers.Argon2PasswordHasher",
+    "django.contrib.auth.hashers.BCryptSHA256PasswordHasher",
+    "django.contrib.auth.hashers.ScryptPasswordHasher",
+]
+
+# Хэширование паролей идет в общем пуле: AUTH_HASH_WORKERS потоков и
+# AUTH_HASH_QUEUE ожидающих, остальные запросы сразу получают 503
+AUTH_HASH_WORKERS = int(os.environ.get("AUTH_HASH_WORKERS", "4"))
+AUTH_HASH_QUEUE = int(os.environ.get("AUTH_HASH_QUEUE", "16"))
+AUTH_HASH_TIMEOUT = 10
+
+# Ответы меньше порога не сжимаются; сжатые ответы с ETag кэшируются
+COMPRESSION_MIN_SIZE = 1024
+COMPRESSION_CACHE_TIMEOUT = 300
+
+# Cache-Control: max-age для публичных view, помеченных session_free
+SESSION_FREE_MAX_AGE = 60
+
+# Сколько хранится первый ответ на запрос с Idempotency-Key (секунды)
+IDEMPOTENCY_KEY_TTL = 24 * 60 * 60
+
+# Ключ Fernet для order.vault (номера карт), обязателен. Под тестами -
+# случайный ключ на прогон, он нигде не сохраняется
+CARD_VAULT_KEY = os.environ.get("CARD_VAULT_KEY") or (
+    base64.urlsafe_b64encode(os.urandom(32)).decode() if TESTING else None
+)
+
+# Подписанные токены для /api/ (секунды)
+ACCESS_TOKEN_LIFETIME = 15 * 60
+REFRESH_TOKEN_LIFETIME = 14 * 24 * 60 * 60
+
+REST_FRAMEWORK = {
+    "DEFAULT_AUTHENTICATION_CLASSES": [
+        "user.authentication.SignedTokenAuthentication",
+        "rest_framework.authentication.SessionAuthentication",
+        "rest_framework.authentication.BasicAuthentication",
+    ],
+}
+
+# Лимиты входа: (попыток за окно, попыток в секунду в среднем); окно = емкость / скорость.
+# Счетчики лежат в кэше по умолчанию - для нескольких воркеров нужен общий (REDIS_URL)
+SIGN_IN_RATE_LIMITS = {
+    "ip": (20, 0.5),
+    "username": (5, 1 / 60),
+}
+
 
 # Internationalization
 # https://docs.djangoproject.com/en/5.2/topics/i18n/
@@ -124,6 +271,46 @@ STATIC_URL = "static/"
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Query instrumentation
+# Число запросов к БД на роут. С QUERY_BUDGET_STRICT превышение бюджета
+# поднимает QueryBudgetExceeded; под manage.py test он включен всегда,
+# поэтому N+1 сразу роняет тест. Ключ "роут:МЕТОД" задает бюджет для одного метода.
+
+QUERY_INSTRUMENTATION = TESTING or os.environ.get("QUERY_INSTRUMENTATION", str(DEBUG)) == "True"
+QUERY_BUDGET_STRICT = TESTING or os.environ.get("QUERY_BUDGET_STRICT") == "True"
+QUERY_BUDGETS = {
+    "api-home": 10,
+    "api-popular": 4,
+    "api-limited": 4,
+    "api-banners": 2,
+    "api-categories": 3,
+    "api-sales": 3,
+    "api-catalog": 5,
+    "api-tags": 2,
+    "api-basket": 16,
+    "product-detail": 6,
+    "product-reviews": 2,
+    "orders": 8,  # POST с Idempotency-Key: ключ занимается и дописывается отдельно от заказа
+    "order-detail": 5,
+    "profile": 4,
+}
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {
+        "console": {"class": "logging.StreamHandler"},
+    },
+    "loggers": {
+        "megano.queries": {
+            "handlers": ["console"],
+            "level": os.environ.get("QUERY_LOG_LEVEL", "WARNING" if TESTING else "INFO"),
+            "propagate": False,
+        },
+    },
+}
+
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
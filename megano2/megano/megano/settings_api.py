@@ -0,0 +1,32 @@
+"""
+Профиль для воркеров, которые обслуживают только /api/.
+
+Без admin, messages, staticfiles, шаблонов и frontend: воркер не импортирует
+admin-модули приложений и браузерный рендерер DRF.
+Запуск: DJANGO_SETTINGS_MODULE=megano.settings_api gunicorn megano.wsgi
+"""
+
+from .settings import *  # noqa: F401,F403
+from .settings import INSTALLED_APPS, MIDDLEWARE, REST_FRAMEWORK
+
+API_EXCLUDED_APPS = [
+    "django.contrib.admin",
+    "django.contrib.messages",
+    "django.contrib.staticfiles",
+    "frontend",
+]
+INSTALLED_APPS = [app for app in INSTALLED_APPS if app not in API_EXCLUDED_APPS]
+
+MIDDLEWARE = [
+    middleware for middleware in MIDDLEWARE
+    if middleware != "django.contrib.messages.middleware.MessageMiddleware"
+]
+
+ROOT_URLCONF = "megano.urls_api"
+
+TEMPLATES = []
+
+REST_FRAMEWORK = {
+    **REST_FRAMEWORK,
+    "DEFAULT_RENDERER_CLASSES": ["rest_framework.renderers.JSONRenderer"],
+}
@@ -0,0 +1,25 @@
+def requested_fields(request):
+    """Поля из ?fields=id,title,price или None, если клиент их не ограничил"""
+    value = request.GET.get('fields', '')
+    fields = {name.strip() for name in value.split(',') if name.strip()}
+    return fields or None
+
+
+def sparse(data, fields):
+    """Оставляет в словаре (или списке словарей) только запрошенные ключи верхнего уровня"""
+    if not fields:
+        return data
+    if isinstance(data, list):
+        return [sparse(item, fields) for item in data]
+    return {key: value for key, value in data.items() if key in fields}
+
+
+class DynamicFieldsMixin:
+    """Сериализатор отдает только поля из context['fields'], остальные не вычисляются"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        fields = self.context.get('fields')
+        if fields:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
@@ -0,0 +1,10 @@
+"""URL-ы профиля settings_api: только /api/, без admin/ и frontend"""
+
+from django.urls import path, include
+
+urlpatterns = [
+    path('api/', include('user.urls')),
+    path('api/', include('product.urls')),
+    path('api/', include('order.urls')),
+    path('api/products/', include('product.urls')),
+]
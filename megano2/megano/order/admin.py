@@ -1,6 +1,9 @@
-from django.contrib import admin
+from django.contrib import admin, messages
+from django.db.models import Count, OuterRef, Subquery
 from django.utils.html import format_html
-from .models import Order, OrderItem, Payment
+from megano.paginators import EstimatedCountPaginator
+from .lifecycle import bulk_transition
+from .models import Order, OrderEvent, OrderItem, Payment
 
 
 class OrderItemInline(admin.TabularInline):
@@ -20,23 +23,44 @@ class OrderItemInline(admin.TabularInline):
 class PaymentInline(admin.StackedInline):
     model = Payment
     extra = 0
-    readonly_fields = ['payment_date', 'card_number_masked']
-    fields = ['payment_date', 'card_number_masked', 'card_name', 'card_exp_month',
+    readonly_fields = ['payment_date', 'card_number']
+    fields = ['payment_date', 'card_number', 'card_brand', 'card_name', 'card_exp_month',
               'card_exp_year', 'amount', 'status']
 
-    def card_number_masked(self, instance):
-        return f"****-****-****-{instance.card_number[-4:]}" if instance.card_number else "N/A"
+    def card_number(self, instance):
+        return instance.card_number_masked
 
-    card_number_masked.short_description = 'Номер карты'
+    card_number.short_description = 'Номер карты'
+
+
+class OrderEventInline(admin.TabularInline):
+    model = OrderEvent
+    extra = 0
+    can_delete = False
+    fields = ['created_at', 'from_status', 'to_status', 'user', 'source', 'comment']
+    readonly_fields = fields
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('user')
 
 
 @admin.register(Order)
 class OrderAdmin(admin.ModelAdmin):
-    list_display = ['id', 'created_at', 'full_name', 'email', 'total_cost',
+    list_display = ['id', 'created_at', 'full_name', 'email', 'total_cost', 'items_count',
                     'delivery_type', 'payment_type', 'status', 'order_actions']
     list_filter = ['status', 'delivery_type', 'payment_type', 'created_at']
-    search_fields = ['id', 'full_name', 'email', 'phone', 'city']
-    readonly_fields = ['created_at', 'order_summary']
+    search_fields = ['full_name', '^city']
+    search_help_text = "Номер заказа, телефон, точный email, ФИО или начало названия города"
+    show_full_result_count = False
+    paginator = EstimatedCountPaginator
+    # Статус меняется только действиями, чтобы переход попал в журнал
+    readonly_fields = ['created_at', 'status', 'order_summary']
     fieldsets = [
         ('Основная информация', {
             'fields': ['created_at', 'status', 'user']
@@ -54,23 +78,72 @@ class OrderAdmin(admin.ModelAdmin):
             'fields': ['order_summary']
         })
     ]
-    inlines = [OrderItemInline, PaymentInline]
+    inlines = [OrderItemInline, PaymentInline, OrderEventInline]
+    actions = ['mark_shipped', 'mark_delivered', 'mark_cancelled']
+
+    def get_queryset(self, request):
+        # Коррелированный подзапрос считается только для строк текущей страницы, без GROUP BY по таблице
+        items_count = (
+            OrderItem.objects.filter(order=OuterRef('pk'))
+            .values('order')
+            .annotate(count=Count('id'))
+            .values('count')
+        )
+        return super().get_queryset(request).annotate(items_count=Subquery(items_count))
+
+    def get_search_results(self, request, queryset, search_term):
+        """Номер заказа, телефон и email ищутся точным совпадением по индексу"""
+        term = search_term.strip()
+        if term.isdigit():
+            results = queryset.filter(phone=term)
+            # Длинная строка цифр не влезет в integer базы - это только телефон
+            if len(term) <= 18:
+                results |= queryset.filter(id=int(term))
+            return results, False
+        if '@' in term:
+            return queryset.filter(email=term), False
+        return super().get_search_results(request, queryset, search_term)
+
+    def items_count(self, instance):
+        return instance.items_count or 0
+
+    items_count.short_description = 'Товаров'
+    items_count.admin_order_field = 'items_count'
 
     def order_summary(self, instance):
-        items = instance.products.all()
         return format_html(
             "<h4>Итого: {} ₽</h4>"
             "<p>Товаров: {}</p>"
             "<p>Способ доставки: {}</p>"
             "<p>Способ оплаты: {}</p>",
             instance.total_cost,
-            items.count(),
+            self.items_count(instance),
             instance.get_delivery_type_display(),
             instance.get_payment_type_display()
         )
 
     order_summary.short_description = 'Сводка заказа'
 
+    def change_status(self, request, queryset, status):
+        updated = bulk_transition(queryset, status, user=request.user, source='admin')
+        label = dict(Order.STATUS_CHOICES)[status]
+        self.message_user(request, f"Статус «{label}» установлен у {updated} заказов")
+        skipped = queryset.count() - updated
+        if skipped:
+            self.message_user(request, f"Пропущено заказов с неподходящим статусом: {skipped}", messages.WARNING)
+
+    def mark_shipped(self, request, queryset):
+        self.change_status(request, queryset, 'shipped')
+    mark_shipped.short_description = "Отметить как отправленные"
+
+    def mark_delivered(self, request, queryset):
+        self.change_status(request, queryset, 'delivered')
+    mark_delivered.short_description = "Отметить как доставленные"
+
+    def mark_cancelled(self, request, queryset):
+        self.change_status(request, queryset, 'cancelled')
+    mark_cancelled.short_description = "Отменить заказы"
+
     def order_actions(self, obj):
         if obj.pk:
             return format_html(
@@ -93,16 +166,21 @@ class OrderAdmin(admin.ModelAdmin):
 
 @admin.register(Payment)
 class PaymentAdmin(admin.ModelAdmin):
-    list_display = ['order_id', 'payment_date', 'card_number_masked', 'amount', 'status']
-    list_filter = ['status', 'payment_date']
-    readonly_fields = ['payment_date', 'card_number_masked']
+    list_display = ['order_id', 'payment_date', 'card_brand', 'card_number', 'amount', 'status']
+    list_filter = ['status', 'card_brand', 'payment_date']
+    search_fields = ['=card_last4']
+    readonly_fields = ['payment_date', 'card_number', 'card_brand']
+    exclude = ['card_token', 'card_last4']
+    show_full_result_count = False
+    paginator = EstimatedCountPaginator
 
-    def card_number_masked(self, obj):
-        return f"****-****-****-{obj.card_number[-4:]}" if obj.card_number else "N/A"
+    def card_number(self, obj):
+        return obj.card_number_masked
 
-    card_number_masked.short_description = 'Номер карты'
+    card_number.short_description = 'Номер карты'
+    card_number.admin_order_field = 'card_last4'
 
     def order_id(self, obj):
-        return obj.order.id
+        return obj.order_id
 
     order_id.short_description = 'ID заказа'
\ No newline at end of file
@@ -0,0 +1,84 @@
+import csv
+import json
+from datetime import datetime, time, timedelta
+from django.db.models import Prefetch
+from django.utils import timezone
+from .models import Order, OrderItem
+
+ORDER_COLUMNS = [
+    'order_id', 'created_at', 'status', 'full_name', 'email', 'phone',
+    'delivery_type', 'payment_type', 'total_cost', 'city', 'address',
+]
+ITEM_COLUMNS = ['product_id', 'product_name', 'quantity', 'price']
+CSV_COLUMNS = ORDER_COLUMNS + ITEM_COLUMNS
+
+
+def start_of_day(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def export_queryset(date_from=None, date_to=None, after_id=None):
+    """Заказы по возрастанию id: прерванную выгрузку можно продолжить с after_id"""
+    orders = Order.objects.order_by('id').prefetch_related(
+        Prefetch(
+            'products',
+            queryset=OrderItem.objects.select_related('product').only(
+                'id', 'order_id', 'quantity', 'price', 'product__id', 'product__name'
+            ).order_by('id')
+        )
+    )
+    # Границы дат переводятся в диапазон datetime, чтобы фильтр шел по индексу created_at
+    if date_from:
+        orders = orders.filter(created_at__gte=start_of_day(date_from))
+    if date_to:
+        orders = orders.filter(created_at__lt=start_of_day(date_to + timedelta(days=1)))
+    if after_id:
+        orders = orders.filter(id__gt=after_id)
+    return orders
+
+
+def iter_orders(chunk_size=1000, **filters):
+    for order in export_queryset(**filters).iterator(chunk_size=chunk_size):
+        yield {
+            'order_id': order.id,
+            'created_at': order.created_at.isoformat(),
+            'status': order.status,
+            'full_name': order.full_name,
+            'email': order.email,
+            'phone': order.phone,
+            'delivery_type': order.delivery_type,
+            'payment_type': order.payment_type,
+            'total_cost': str(order.total_cost),
+            'city': order.city,
+            'address': order.address,
+            'items': [{
+                'product_id': item.product_id,
+                'product_name': item.product.name,
+                'quantity': item.quantity,
+                'price': str(item.price),
+            } for item in order.products.all()],
+        }
+
+
+class Echo:
+    """Псевдобуфер для csv.writer: отдает строку вместо записи"""
+
+    def write(self, value):
+        return value
+
+
+def render_lines(orders, fmt):
+    """CSV - строка на позицию заказа, JSONL - строка на заказ"""
+    if fmt == 'jsonl':
+        for order in orders:
+            yield json.dumps(order, ensure_ascii=False) + '\n'
+        return
+
+    writer = csv.writer(Echo())
+    yield writer.writerow(CSV_COLUMNS)
+    for order in orders:
+        head = [order[column] for column in ORDER_COLUMNS]
+        if not order['items']:
+            yield writer.writerow(head + [''] * len(ITEM_COLUMNS))
+        for item in order['items']:
+            yield writer.writerow(head + [item[column] for column in ITEM_COLUMNS])
@@ -0,0 +1,112 @@
+import functools
+import hashlib
+import hmac
+from datetime import timedelta
+from django.conf import settings
+from django.db import IntegrityError
+from django.http import HttpResponse, JsonResponse
+from django.utils import timezone
+from megano.db import retry_on_lock
+from .models import IdempotencyKey
+
+HEADER = 'Idempotency-Key'
+
+
+def key_ttl():
+    return timedelta(seconds=getattr(settings, 'IDEMPOTENCY_KEY_TTL', 24 * 60 * 60))
+
+
+@retry_on_lock()
+def insert_key(key, scope, request_hash):
+    IdempotencyKey.objects.create(key=key, scope=scope, request_hash=request_hash)
+
+
+def claim_key(key, scope, request_hash):
+    """
+    Занимает ключ; если он уже есть и не истек - возвращает существующую запись.
+    IntegrityError ловится вне транзакции вставки, поэтому savepoint не нужен.
+    """
+    try:
+        insert_key(key, scope, request_hash)
+        return None
+    except IntegrityError:
+        pass
+    # Истекший ключ забирается одним условным UPDATE - параллельный запрос его уже не получит
+    now = timezone.now()
+    reclaimed = IdempotencyKey.objects.filter(key=key, scope=scope, created_at__lt=now - key_ttl()).update(
+        request_hash=request_hash, status_code=None, response_body='', created_at=now,
+    )
+    if reclaimed:
+        return None
+    return IdempotencyKey.objects.get(key=key, scope=scope)
+
+
+def replay(record, request_hash):
+    if record.request_hash != request_hash:
+        return JsonResponse({"error": f"{HEADER} was already used with a different request"}, status=422)
+    if record.status_code is None:
+        return JsonResponse({"error": "A request with this key is still in progress"}, status=409)
+    response = HttpResponse(record.response_body, status=record.status_code, content_type='application/json')
+    response['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def request_scope(request):
+    """
+    Ключ действует только для своего клиента: пользователя или, для анонимов,
+    сессии. Без сессии различить анонимных клиентов нельзя - тогда None.
+    """
+    if request.user.is_authenticated:
+        return f"{request.path}:user:{request.user.pk}"
+    session_key = request.session.session_key
+    if not session_key:
+        return None
+    return f"{request.path}:session:{hashlib.sha256(session_key.encode()).hexdigest()[:32]}"
+
+
+def hash_body(body):
+    """
+    HMAC, а не голый SHA-256: в теле оплаты номер карты и CVV, и по известному
+    BIN простой хэш перебирается
+    """
+    return hmac.new(settings.SECRET_KEY.encode(), body, hashlib.sha256).hexdigest()
+
+
+def idempotent(method):
+    """
+    Для POST-методов view: повтор с тем же Idempotency-Key в течение
+    IDEMPOTENCY_KEY_TTL получает сохраненный первый ответ без повторной записи.
+    Ответы 5xx не сохраняются, чтобы запрос можно было повторить.
+    Без заголовка запрос обрабатывается как обычно.
+    """
+    @functools.wraps(method)
+    def wrapper(self, request, *args, **kwargs):
+        key = request.headers.get(HEADER)
+        if not key:
+            return method(self, request, *args, **kwargs)
+
+        scope = request_scope(request)
+        if scope is None:
+            return JsonResponse({"error": f"{HEADER} requires a signed-in user or a session"}, status=400)
+        request_hash = hash_body(request.body)
+        record = claim_key(key[:255], scope, request_hash)
+        if record is not None:
+            return replay(record, request_hash)
+
+        records = IdempotencyKey.objects.filter(key=key[:255], scope=scope)
+        try:
+            response = method(self, request, *args, **kwargs)
+        except Exception:
+            records.delete()
+            raise
+        if response.status_code >= 500 or response.streaming:
+            records.delete()
+        else:
+            records.update(status_code=response.status_code, response_body=response.content.decode())
+        return response
+    return wrapper
+
+
+def clear_expired_keys():
+    deleted, _ = IdempotencyKey.objects.filter(created_at__lt=timezone.now() - key_ttl()).delete()
+    return deleted
@@ -0,0 +1,105 @@
+from megano.db import retry_on_lock
+from .models import Order, OrderEvent
+
+# Старый статус processing ставился после оплаты и ведет себя как paid
+TRANSITIONS = {
+    'accepted': {'paid', 'cancelled'},
+    'processing': {'paid', 'shipped', 'cancelled'},
+    'paid': {'shipped', 'cancelled'},
+    'shipped': {'delivered'},
+    'delivered': set(),
+    'cancelled': set(),
+}
+BULK_CHUNK_SIZE = 1000
+
+
+class InvalidTransition(Exception):
+    pass
+
+
+def can_transition(from_status, to_status):
+    return to_status in TRANSITIONS.get(from_status, ())
+
+
+def sources_for(to_status):
+    if to_status not in TRANSITIONS:
+        raise InvalidTransition(f"Unknown status: {to_status}")
+    return [status for status, targets in TRANSITIONS.items() if to_status in targets]
+
+
+@retry_on_lock()
+def transition(order, to_status, user=None, source='api', comment=''):
+    """
+    Переводит заказ в новый статус. UPDATE выполняется только если статус
+    в базе все еще тот, из которого разрешен переход, поэтому параллельная
+    смена статуса не затирается.
+    """
+    from_status = order.status
+    if not can_transition(from_status, to_status):
+        raise InvalidTransition(f"Cannot change status from {from_status} to {to_status}")
+    updated = Order.objects.filter(pk=order.pk, status=from_status).update(status=to_status)
+    if not updated:
+        raise InvalidTransition(f"Order #{order.pk} status was changed concurrently")
+    OrderEvent.objects.create(
+        order_id=order.pk, from_status=from_status, to_status=to_status,
+        user=user, source=source, comment=comment,
+    )
+    order.status = to_status
+    return order
+
+
+def bulk_transition(orders, to_status, user=None, source='bulk', comment='', chunk_size=BULK_CHUNK_SIZE):
+    """
+    Переводит выборку заказов (queryset или список id) в новый статус.
+    Заказы, для которых переход не разрешен, пропускаются. На каждый чанк -
+    одно UPDATE с условием на текущий статус и один bulk_create журнала.
+    Возвращает число переведенных заказов.
+    """
+    allowed = sources_for(to_status)
+    if not allowed:
+        return 0
+    if isinstance(orders, (list, tuple, set)):
+        orders = Order.objects.filter(pk__in=list(orders))
+    candidates = orders.filter(status__in=allowed).order_by('pk').values_list('pk', 'status')
+
+    updated = 0
+    last_pk = 0
+    # Keyset-пагинация: каждый чанк - отдельная короткая транзакция
+    while chunk := list(candidates.filter(pk__gt=last_pk)[:chunk_size]):
+        updated += transition_chunk(chunk, to_status, user, source, comment)
+        last_pk = chunk[-1][0]
+    return updated
+
+
+@retry_on_lock()
+def transition_chunk(chunk, to_status, user, source, comment):
+    by_status = {}
+    for pk, status in chunk:
+        by_status.setdefault(status, []).append(pk)
+
+    updated = 0
+    events = []
+    for from_status, ids in by_status.items():
+        # Строки, чей статус успел измениться, не попадут ни в UPDATE, ни в журнал
+        locked = list(
+            Order.objects.select_for_update()
+            .filter(pk__in=ids, status=from_status)
+            .values_list('pk', flat=True)
+        )
+        if not locked:
+            continue
+        # Условие на статус повторяется в UPDATE: на бэкендах без блокировки
+        # строк статус мог смениться между SELECT и UPDATE
+        chunk_updated = Order.objects.filter(pk__in=locked, status=from_status).update(status=to_status)
+        if chunk_updated < len(locked):
+            locked = list(
+                Order.objects.filter(pk__in=locked, status=to_status).values_list('pk', flat=True)
+            )
+        updated += chunk_updated
+        events += [
+            OrderEvent(order_id=pk, from_status=from_status, to_status=to_status,
+                       user=user, source=source, comment=comment)
+            for pk in locked
+        ]
+    OrderEvent.objects.bulk_create(events)
+    return updated
@@ -0,0 +1,9 @@
+from django.core.management.base import BaseCommand
+from order.idempotency import clear_expired_keys
+
+
+class Command(BaseCommand):
+    help = "Удаляет ключи Idempotency-Key старше IDEMPOTENCY_KEY_TTL"
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.SUCCESS(f"Удалено ключей: {clear_expired_keys()}"))
@@ -0,0 +1,32 @@
+from datetime import date
+from django.core.management.base import BaseCommand
+from order.export import iter_orders, render_lines
+
+
+class Command(BaseCommand):
+    help = "Потоковая выгрузка заказов и позиций для бухгалтерии в CSV или JSONL"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', help="Файл выгрузки, по умолчанию stdout")
+        parser.add_argument('--format', choices=['csv', 'jsonl'], default='csv')
+        parser.add_argument('--date-from', type=date.fromisoformat)
+        parser.add_argument('--date-to', type=date.fromisoformat)
+        parser.add_argument('--after-id', type=int, help="Продолжить выгрузку после заказа с этим id")
+        parser.add_argument('--chunk-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        orders = iter_orders(
+            chunk_size=options['chunk_size'],
+            date_from=options['date_from'],
+            date_to=options['date_to'],
+            after_id=options['after_id'],
+        )
+        stream = open(options['output'], 'w', encoding='utf-8', newline='') if options['output'] else self.stdout
+        # Строки уже заканчиваются переводом строки, OutputWrapper не должен добавлять свой
+        self.stdout.ending = ''
+        try:
+            for line in render_lines(orders, options['format']):
+                stream.write(line)
+        finally:
+            if stream is not self.stdout:
+                stream.close()
@@ -0,0 +1,23 @@
+# Generated by Django 5.2 on 2026-10-19 14:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("order", "0012_alter_order_created_at"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="order",
+            name="email",
+            field=models.EmailField(db_index=True, max_length=254),
+        ),
+        migrations.AlterField(
+            model_name="order",
+            name="phone",
+            field=models.CharField(db_index=True, max_length=20),
+        ),
+    ]
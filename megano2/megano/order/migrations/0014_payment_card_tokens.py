@@ -0,0 +1,120 @@
+# Generated by Django 5.2 on 2026-10-19 14:27
+
+import secrets
+from itertools import islice
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import migrations, models
+
+# Копия логики order.vault на момент миграции: миграция не должна зависеть
+# от кода приложения, который может измениться
+TOKEN_PREFIX = "tok_"
+BATCH_SIZE = 500
+CARD_BRANDS = [
+    (("2200", "2201", "2202", "2203", "2204"), "mir"),
+    (("34", "37"), "amex"),
+    (
+        tuple(str(prefix) for prefix in range(51, 56))
+        + tuple(str(prefix) for prefix in range(2221, 2721)),
+        "mastercard",
+    ),
+    (("4",), "visa"),
+]
+
+
+def vault_cipher():
+    try:
+        from cryptography.fernet import Fernet
+    except ImportError:
+        raise ImproperlyConfigured("Card vault requires the 'cryptography' package")
+    key = getattr(settings, "CARD_VAULT_KEY", None)
+    if not key:
+        raise ImproperlyConfigured("CARD_VAULT_KEY is not set")
+    return Fernet(key)
+
+
+def card_brand(pan):
+    for prefixes, brand in CARD_BRANDS:
+        if pan.startswith(prefixes):
+            return brand
+    return "other"
+
+
+def tokenize_existing_cards(apps, schema_editor):
+    """Переносит номера карт в хранилище; CVV просто удаляется вместе с колонкой"""
+    Payment = apps.get_model("order", "Payment")
+    VaultEntry = apps.get_model("order", "VaultEntry")
+    payments = (
+        Payment.objects.exclude(card_number="")
+        .only("id", "card_number")
+        .order_by("pk")
+        .iterator(chunk_size=BATCH_SIZE)
+    )
+    cipher = None
+    while batch := list(islice(payments, BATCH_SIZE)):
+        cipher = cipher or vault_cipher()
+        entries = [
+            VaultEntry(
+                token=TOKEN_PREFIX + secrets.token_urlsafe(24),
+                ciphertext=cipher.encrypt(payment.card_number.encode()).decode(),
+            )
+            for payment in batch
+        ]
+        VaultEntry.objects.bulk_create(entries)
+        for payment, entry in zip(batch, entries):
+            payment.card_token = entry.token
+            payment.card_last4 = payment.card_number[-4:]
+            payment.card_brand = card_brand(payment.card_number)
+        Payment.objects.bulk_update(batch, ["card_token", "card_last4", "card_brand"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("order", "0013_order_email_phone_index"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="VaultEntry",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("token", models.CharField(max_length=64, unique=True)),
+                ("ciphertext", models.TextField()),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name="payment",
+            name="card_brand",
+            field=models.CharField(blank=True, max_length=20),
+        ),
+        migrations.AddField(
+            model_name="payment",
+            name="card_last4",
+            field=models.CharField(blank=True, db_index=True, max_length=4),
+        ),
+        migrations.AddField(
+            model_name="payment",
+            name="card_token",
+            field=models.CharField(max_length=64, null=True, unique=True),
+        ),
+        migrations.RunPython(tokenize_existing_cards, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name="payment",
+            name="card_cvv",
+        ),
+        migrations.RemoveField(
+            model_name="payment",
+            name="card_number",
+        ),
+    ]
@@ -6,6 +6,10 @@ class Order(models.Model):
     STATUS_CHOICES = [
         ('accepted', 'Принят'),
         ('processing', 'В обработке'),
+        ('paid', 'Оплачен'),
+        ('shipped', 'Отправлен'),
+        ('delivered', 'Доставлен'),
+        ('cancelled', 'Отменен'),
     ]
     DELIVERY_TYPES = [
         ('ordinary', 'Обычная'),
@@ -23,20 +27,46 @@ class Order(models.Model):
         blank=True,
         default=None
     )
-    created_at = models.DateTimeField(auto_now_add=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
     full_name = models.CharField(max_length=255)
-    email = models.EmailField()
-    phone = models.CharField(max_length=20)
+    email = models.EmailField(db_index=True)
+    phone = models.CharField(max_length=20, db_index=True)
     delivery_type = models.CharField(max_length=10, choices=DELIVERY_TYPES, default='ordinary')
     payment_type = models.CharField(max_length=15, choices=PAYMENT_TYPES)
     total_cost = models.DecimalField(max_digits=10, decimal_places=2)
-    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='accepted')
+    # Меняется только через order.lifecycle, чтобы каждый переход попал в OrderEvent
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='accepted', db_index=True)
     city = models.CharField(max_length=100)
     address = models.CharField(max_length=255)
 
     def __str__(self):
         return f"Order #{self.id}"
 
+class OrderEvent(models.Model):
+    """Журнал смены статусов заказа; записи только добавляются"""
+    order = models.ForeignKey(Order, related_name='events', on_delete=models.CASCADE)
+    from_status = models.CharField(max_length=10, choices=Order.STATUS_CHOICES)
+    to_status = models.CharField(max_length=10, choices=Order.STATUS_CHOICES)
+    user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    source = models.CharField(max_length=20)
+    comment = models.CharField(max_length=255, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        ordering = ['created_at', 'id']
+        indexes = [
+            models.Index(fields=['order', 'created_at'], name='order_event_order_idx'),
+        ]
+
+    def __str__(self):
+        return f"Order #{self.order_id}: {self.from_status} → {self.to_status}"
+
+    def save(self, *args, **kwargs):
+        if self.pk is not None:
+            raise ValueError("OrderEvent is append-only")
+        super().save(*args, **kwargs)
+
+
 class OrderItem(models.Model):
     order = models.ForeignKey(Order, related_name='products', on_delete=models.CASCADE)
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
@@ -53,11 +83,13 @@ class Payment(models.Model):
         on_delete=models.CASCADE,
         related_name='payment'
     )
-    card_number = models.CharField(max_length=16)
+    # Номер карты хранится в order.vault, CVV не сохраняется вовсе
+    card_token = models.CharField(max_length=64, unique=True, null=True)
+    card_last4 = models.CharField(max_length=4, db_index=True, blank=True)
+    card_brand = models.CharField(max_length=20, blank=True)
     card_name = models.CharField(max_length=255)
     card_exp_month = models.CharField(max_length=2)
     card_exp_year = models.CharField(max_length=4)
-    card_cvv = models.CharField(max_length=3)
     payment_date = models.DateTimeField(auto_now_add=True)
     amount = models.DecimalField(max_digits=10, decimal_places=2)
     status = models.CharField(
@@ -71,4 +103,36 @@ class Payment(models.Model):
     )
 
     def __str__(self):
-        return f"Payment for Order #{self.order.id}"
\ No newline at end of file
+        return f"Payment for Order #{self.order.id}"
+
+    @property
+    def card_number_masked(self):
+        return f"****-****-****-{self.card_last4}" if self.card_last4 else "N/A"
+
+
+class VaultEntry(models.Model):
+    """Зашифрованный номер карты; читается только через order.vault"""
+    token = models.CharField(max_length=64, unique=True)
+    ciphertext = models.TextField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.token
+
+
+class IdempotencyKey(models.Model):
+    """Первый ответ на запрос с заголовком Idempotency-Key; повторы получают его же"""
+    key = models.CharField(max_length=255)
+    scope = models.CharField(max_length=255)
+    request_hash = models.CharField(max_length=64)
+    status_code = models.PositiveSmallIntegerField(null=True)
+    response_body = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['key', 'scope'], name='idempotency_key_scope_unique'),
+        ]
+
+    def __str__(self):
+        return self.key
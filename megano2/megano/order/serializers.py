@@ -1,7 +1,7 @@
 from rest_framework import serializers
 from .models import Order, OrderItem
 from product.models import Product
-from product.serializers import ProductSerializer
+from product.serializers import ProductSerializer, first_category_id, review_count
 
 class OrderItemProductSerializer(serializers.ModelSerializer):
     category = serializers.SerializerMethodField()
@@ -20,7 +20,7 @@ class OrderItemProductSerializer(serializers.ModelSerializer):
         ]
 
     def get_category(self, obj):
-        return obj.categories.first().id if obj.categories.exists() else None
+        return first_category_id(obj)
 
     def get_images(self, obj):
         return [{
@@ -32,7 +32,7 @@ class OrderItemProductSerializer(serializers.ModelSerializer):
         return [{"id": idx, "name": tag} for idx, tag in enumerate(obj.tags, 1)]
 
     def get_reviews(self, obj):
-        return obj.product_reviews.count()
+        return review_count(obj)
 
     def get_rating(self, obj):
         return float(obj.rating) if obj.rating else None
@@ -1,3 +1,398 @@
-from django.test import TestCase
+import hashlib
+import json
+from unittest import mock
+from datetime import timedelta
+from cryptography.fernet import Fernet, InvalidToken
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.paginator import EmptyPage
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection
+from django.db.models import QuerySet
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from megano.paginators import EstimatedCountPaginator
+from order.idempotency import clear_expired_keys, hash_body, key_ttl
+from order.lifecycle import TRANSITIONS, InvalidTransition, bulk_transition, transition, transition_chunk
+from order.models import IdempotencyKey, Order, OrderEvent, Payment, VaultEntry
+from order.vault import TOKEN_PREFIX, card_brand, detokenize, tokenize_cards
+from product.fixtures.synthetic import generate_catalog
+from product.models import Product
 
-# Create your tests here.
+PAYMENT = {'number': '4111111111111111', 'name': 'Ivan Ivanov', 'month': '12', 'year': '2030', 'code': '123'}
+
+
+class OrderQueryBudgetTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        generate_catalog(products=20, categories=5, carts=0, orders=10)
+
+    def assertWithinBudget(self, url_name, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertLessEqual(len(queries), settings.QUERY_BUDGETS[url_name], url)
+        return response
+
+    def test_orders(self):
+        response = self.assertWithinBudget('orders', '/api/orders')
+        self.assertEqual(len(response.json()), 10)
+
+    def test_order_detail(self):
+        order_id = Order.objects.values_list('id', flat=True).first()
+        response = self.assertWithinBudget('order-detail', f'/api/order/{order_id}')
+        self.assertEqual(len(response.json()['products']), 3)
+
+
+class VaultTest(TestCase):
+    PANS = ['4111111111111111', '5500000000000004', '2200000000000004']
+
+    def test_round_trip(self):
+        tokens = tokenize_cards(self.PANS)
+        self.assertEqual(len(set(tokens)), 3)
+        self.assertTrue(all(token.startswith(TOKEN_PREFIX) for token in tokens))
+        self.assertEqual(detokenize(tokens), dict(zip(tokens, self.PANS)))
+
+    def test_pan_is_not_stored_in_clear(self):
+        tokenize_cards(self.PANS)
+        for ciphertext in VaultEntry.objects.values_list('ciphertext', flat=True):
+            self.assertFalse(any(pan in ciphertext for pan in self.PANS))
+
+    def test_batch_queries(self):
+        with self.assertNumQueries(1):
+            tokens = tokenize_cards(self.PANS)
+        with self.assertNumQueries(1):
+            detokenize(tokens)
+
+    def test_unknown_token(self):
+        self.assertEqual(detokenize(['tok_missing']), {})
+
+    def test_other_key_cannot_decrypt(self):
+        tokens = tokenize_cards(self.PANS[:1])
+        with override_settings(CARD_VAULT_KEY=Fernet.generate_key()):
+            with self.assertRaises(InvalidToken):
+                detokenize(tokens)
+
+    def test_key_required(self):
+        for debug in (False, True):
+            with self.subTest(debug=debug), override_settings(CARD_VAULT_KEY=None, DEBUG=debug):
+                with self.assertRaises(ImproperlyConfigured):
+                    tokenize_cards(self.PANS[:1])
+
+    def test_test_runner_has_key(self):
+        self.assertTrue(settings.TESTING)
+        self.assertTrue(settings.CARD_VAULT_KEY)
+
+    def test_card_brand(self):
+        self.assertEqual(card_brand('4111111111111111'), 'visa')
+        self.assertEqual(card_brand('5500000000000004'), 'mastercard')
+        self.assertEqual(card_brand('2221000000000009'), 'mastercard')
+        self.assertEqual(card_brand('2200000000000004'), 'mir')
+        self.assertEqual(card_brand('340000000000009'), 'amex')
+        self.assertEqual(card_brand('6011000000000004'), 'other')
+
+
+class IdempotencyTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.product = Product.objects.create(name="Product", description="Description", price=100)
+
+    def setUp(self):
+        # У анонимного клиента ключ действует в пределах его сессии
+        self.session_key = self.client.session.session_key
+
+    def order_body(self, count=1):
+        return json.dumps({'products': [{'id': self.product.id, 'price': 100, 'count': count}]})
+
+    def post_order(self, key, count=1, client=None):
+        return (client or self.client).post('/api/orders', self.order_body(count), content_type='application/json',
+                                            headers={'Idempotency-Key': key})
+
+    def test_replay_returns_first_response(self):
+        first = self.post_order('order-1')
+        second = self.post_order('order-1')
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual(second.status_code, 201)
+        self.assertEqual(second.json(), first.json())
+        self.assertEqual(second['Idempotent-Replayed'], 'true')
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_different_payload_with_same_key(self):
+        self.post_order('order-1')
+        response = self.post_order('order-1', count=2)
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_request_in_progress(self):
+        session_hash = hashlib.sha256(self.session_key.encode()).hexdigest()[:32]
+        IdempotencyKey.objects.create(key='order-1', scope=f'/api/orders:session:{session_hash}',
+                                      request_hash=hash_body(self.order_body().encode()))
+        response = self.post_order('order-1')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(Order.objects.count(), 0)
+
+    def test_keys_are_scoped_to_client(self):
+        other = Client()
+        other.session.save()
+        first = self.post_order('order-1')
+        second = self.post_order('order-1', client=other)
+        self.assertFalse(second.has_header('Idempotent-Replayed'))
+        self.assertNotEqual(second.json()['orderId'], first.json()['orderId'])
+        self.assertEqual(Order.objects.count(), 2)
+
+    def test_anonymous_without_session_is_rejected(self):
+        response = self.post_order('order-1', client=Client())
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Order.objects.exists())
+
+    def test_request_hash_is_keyed(self):
+        self.post_order('order-1')
+        stored = IdempotencyKey.objects.get().request_hash
+        self.assertNotEqual(stored, hashlib.sha256(self.order_body().encode()).hexdigest())
+
+    def test_expired_key_is_processed_again(self):
+        self.post_order('order-1')
+        IdempotencyKey.objects.update(created_at=timezone.now() - key_ttl() - timedelta(seconds=1))
+        response = self.post_order('order-1')
+        self.assertEqual(response.status_code, 201)
+        self.assertFalse(response.has_header('Idempotent-Replayed'))
+        self.assertEqual(Order.objects.count(), 2)
+
+    def test_clear_expired_keys(self):
+        self.post_order('order-1')
+        self.post_order('order-2')
+        IdempotencyKey.objects.filter(key='order-1').update(created_at=timezone.now() - key_ttl() * 2)
+        self.assertEqual(clear_expired_keys(), 1)
+        self.assertEqual(list(IdempotencyKey.objects.values_list('key', flat=True)), ['order-2'])
+
+    def test_payment_replay(self):
+        order = Order.objects.create(full_name="Customer", email="c@example.com", phone="1",
+                                     payment_type='online', total_cost=100, city="City", address="Street")
+        url = f'/api/payment/{order.id}'
+        first = self.client.post(url, json.dumps(PAYMENT), content_type='application/json',
+                                 headers={'Idempotency-Key': 'pay-1'})
+        second = self.client.post(url, json.dumps(PAYMENT), content_type='application/json',
+                                  headers={'Idempotency-Key': 'pay-1'})
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(Payment.objects.filter(order=order).count(), 1)
+
+
+def make_order(status='accepted', user=None):
+    return Order.objects.create(user=user, full_name="Customer", email="c@example.com", phone="1",
+                                payment_type='online', total_cost=100, city="City", address="Street",
+                                status=status)
+
+
+class TransitionTest(TestCase):
+    def test_transition_map_covers_all_statuses(self):
+        statuses = set(dict(Order.STATUS_CHOICES))
+        self.assertEqual(set(TRANSITIONS), statuses)
+        self.assertTrue(all(targets <= statuses for targets in TRANSITIONS.values()))
+
+    def test_allowed_transitions(self):
+        order = make_order()
+        for status in ['paid', 'shipped', 'delivered']:
+            transition(order, status, source='test')
+        order.refresh_from_db()
+        self.assertEqual(order.status, 'delivered')
+        events = list(order.events.values_list('from_status', 'to_status'))
+        self.assertEqual(events, [('accepted', 'paid'), ('paid', 'shipped'), ('shipped', 'delivered')])
+
+    def test_forbidden_transitions(self):
+        for from_status, to_status in [('accepted', 'shipped'), ('delivered', 'cancelled'),
+                                       ('cancelled', 'paid'), ('shipped', 'accepted')]:
+            order = make_order(from_status)
+            with self.assertRaises(InvalidTransition):
+                transition(order, to_status)
+            order.refresh_from_db()
+            self.assertEqual(order.status, from_status)
+        self.assertFalse(OrderEvent.objects.exists())
+
+    def test_stale_instance_does_not_overwrite(self):
+        order = make_order()
+        stale = Order.objects.get(pk=order.pk)
+        transition(order, 'cancelled')
+        with self.assertRaises(InvalidTransition):
+            transition(stale, 'paid')
+        order.refresh_from_db()
+        self.assertEqual(order.status, 'cancelled')
+        self.assertEqual(OrderEvent.objects.count(), 1)
+
+    def test_writes_only_status(self):
+        order = make_order()
+        Order.objects.filter(pk=order.pk).update(full_name="Changed")
+        transition(order, 'paid')
+        order.refresh_from_db()
+        self.assertEqual(order.full_name, "Changed")
+
+    def test_events_are_append_only(self):
+        order = make_order()
+        transition(order, 'paid')
+        event = order.events.get()
+        event.comment = "edited"
+        with self.assertRaises(ValueError):
+            event.save()
+
+
+class BulkTransitionTest(TestCase):
+    def test_moves_only_allowed_orders(self):
+        paid = [make_order('paid') for _ in range(3)]
+        legacy = make_order('processing')
+        accepted = make_order('accepted')
+        delivered = make_order('delivered')
+        ids = [order.pk for order in [*paid, legacy, accepted, delivered]]
+
+        updated = bulk_transition(ids, 'shipped', source='test', chunk_size=2)
+
+        self.assertEqual(updated, 4)
+        statuses = dict(Order.objects.filter(pk__in=ids).values_list('pk', 'status'))
+        self.assertEqual({statuses[order.pk] for order in [*paid, legacy]}, {'shipped'})
+        self.assertEqual(statuses[accepted.pk], 'accepted')
+        self.assertEqual(statuses[delivered.pk], 'delivered')
+        events = OrderEvent.objects.filter(to_status='shipped')
+        self.assertEqual(events.count(), 4)
+        self.assertEqual(events.filter(from_status='processing').get().order_id, legacy.pk)
+
+    def test_accepts_queryset(self):
+        for _ in range(5):
+            make_order('paid')
+        self.assertEqual(bulk_transition(Order.objects.all(), 'cancelled'), 5)
+        self.assertEqual(bulk_transition(Order.objects.all(), 'cancelled'), 0)
+        self.assertEqual(OrderEvent.objects.count(), 5)
+
+    def test_chunk_skips_rows_changed_concurrently(self):
+        orders = [make_order('paid') for _ in range(3)]
+        Order.objects.filter(pk=orders[0].pk).update(status='cancelled')
+        # Чанк прочитан до отмены первого заказа
+        chunk = [(order.pk, 'paid') for order in orders]
+        self.assertEqual(transition_chunk(chunk, 'shipped', None, 'test', ''), 2)
+        self.assertEqual(Order.objects.get(pk=orders[0].pk).status, 'cancelled')
+        self.assertEqual(sorted(OrderEvent.objects.values_list('order_id', flat=True)),
+                         [order.pk for order in orders[1:]])
+
+    def test_update_rechecks_status(self):
+        orders = [make_order('paid') for _ in range(3)]
+        original_update = QuerySet.update
+
+        def racing_update(queryset, **kwargs):
+            # Параллельная отмена между SELECT и UPDATE
+            original_update(Order.objects.filter(pk=orders[0].pk), status='cancelled')
+            return original_update(queryset, **kwargs)
+
+        with mock.patch.object(QuerySet, 'update', racing_update):
+            updated = transition_chunk([(order.pk, 'paid') for order in orders], 'shipped', None, 'test', '')
+        self.assertEqual(updated, 2)
+        self.assertEqual(Order.objects.get(pk=orders[0].pk).status, 'cancelled')
+        self.assertEqual(OrderEvent.objects.filter(order_id=orders[0].pk).count(), 0)
+        self.assertEqual(OrderEvent.objects.count(), 2)
+
+    def test_queries_per_chunk(self):
+        ids = [make_order('paid').pk for _ in range(10)]
+        # Выборка кандидатов + в чанке: блокировка, UPDATE, вставка журнала; BEGIN/COMMIT - savepoint
+        with CaptureQueriesContext(connection) as queries:
+            bulk_transition(ids, 'shipped', chunk_size=100)
+        self.assertLessEqual(len(queries), 8)
+
+    def test_unknown_status(self):
+        with self.assertRaises(InvalidTransition):
+            bulk_transition([make_order().pk], 'lost')
+
+
+class OrderStatusEndpointTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user('owner', password='password')
+        cls.staff = User.objects.create_user('staff', password='password', is_staff=True)
+
+    def post_status(self, order, status):
+        return self.client.post(f'/api/order/{order.pk}', json.dumps({'status': status}),
+                                content_type='application/json')
+
+    def test_anonymous_cannot_change_status(self):
+        order = make_order(user=self.owner)
+        self.assertEqual(self.post_status(order, 'cancelled').status_code, 403)
+        self.assertEqual(self.post_status(order, 'paid').status_code, 403)
+
+    def test_owner_can_only_cancel(self):
+        order = make_order('paid', user=self.owner)
+        self.client.force_login(self.owner)
+        self.assertEqual(self.post_status(order, 'shipped').status_code, 403)
+        self.assertEqual(self.post_status(order, 'cancelled').status_code, 200)
+        order.refresh_from_db()
+        self.assertEqual(order.status, 'cancelled')
+        self.assertEqual(order.events.get().user, self.owner)
+
+    def test_staff_fulfilment(self):
+        order = make_order('paid')
+        self.client.force_login(self.staff)
+        self.assertEqual(self.post_status(order, 'shipped').status_code, 200)
+        self.assertEqual(self.post_status(order, 'accepted').status_code, 409)
+
+    def test_paid_only_through_payment(self):
+        order = make_order()
+        self.client.force_login(self.staff)
+        self.assertEqual(self.post_status(order, 'paid').status_code, 403)
+        response = self.client.post(f'/api/payment/{order.pk}', json.dumps(PAYMENT),
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        order.refresh_from_db()
+        self.assertEqual(order.status, 'paid')
+        self.assertEqual(order.events.get().source, 'payment')
+
+    def test_same_status_is_noop(self):
+        order = make_order('shipped')
+        self.client.force_login(self.staff)
+        self.assertEqual(self.post_status(order, 'shipped').status_code, 200)
+        self.assertFalse(order.events.exists())
+
+    def test_bulk_endpoint(self):
+        ids = [make_order('paid').pk for _ in range(3)] + [make_order().pk]
+        body = json.dumps({'ids': ids, 'status': 'shipped'})
+        self.assertEqual(self.client.post('/api/orders/transition', body,
+                                          content_type='application/json').status_code, 403)
+        self.client.force_login(self.staff)
+        response = self.client.post('/api/orders/transition', body, content_type='application/json')
+        self.assertEqual(response.json(), {'updated': 3, 'skipped': 1})
+
+
+class SmallPaginator(EstimatedCountPaginator):
+    max_count = 5
+
+
+class OrderAdminTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('admin', password='password')
+        cls.orders = [make_order() for _ in range(12)]
+        Order.objects.filter(pk=cls.orders[0].pk).update(city="Moscow", phone="79990001122")
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def search(self, term):
+        response = self.client.get('/admin/order/order/', {'q': term})
+        self.assertEqual(response.status_code, 200)
+        return list(response.context['cl'].result_list)
+
+    def test_search(self):
+        self.assertEqual(self.search(str(self.orders[1].pk)), [self.orders[1]])
+        self.assertEqual(self.search('79990001122'), [self.orders[0]])
+        self.assertEqual(self.search('mosc'), [self.orders[0]])
+        self.assertEqual(self.search('9' * 30), [])
+
+    def test_capped_count(self):
+        paginator = SmallPaginator(Order.objects.order_by('pk'), 2)
+        self.assertEqual(paginator.count, 5)
+        self.assertEqual(str(paginator.count), '5+')
+        # Страница за пределами оценки открывается после точного подсчета
+        self.assertEqual(len(paginator.page(6)), 2)
+        self.assertEqual(paginator.count, 12)
+        self.assertEqual(paginator.num_pages, 6)
+
+    def test_exact_count_below_cap(self):
+        paginator = SmallPaginator(Order.objects.filter(pk__in=[order.pk for order in self.orders[:3]]), 2)
+        self.assertEqual(str(paginator.count), '3')
+        with self.assertRaises(EmptyPage):
+            paginator.page(3)
@@ -1,8 +1,10 @@
 from django.urls import path
-from .views import OrderView, OrderDetailView, PaymentView
+from .views import OrderView, OrderDetailView, OrderExportView, OrderTransitionView, PaymentView
 
 urlpatterns = [
     path('orders', OrderView.as_view(), name='orders'),
+    path('orders/export', OrderExportView.as_view(), name='orders-export'),
+    path('orders/transition', OrderTransitionView.as_view(), name='orders-transition'),
     path('order/<int:order_id>', OrderDetailView.as_view(), name='order-detail'),
     path('payment/<int:order_id>', PaymentView.as_view(), name='payment'),
 ]
\ No newline at end of file
@@ -0,0 +1,81 @@
+"""
+Локальное хранилище номеров карт.
+
+Номер карты (PAN) шифруется Fernet и лежит в VaultEntry, а Payment хранит
+только непрозрачный токен, последние 4 цифры и платежную систему. Доступ
+пачками: одна вставка на tokenize и один запрос на detokenize.
+Нужен пакет cryptography; ключ - CARD_VAULT_KEY (Fernet.generate_key()).
+"""
+import secrets
+from functools import lru_cache
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+try:
+    from cryptography.fernet import Fernet
+except ImportError:
+    Fernet = None
+
+TOKEN_PREFIX = 'tok_'
+
+# Префиксы номеров, от длинных к коротким
+CARD_BRANDS = [
+    (('2200', '2201', '2202', '2203', '2204'), 'mir'),
+    (('34', '37'), 'amex'),
+    (tuple(str(prefix) for prefix in range(51, 56)) + tuple(str(prefix) for prefix in range(2221, 2721)), 'mastercard'),
+    (('4',), 'visa'),
+]
+
+
+@lru_cache(maxsize=1)
+def get_cipher():
+    if Fernet is None:
+        raise ImproperlyConfigured("Card vault requires the 'cryptography' package")
+    key = getattr(settings, 'CARD_VAULT_KEY', None)
+    if not key:
+        # Ключ из SECRET_KEY не выводим даже в DEBUG: утечка SECRET_KEY
+        # не должна раскрывать номера карт
+        raise ImproperlyConfigured("CARD_VAULT_KEY is not set")
+    return Fernet(key)
+
+
+@receiver(setting_changed)
+def reset_cipher(setting, **kwargs):
+    if setting == 'CARD_VAULT_KEY':
+        get_cipher.cache_clear()
+
+
+def card_brand(pan):
+    for prefixes, brand in CARD_BRANDS:
+        if pan.startswith(prefixes):
+            return brand
+    return 'other'
+
+
+def encrypt(pan):
+    return get_cipher().encrypt(pan.encode()).decode()
+
+
+def decrypt(ciphertext):
+    return get_cipher().decrypt(ciphertext.encode()).decode()
+
+
+def new_token():
+    return TOKEN_PREFIX + secrets.token_urlsafe(24)
+
+
+def tokenize_cards(pans):
+    """Сохраняет номера в хранилище и возвращает токены в том же порядке"""
+    from .models import VaultEntry
+    entries = [VaultEntry(token=new_token(), ciphertext=encrypt(pan)) for pan in pans]
+    VaultEntry.objects.bulk_create(entries)
+    return [entry.token for entry in entries]
+
+
+def detokenize(tokens):
+    """Номера карт по токенам одним запросом: {token: pan}"""
+    from .models import VaultEntry
+    rows = VaultEntry.objects.filter(token__in=set(tokens)).values_list('token', 'ciphertext')
+    return {token: decrypt(ciphertext) for token, ciphertext in rows}
@@ -1,20 +1,42 @@
 import json
-from django.http import JsonResponse
+from datetime import date
+from django.db import IntegrityError
+from django.db.models import Prefetch
+from django.http import JsonResponse, StreamingHttpResponse
 from django.views import View
 from django.utils.decorators import method_decorator
 from django.views.decorators.csrf import csrf_exempt
 from .models import Order, OrderItem, Payment
+from megano.db import retry_on_lock
+from megano.sparse import requested_fields, sparse
 from product.models import Product
+from product.serializers import first_category_id, review_count
 from .serializers import OrderSerializer
+from .export import iter_orders, render_lines
+from .idempotency import idempotent
+from .lifecycle import InvalidTransition, bulk_transition, transition
+from .vault import card_brand, tokenize_cards
+
+
+def acting_user(request):
+    return request.user if request.user.is_authenticated else None
+
+
+def orders_with_products():
+    """Заказы с позициями и товарами, загруженными фиксированным числом запросов"""
+    return Order.objects.prefetch_related(
+        Prefetch('products', queryset=OrderItem.objects.order_by('id')),
+        Prefetch('products__product', queryset=Product.objects.with_list_data()),
+    )
 
 
 @method_decorator(csrf_exempt, name='dispatch')
 class OrderView(View):
+    @idempotent
     def post(self, request):
         try:
             try:
                 request_data = json.loads(request.body)
-                print("Received data:", request_data)
             except json.JSONDecodeError:
                 return JsonResponse({"error": "Invalid JSON"}, status=400)
 
@@ -27,38 +49,17 @@ class OrderView(View):
             else:
                 return JsonResponse({"error": "Unsupported data format"}, status=400)
 
-            order = Order.objects.create(
-                user=request.user if request.user.is_authenticated else None,
-                full_name=order_data.get('fullName', 'Не указано'),
-                email=order_data.get('email', 'no-email@example.com'),
-                phone=order_data.get('phone', '70000000000'),
-                delivery_type=order_data.get('deliveryType', 'ordinary'),
-                payment_type=order_data.get('paymentType', 'online'),
-                total_cost=sum(
-                    float(item.get('price', 0)) * int(item.get('count', 0))
-                    for item in products_data
-                ),
-                city=order_data.get('city', 'Не указан'),
-                address=order_data.get('address', 'Не указан'),
-                status='accepted'
-            )
-
+            product_ids = {int(item.get('id')) for item in products_data}
+            existing_ids = set(Product.objects.filter(id__in=product_ids).values_list('id', flat=True))
             for item in products_data:
-                try:
-                    product = Product.objects.get(id=item.get('id'))
-                    OrderItem.objects.create(
-                        order=order,
-                        product=product,
-                        quantity=item.get('count', 1),
-                        price=item.get('price', 0)
-                    )
-                except Product.DoesNotExist:
-                    order.delete()
+                if int(item.get('id')) not in existing_ids:
                     return JsonResponse(
                         {"error": f"Product with id {item.get('id')} not found"},
                         status=404
                     )
 
+            order = self.create_order(request, order_data, products_data)
+
             return JsonResponse({
                 "orderId": order.id,
                 "status": "created",
@@ -68,8 +69,39 @@ class OrderView(View):
         except Exception as e:
             return JsonResponse({"error": str(e)}, status=500)
 
+    @retry_on_lock()
+    def create_order(self, request, order_data, products_data):
+        order = Order.objects.create(
+            user=request.user if request.user.is_authenticated else None,
+            full_name=order_data.get('fullName', 'Не указано'),
+            email=order_data.get('email', 'no-email@example.com'),
+            phone=order_data.get('phone', '70000000000'),
+            delivery_type=order_data.get('deliveryType', 'ordinary'),
+            payment_type=order_data.get('paymentType', 'online'),
+            total_cost=sum(
+                float(item.get('price', 0)) * int(item.get('count', 0))
+                for item in products_data
+            ),
+            city=order_data.get('city', 'Не указан'),
+            address=order_data.get('address', 'Не указан'),
+            status='accepted'
+        )
+        OrderItem.objects.bulk_create([
+            OrderItem(
+                order=order,
+                product_id=int(item.get('id')),
+                quantity=item.get('count', 1),
+                price=item.get('price', 0)
+            )
+            for item in products_data
+        ])
+        return order
+
     def get(self, request):
-        orders = Order.objects.all().order_by('-created_at')
+        fields = requested_fields(request)
+        with_products = not fields or 'products' in fields
+        orders = orders_with_products() if with_products else Order.objects.all()
+        orders = orders.order_by('-created_at')
 
         response_data = []
         for order in orders:
@@ -88,10 +120,10 @@ class OrderView(View):
                 "products": []
             }
 
-            for item in order.products.all():
+            for item in order.products.all() if with_products else []:
                 product_data = {
                     "id": item.product.id,
-                    "category": item.product.categories.first().id if item.product.categories.exists() else None,
+                    "category": first_category_id(item.product),
                     "price": float(item.price),
                     "count": item.quantity,
                     "title": item.product.name,
@@ -104,20 +136,75 @@ class OrderView(View):
                         }
                     ] if item.product.image else [],
                     "tags": item.product.tags,
-                    "reviews": item.product.product_reviews.count(),
+                    "reviews": review_count(item.product),
                     "rating": float(item.product.rating) if item.product.rating else None
                 }
                 order_data["products"].append(product_data)
 
             response_data.append(order_data)
 
-        return JsonResponse(response_data, safe=False)
+        return JsonResponse(sparse(response_data, fields), safe=False)
+
+
+class OrderExportView(View):
+    content_types = {
+        'csv': 'text/csv; charset=utf-8',
+        'jsonl': 'application/x-ndjson; charset=utf-8',
+    }
+
+    def get(self, request):
+        if not request.user.is_staff:
+            return JsonResponse({"error": "Forbidden"}, status=403)
+
+        fmt = request.GET.get('format', 'csv')
+        if fmt not in self.content_types:
+            return JsonResponse({"error": "Unsupported format"}, status=400)
+
+        try:
+            date_from = request.GET.get('dateFrom')
+            date_to = request.GET.get('dateTo')
+            filters = {
+                'date_from': date.fromisoformat(date_from) if date_from else None,
+                'date_to': date.fromisoformat(date_to) if date_to else None,
+                'after_id': int(request.GET.get('afterId') or 0),
+            }
+        except ValueError:
+            return JsonResponse({"error": "Invalid filter value"}, status=400)
+
+        response = StreamingHttpResponse(
+            render_lines(iter_orders(**filters), fmt),
+            content_type=self.content_types[fmt]
+        )
+        response['Content-Disposition'] = f'attachment; filename="orders.{fmt}"'
+        return response
+
+
+class OrderTransitionView(View):
+    """Массовая смена статуса заказов для отдела доставки"""
+
+    def post(self, request):
+        if not request.user.is_staff:
+            return JsonResponse({"error": "Forbidden"}, status=403)
+
+        try:
+            data = json.loads(request.body)
+            ids = [int(pk) for pk in data['ids']]
+            updated = bulk_transition(ids, data['status'], user=acting_user(request),
+                                      comment=str(data.get('comment', ''))[:255])
+        except json.JSONDecodeError:
+            return JsonResponse({"error": "Invalid JSON"}, status=400)
+        except (KeyError, TypeError, ValueError):
+            return JsonResponse({"error": "ids and status are required"}, status=400)
+        except InvalidTransition as e:
+            return JsonResponse({"error": str(e)}, status=400)
+
+        return JsonResponse({"updated": updated, "skipped": len(set(ids)) - updated})
 
 
 class OrderDetailView(View):
     def get(self, request, order_id):
         try:
-            order = Order.objects.get(id=order_id)
+            order = orders_with_products().get(id=order_id)
 
             response_data = {
                 "id": order.id,
@@ -134,7 +221,7 @@ class OrderDetailView(View):
                 "products": self._get_products_data(order)
             }
 
-            return JsonResponse(response_data)
+            return JsonResponse(sparse(response_data, requested_fields(request)))
 
         except Order.DoesNotExist:
             return JsonResponse({"error": "Order not found"}, status=404)
@@ -146,8 +233,16 @@ class OrderDetailView(View):
 
             if 'status' in data:
                 if data['status'] in dict(Order.STATUS_CHOICES).keys():
-                    order.status = data['status']
-                    order.save()
+                    error = self._check_permission(request, order, data['status'])
+                    if error:
+                        return JsonResponse({"error": error}, status=403)
+                    # Повтор текущего статуса ничего не меняет и не пишет в журнал
+                    if data['status'] != order.status:
+                        try:
+                            transition(order, data['status'], user=acting_user(request), source='api',
+                                       comment=str(data.get('comment', ''))[:255])
+                        except InvalidTransition as e:
+                            return JsonResponse({"error": str(e), "status": order.status}, status=409)
                     return JsonResponse({
                         "orderId": order.id,
                         "status": "success",
@@ -165,13 +260,24 @@ class OrderDetailView(View):
         except Exception as e:
             return JsonResponse({"error": str(e)}, status=500)
 
+    def _check_permission(self, request, order, status):
+        """Оплата - только через PaymentView, доставка - персонал, владелец может лишь отменить"""
+        if status == 'paid' and status != order.status:
+            return "Use the payment endpoint to pay for the order"
+        if request.user.is_staff:
+            return None
+        is_owner = request.user.is_authenticated and order.user_id == request.user.id
+        if is_owner and status in ('cancelled', order.status):
+            return None
+        return "Forbidden"
+
     def _get_products_data(self, order):
         products = []
         for item in order.products.all():
             product = item.product
             products.append({
                 "id": product.id,
-                "category": product.categories.first().id if product.categories.exists() else None,
+                "category": first_category_id(product),
                 "price": float(item.price),
                 "count": item.quantity,
                 "title": product.name,
@@ -179,7 +285,7 @@ class OrderDetailView(View):
                 "freeDelivery": product.free_delivery,
                 "images": self._get_product_images(product),
                 "tags": product.tags,
-                "reviews": product.product_reviews.count(),
+                "reviews": review_count(product),
                 "rating": float(product.rating) if product.rating else None
             })
         return products
@@ -215,6 +321,7 @@ class PaymentView(View):
         except Order.DoesNotExist:
             return JsonResponse({"error": "Order not found"}, status=404)
 
+    @idempotent
     def post(self, request, order_id):
         try:
             order = Order.objects.get(id=order_id)
@@ -223,18 +330,14 @@ class PaymentView(View):
             if not self._validate_payment_data(data):
                 return JsonResponse({"error": "Invalid payment data"}, status=400)
 
-            Payment.objects.create(
-                order=order,
-                card_number=data['number'],
-                card_name=data['name'],
-                card_exp_month=data['month'],
-                card_exp_year=data['year'],
-                card_cvv=data['code'],
-                amount=order.total_cost
-            )
-
-            order.status = 'processing'
-            order.save()
+            if Payment.objects.filter(order=order).exists():
+                return JsonResponse({"error": "Order is already paid"}, status=409)
+            try:
+                self.register_payment(order, data)
+            except IntegrityError:
+                return JsonResponse({"error": "Order is already paid"}, status=409)
+            except InvalidTransition as e:
+                return JsonResponse({"error": str(e)}, status=409)
 
             return JsonResponse({
                 "status": "payment_processing",
@@ -249,6 +352,23 @@ class PaymentView(View):
         except Exception as e:
             return JsonResponse({"error": str(e)}, status=500)
 
+    @retry_on_lock()
+    def register_payment(self, order, data):
+        number = str(data['number'])
+        # CVV проверен валидатором и дальше не передается
+        Payment.objects.create(
+            order=order,
+            card_token=tokenize_cards([number])[0],
+            card_last4=number[-4:],
+            card_brand=card_brand(number),
+            card_name=data['name'],
+            card_exp_month=data['month'],
+            card_exp_year=data['year'],
+            amount=order.total_cost
+        )
+
+        transition(order, 'paid', source='payment')
+
     def _validate_payment_data(self, data):
         required_fields = {
             'number': lambda x: len(x) == 16 and x.isdigit(),
@@ -1,19 +1,26 @@
-from django.contrib import admin
+from django.contrib import admin, messages
+from django.contrib.admin.helpers import ActionForm
 from django import forms
 import json
-from .models import Product, Category, Specification, Review
+from .models import Product, Category, Specification, Review, Collection, CollectionItem
 from django.utils.safestring import mark_safe
 from django.urls import reverse
+from django.db.models import Count
 from django.utils.html import format_html
+from functools import lru_cache
+from megano.paginators import EstimatedCountPaginator
+from .pricing import InvalidPricing, reprice, schedule_sale, clear_sale, restock
+
+
+@lru_cache(maxsize=4096)
+def decode_tag(tag):
+    return tag.encode('utf-8').decode('unicode-escape')
 
 
 class TagsAdminWidget(forms.Textarea):
     def render(self, name, value, attrs=None, renderer=None):
         if value and isinstance(value, list):
-            decoded_tags = [
-                tag.encode('utf-8').decode('unicode-escape') if isinstance(tag, str) else str(tag)
-                for tag in value
-            ]
+            decoded_tags = [decode_tag(tag) if isinstance(tag, str) else str(tag) for tag in value]
             value = ", ".join(decoded_tags)
         attrs = attrs or {}
         attrs.update({
@@ -65,6 +72,14 @@ class ProductForm(forms.ModelForm):
             raise forms.ValidationError(f"Некорректный JSON: {str(e)}")
 
 
+class BulkUpdateActionForm(ActionForm):
+    percent = forms.DecimalField(label="Процент", required=False, max_digits=5, decimal_places=2)
+    amount = forms.DecimalField(label="Сумма", required=False, max_digits=10, decimal_places=2)
+    count = forms.IntegerField(label="Количество", required=False)
+    date_from = forms.DateField(label="С", required=False, widget=forms.DateInput(attrs={'type': 'date'}))
+    date_to = forms.DateField(label="По", required=False, widget=forms.DateInput(attrs={'type': 'date'}))
+
+
 class ReviewInline(admin.TabularInline):
     model = Review
     extra = 1
@@ -83,12 +98,16 @@ class ProductAdmin(admin.ModelAdmin):
     form = ProductForm
     list_display = ['name', 'price', 'display_image', 'is_limited', 'on_sale', 'display_decoded_tags', 'rating']
     list_filter = ['is_limited', 'categories', 'free_delivery']
-    search_fields = ['name', 'tags']
+    search_fields = ['name', '=sku']
     filter_horizontal = ['categories']
+    show_full_result_count = False
+    paginator = EstimatedCountPaginator
+    action_form = BulkUpdateActionForm
+    actions = ['reprice_percent', 'reprice_amount', 'start_sale', 'stop_sale', 'add_stock']
     inlines = [SpecificationInline, ReviewInline]
     fieldsets = (
         ('Основная информация', {
-            'fields': ('name', 'description', 'full_description', 'image', 'price', 'count')
+            'fields': ('sku', 'name', 'description', 'full_description', 'image', 'price', 'count')
         }),
         ('Категории и теги', {
             'fields': ('categories', 'tags_input')
@@ -114,11 +133,7 @@ class ProductAdmin(admin.ModelAdmin):
 
     def display_decoded_tags(self, obj):
         if obj.tags:
-            decoded_tags = [
-                tag.encode('utf-8').decode('unicode-escape')
-                if isinstance(tag, str) else str(tag)
-                for tag in obj.tags
-            ]
+            decoded_tags = [decode_tag(tag) if isinstance(tag, str) else str(tag) for tag in obj.tags]
             return ", ".join(decoded_tags)
         return "-"
     display_decoded_tags.short_description = "Теги"
@@ -128,6 +143,63 @@ class ProductAdmin(admin.ModelAdmin):
     on_sale.boolean = True
     on_sale.short_description = "Распродажа"
 
+    def action_params(self, request, *required):
+        form = self.action_form(request.POST)
+        form.fields['action'].choices = self.get_action_choices(request)
+        if not form.is_valid() or any(form.cleaned_data.get(name) is None for name in required):
+            labels = ", ".join(str(form.fields[name].label) for name in required)
+            self.message_user(request, f"Заполните поля: {labels}", messages.ERROR)
+            return None
+        return form.cleaned_data
+
+    def run_pricing(self, request, func, *args, **kwargs):
+        """Диапазоны процента и порядок дат проверяет pricing; ошибку показываем сообщением"""
+        try:
+            return func(*args, **kwargs)
+        except InvalidPricing as e:
+            self.message_user(request, f"Некорректные параметры: {e}", messages.ERROR)
+            return None
+
+    def reprice_percent(self, request, queryset):
+        params = self.action_params(request, 'percent')
+        if not params:
+            return
+        updated = self.run_pricing(request, reprice, queryset, percent=params['percent'])
+        if updated is not None:
+            self.message_user(request, f"Цена изменена у {updated} товаров")
+    reprice_percent.short_description = "Изменить цену на процент"
+
+    def reprice_amount(self, request, queryset):
+        params = self.action_params(request, 'amount')
+        if not params:
+            return
+        updated = self.run_pricing(request, reprice, queryset, amount=params['amount'])
+        if updated is not None:
+            self.message_user(request, f"Цена изменена у {updated} товаров")
+    reprice_amount.short_description = "Изменить цену на сумму"
+
+    def start_sale(self, request, queryset):
+        params = self.action_params(request, 'percent', 'date_from', 'date_to')
+        if not params:
+            return
+        updated = self.run_pricing(request, schedule_sale, queryset, params['percent'],
+                                   params['date_from'], params['date_to'])
+        if updated is not None:
+            self.message_user(request, f"Распродажа назначена для {updated} товаров")
+    start_sale.short_description = "Назначить распродажу (скидка в процентах)"
+
+    def stop_sale(self, request, queryset):
+        updated = clear_sale(queryset)
+        self.message_user(request, f"Распродажа снята с {updated} товаров")
+    stop_sale.short_description = "Снять распродажу"
+
+    def add_stock(self, request, queryset):
+        params = self.action_params(request, 'count')
+        if params:
+            updated = restock(queryset, params['count'])
+            self.message_user(request, f"Остаток изменен у {updated} товаров")
+    add_stock.short_description = "Пополнить остаток"
+
     def save_model(self, request, obj, form, change):
         if 'tags_input' in form.cleaned_data:
             obj.tags = form.cleaned_data['tags_input']
@@ -153,4 +225,28 @@ class CategoryAdmin(admin.ModelAdmin):
             url = reverse('admin:app_category_change', args=[obj.parent.id])
             return format_html('<a href="{}">{}</a>', url, obj.parent.name)
         return "-"
-    parent_link.short_description = "Родительская категория"
\ No newline at end of file
+    parent_link.short_description = "Родительская категория"
+
+
+class CollectionItemInline(admin.TabularInline):
+    model = CollectionItem
+    extra = 1
+    fields = ['product', 'position']
+    autocomplete_fields = ['product']
+    ordering = ['position']
+
+
+@admin.register(Collection)
+class CollectionAdmin(admin.ModelAdmin):
+    list_display = ('title', 'slug', 'limit', 'is_active', 'items_count')
+    list_editable = ('is_active',)
+    prepopulated_fields = {'slug': ('title',)}
+    inlines = [CollectionItemInline]
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(items_count=Count('items'))
+
+    def items_count(self, obj):
+        return obj.items_count
+    items_count.short_description = "Товаров"
+    items_count.admin_order_field = 'items_count'
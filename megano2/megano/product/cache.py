@@ -0,0 +1,47 @@
+import time
+from django.core.cache import cache
+from django.utils import timezone
+from megano.caching import cache_is_shared
+
+CATALOG_VERSION_KEY = 'catalog:version'
+
+
+def catalog_version():
+    """Текущая версия каталога, входящая в ключи всех кэшей витрины"""
+    version = cache.get(CATALOG_VERSION_KEY)
+    if version is None:
+        cache.add(CATALOG_VERSION_KEY, initial_version(), timeout=None)
+        version = cache.get(CATALOG_VERSION_KEY, 0)
+    return version
+
+
+def initial_version():
+    """
+    Счетчик начинается с текущего времени в микросекундах: после рестарта
+    или вытеснения ключа номера не повторяются, и старые ETag не совпадут
+    """
+    return time.time_ns() // 1000
+
+
+def bump_catalog_version():
+    """Сбрасывает все кэши каталога одной операцией"""
+    try:
+        cache.incr(CATALOG_VERSION_KEY)
+    except ValueError:
+        cache.set(CATALOG_VERSION_KEY, initial_version(), timeout=None)
+
+
+def catalog_cache_key(name, *parts):
+    suffix = ':'.join(str(part) for part in parts)
+    return f'catalog:{catalog_version()}:{name}:{suffix}'
+
+
+def catalog_etag(request, *args, **kwargs):
+    """
+    Версия для cache_policy: ответы витрины меняются вместе с каталогом и датой
+    (распродажи ограничены date_from/date_to). Счетчик в памяти процесса у
+    каждого воркера свой, поэтому без общего кэша ETag считается по телу ответа.
+    """
+    if not cache_is_shared():
+        return None
+    return f'catalog-{catalog_version()}-{timezone.localdate().isoformat()}'
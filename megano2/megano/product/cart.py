@@ -0,0 +1,74 @@
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from .models import Cart, CartItem
+
+CART_SESSION_KEY = 'cart_id'
+
+
+def get_cart(request, create=False):
+    """Корзина текущего посетителя. Без create=True ничего не пишет ни в БД, ни в сессию"""
+    if request.user.is_authenticated:
+        if create:
+            return Cart.objects.get_or_create(user=request.user)[0]
+        return Cart.objects.filter(user=request.user).first()
+
+    session = request.session
+    cart = None
+    cart_id = session.get(CART_SESSION_KEY)
+    if cart_id:
+        cart = Cart.objects.filter(pk=cart_id, user__isnull=True).first()
+    elif session.session_key:
+        cart = Cart.objects.filter(session_key=session.session_key, user__isnull=True).first()
+
+    if cart is None and create:
+        session_key = session.session_key
+        cart = Cart.objects.create(
+            session_key=session_key if session_key and len(session_key) <= 40 else None
+        )
+    if cart is not None and create and cart_id != cart.pk:
+        session[CART_SESSION_KEY] = cart.pk
+    return cart
+
+
+def touch_cart(cart):
+    """Отмечает активность, чтобы сборщик мусора не удалил живую корзину"""
+    Cart.objects.filter(pk=cart.pk).update(updated_at=timezone.now())
+
+
+def merge_carts(anonymous_cart, user):
+    """Переносит анонимную корзину пользователю при входе"""
+    with transaction.atomic():
+        user_cart = Cart.objects.select_for_update().filter(user=user).first()
+        if user_cart is None:
+            anonymous_cart.user = user
+            anonymous_cart.session_key = None
+            anonymous_cart.save(update_fields=['user', 'session_key'])
+            return anonymous_cart
+
+        existing = dict(user_cart.items.values_list('product_id', 'id'))
+        new_items = []
+        for item in anonymous_cart.items.all():
+            if item.product_id in existing:
+                CartItem.objects.filter(pk=existing[item.product_id]).update(
+                    quantity=F('quantity') + item.quantity
+                )
+            else:
+                new_items.append(CartItem(cart=user_cart, product_id=item.product_id, quantity=item.quantity))
+        CartItem.objects.bulk_create(new_items)
+        anonymous_cart.delete()
+        return user_cart
+
+
+def claim_anonymous_cart(request):
+    """Достает анонимную корзину до login(), пока сессия еще не сменила ключ"""
+    if request.user.is_authenticated:
+        return None
+    return get_cart(request)
+
+
+def attach_cart_to_user(request, anonymous_cart):
+    if anonymous_cart is None:
+        return
+    merge_carts(anonymous_cart, request.user)
+    request.session.pop(CART_SESSION_KEY, None)
@@ -0,0 +1,174 @@
+import csv
+import json
+from datetime import date
+from decimal import Decimal
+from itertools import islice
+from django.db import transaction
+from django.db.models import F
+from .cache import bump_catalog_version
+from .models import Category, Product, Specification
+
+PRODUCT_FIELDS = [
+    'sku', 'name', 'description', 'full_description', 'price', 'sale_price',
+    'date_from', 'date_to', 'count', 'sort_index', 'free_delivery', 'is_limited', 'tags',
+]
+CSV_FIELDS = PRODUCT_FIELDS + ['categories', 'specifications']
+LIST_SEPARATOR = '|'
+
+
+def read_records(stream, fmt):
+    """Построчно читает фид, не загружая его в память целиком"""
+    if fmt == 'csv':
+        for row in csv.DictReader(stream):
+            yield from_csv_row(row)
+    else:
+        for line in stream:
+            if line.strip():
+                yield json.loads(line)
+
+
+def from_csv_row(row):
+    record = dict(row)
+    record['tags'] = split_list(row.get('tags'))
+    record['categories'] = split_list(row.get('categories'))
+    record['specifications'] = dict(
+        item.split('=', 1) for item in split_list(row.get('specifications')) if '=' in item
+    )
+    return record
+
+
+def split_list(value):
+    return [item.strip() for item in (value or '').split(LIST_SEPARATOR) if item.strip()]
+
+
+def to_csv_row(record):
+    row = dict(record)
+    row['tags'] = LIST_SEPARATOR.join(record['tags'])
+    row['categories'] = LIST_SEPARATOR.join(record['categories'])
+    row['specifications'] = LIST_SEPARATOR.join(
+        f"{name}={value}" for name, value in record['specifications'].items()
+    )
+    return row
+
+
+def parse_bool(value):
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() in ('1', 'true', 'yes')
+
+
+def parse_decimal(value):
+    return Decimal(str(value)) if value not in (None, '') else None
+
+
+def parse_date(value):
+    return date.fromisoformat(value) if value else None
+
+
+def build_product(record):
+    return Product(
+        sku=record['sku'].strip(),
+        name=record['name'],
+        description=record.get('description') or "Описание отсутствует",
+        full_description=record.get('full_description') or "",
+        price=parse_decimal(record['price']),
+        sale_price=parse_decimal(record.get('sale_price')),
+        date_from=parse_date(record.get('date_from')),
+        date_to=parse_date(record.get('date_to')),
+        count=int(record.get('count') or 0),
+        sort_index=int(record.get('sort_index') or 0),
+        free_delivery=parse_bool(record.get('free_delivery', True)),
+        is_limited=parse_bool(record.get('is_limited', False)),
+        tags=list(record.get('tags') or []),
+    )
+
+
+class CatalogImporter:
+    """Upsert товаров пачками по sku; категории сопоставляются по имени через словарь в памяти"""
+
+    update_fields = [field for field in PRODUCT_FIELDS if field != 'sku']
+
+    def __init__(self, batch_size=1000):
+        self.batch_size = batch_size
+        self.category_ids = dict(Category.objects.values_list('name', 'id'))
+        self.stats = {'products': 0, 'categories': 0, 'specifications': 0, 'skipped': 0}
+
+    def run(self, records):
+        records = iter(records)
+        while batch := list(islice(records, self.batch_size)):
+            self.import_batch(batch)
+        bump_catalog_version()
+        return self.stats
+
+    def import_batch(self, batch):
+        # Последняя строка с тем же sku побеждает, как и при построчной загрузке
+        by_sku = {}
+        for record in batch:
+            sku = (record.get('sku') or '').strip()
+            if sku:
+                by_sku[sku] = record
+            else:
+                # Без артикула строку не с чем сопоставить при upsert
+                self.stats['skipped'] += 1
+        with transaction.atomic():
+            self.ensure_categories(by_sku.values())
+            Product.objects.bulk_create(
+                [build_product(record) for record in by_sku.values()],
+                update_conflicts=True,
+                unique_fields=['sku'],
+                update_fields=self.update_fields,
+            )
+            product_ids = dict(Product.objects.filter(sku__in=by_sku).values_list('sku', 'id'))
+            Product.objects.filter(id__in=product_ids.values()).update(version=F('version') + 1)
+            self.replace_categories(by_sku, product_ids)
+            self.replace_specifications(by_sku, product_ids)
+        self.stats['products'] += len(by_sku)
+
+    def ensure_categories(self, records):
+        missing = {
+            name for record in records for name in record.get('categories') or []
+            if name not in self.category_ids
+        }
+        if not missing:
+            return
+        Category.objects.bulk_create([Category(name=name) for name in missing])
+        self.category_ids.update(Category.objects.filter(name__in=missing).values_list('name', 'id'))
+        self.stats['categories'] += len(missing)
+
+    def replace_categories(self, by_sku, product_ids):
+        through = Product.categories.through
+        through.objects.filter(product_id__in=product_ids.values()).delete()
+        through.objects.bulk_create([
+            through(product_id=product_ids[sku], category_id=self.category_ids[name])
+            for sku, record in by_sku.items()
+            for name in dict.fromkeys(record.get('categories') or [])
+        ])
+
+    def replace_specifications(self, by_sku, product_ids):
+        Specification.objects.filter(product_id__in=product_ids.values()).delete()
+        specifications = [
+            Specification(product_id=product_ids[sku], name=name.strip(), value=str(value).strip())
+            for sku, record in by_sku.items()
+            for name, value in (record.get('specifications') or {}).items()
+        ]
+        Specification.objects.bulk_create(specifications)
+        self.stats['specifications'] += len(specifications)
+
+
+def export_records(chunk_size=2000):
+    """Товары по одному, с prefetch на каждый чанк итератора"""
+    products = (
+        Product.objects
+        .order_by('id')
+        .prefetch_related('categories', 'specifications')
+        .iterator(chunk_size=chunk_size)
+    )
+    for product in products:
+        record = {field: getattr(product, field) for field in PRODUCT_FIELDS}
+        for field in ('price', 'sale_price'):
+            record[field] = str(record[field]) if record[field] is not None else None
+        for field in ('date_from', 'date_to'):
+            record[field] = record[field].isoformat() if record[field] else None
+        record['categories'] = [category.name for category in product.categories.all()]
+        record['specifications'] = {spec.name: spec.value for spec in product.specifications.all()}
+        yield record
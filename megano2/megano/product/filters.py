@@ -0,0 +1,45 @@
+import re
+from django.core.cache import cache
+from django.db.models import Count
+from .cache import catalog_cache_key
+from .models import Specification
+
+SPEC_PARAM_RE = re.compile(r'^spec\[(?P<name>[^\]]+)\]$')
+FACETS_TIMEOUT = 60 * 10
+
+
+def parse_specification_filters(query):
+    """Достает фильтры вида spec[memory]=24GB из GET-параметров"""
+    filters = {}
+    for key, values in query.lists():
+        match = SPEC_PARAM_RE.match(key)
+        if match:
+            filters[match.group('name').strip()] = [value.strip() for value in values if value.strip()]
+    return {name: values for name, values in filters.items() if values}
+
+
+def filter_by_specifications(products, filters):
+    """Каждый фильтр - полусоединение по индексу (name, value, product)"""
+    for name, values in filters.items():
+        matching = Specification.objects.filter(name=name, value__in=values).values('product_id')
+        products = products.filter(id__in=matching)
+    return products
+
+
+def specification_facets():
+    """Количество товаров по каждому значению характеристики, кэшируется до изменения каталога"""
+    key = catalog_cache_key('spec-facets')
+    facets = cache.get(key)
+    if facets is None:
+        rows = (
+            Specification.objects
+            .values('name', 'value')
+            .annotate(count=Count('product_id', distinct=True))
+            .order_by('name', 'value')
+        )
+        grouped = {}
+        for row in rows:
+            grouped.setdefault(row['name'], []).append({"value": row['value'], "count": row['count']})
+        facets = [{"name": name, "values": values} for name, values in grouped.items()]
+        cache.set(key, facets, FACETS_TIMEOUT)
+    return facets
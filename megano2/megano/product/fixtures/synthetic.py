@@ -0,0 +1,131 @@
+import random
+from decimal import Decimal
+from itertools import islice
+from django.db import transaction
+from product.cache import bump_catalog_version
+from product.models import Category, Product, Review, Specification, Cart, CartItem
+
+SPEC_VALUES = {
+    "memory": ["4GB", "8GB", "12GB", "16GB", "24GB"],
+    "bus": ["PCIe 3.0", "PCIe 4.0", "PCIe 5.0"],
+    "cooling": ["active", "passive", "liquid"],
+    "color": ["black", "white", "silver"],
+    "warranty": ["1 year", "2 years", "3 years"],
+}
+TAGS = ["gaming", "office", "sale", "new", "hit", "rtx", "amd", "silent"]
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def bulk_create_chunked(model, objects, chunk_size):
+    created = 0
+    for chunk in chunked(objects, chunk_size):
+        with transaction.atomic():
+            model.objects.bulk_create(chunk)
+        created += len(chunk)
+    return created
+
+
+def new_ids(model, after_id):
+    return list(model.objects.filter(id__gt=after_id).order_by('id').values_list('id', flat=True))
+
+
+def last_id(model):
+    return model.objects.order_by('-id').values_list('id', flat=True).first() or 0
+
+
+def generate_catalog(products=1000, categories=50, reviews_per_product=3, specs_per_product=4,
+                     carts=100, orders=100, items_per_order=3, chunk_size=1000, seed=0):
+    """Синтетический каталог заданного размера для нагрузочных замеров"""
+    rnd = random.Random(seed)
+    stats = {}
+
+    start = last_id(Category)
+    roots = max(1, categories // 10)
+    bulk_create_chunked(Category, (
+        Category(name=f"Category {i}", is_featured=i < 3) for i in range(roots)
+    ), chunk_size)
+    root_ids = new_ids(Category, start)
+    bulk_create_chunked(Category, (
+        Category(name=f"Category {roots + i}", parent_id=rnd.choice(root_ids))
+        for i in range(categories - roots)
+    ), chunk_size)
+    category_ids = new_ids(Category, start)
+    stats['categories'] = len(category_ids)
+
+    start = last_id(Product)
+    stats['products'] = bulk_create_chunked(Product, (
+        Product(
+            name=f"Product {i}",
+            description=f"Short description {i}",
+            full_description=f"Full description of product {i}. " * 10,
+            price=Decimal(rnd.randint(100, 300000)) / 100,
+            sale_price=Decimal(rnd.randint(50, 100000)) / 100 if i % 7 == 0 else None,
+            count=rnd.randint(0, 50),
+            sort_index=rnd.randint(0, 100),
+            purchase_count=rnd.randint(0, 1000),
+            rating=Decimal(rnd.randint(10, 50)) / 10,
+            free_delivery=rnd.random() < 0.5,
+            is_limited=i % 25 == 0,
+            tags=rnd.sample(TAGS, 2),
+        ) for i in range(products)
+    ), chunk_size)
+    product_ids = new_ids(Product, start)
+
+    through = Product.categories.through
+    bulk_create_chunked(through, (
+        through(product_id=product_id, category_id=rnd.choice(category_ids))
+        for product_id in product_ids
+    ), chunk_size)
+
+    spec_names = list(SPEC_VALUES)
+    stats['specifications'] = bulk_create_chunked(Specification, (
+        Specification(product_id=product_id, name=name, value=rnd.choice(SPEC_VALUES[name]))
+        for product_id in product_ids
+        for name in spec_names[:specs_per_product]
+    ), chunk_size)
+
+    stats['reviews'] = bulk_create_chunked(Review, (
+        Review(product_id=product_id, author=f"user{n}", email=f"user{n}@example.com",
+               text="Synthetic review", rate=rnd.randint(1, 5))
+        for product_id in product_ids
+        for n in range(reviews_per_product)
+    ), chunk_size)
+
+    start = last_id(Cart)
+    bulk_create_chunked(Cart, (Cart(session_key=f"synthetic{start + i}") for i in range(carts)), chunk_size)
+    cart_ids = new_ids(Cart, start)
+    stats['carts'] = len(cart_ids)
+    bulk_create_chunked(CartItem, (
+        CartItem(cart_id=cart_id, product_id=product_id, quantity=rnd.randint(1, 3))
+        for cart_id in cart_ids
+        for product_id in rnd.sample(product_ids, min(3, len(product_ids)))
+    ), chunk_size)
+
+    stats['orders'] = generate_orders(rnd, product_ids, orders, items_per_order, chunk_size)
+    bump_catalog_version()
+    return stats
+
+
+def generate_orders(rnd, product_ids, orders, items_per_order, chunk_size):
+    from order.models import Order, OrderItem
+
+    start = last_id(Order)
+    bulk_create_chunked(Order, (
+        Order(full_name=f"Customer {i}", email=f"customer{i}@example.com", phone="70000000000",
+              payment_type='online', total_cost=Decimal(rnd.randint(1000, 500000)) / 100,
+              city="Moscow", address=f"Street {i}")
+        for i in range(orders)
+    ), chunk_size)
+    order_ids = new_ids(Order, start)
+    bulk_create_chunked(OrderItem, (
+        OrderItem(order_id=order_id, product_id=product_id, quantity=rnd.randint(1, 3),
+                  price=Decimal(rnd.randint(100, 300000)) / 100)
+        for order_id in order_ids
+        for product_id in rnd.sample(product_ids, min(items_per_order, len(product_ids)))
+    ), chunk_size)
+    return len(order_ids)
@@ -0,0 +1,109 @@
+import json
+import logging
+from django.core.cache import cache
+from django.core.paginator import EmptyPage, Paginator
+from django.core.serializers.json import DjangoJSONEncoder
+from .cache import catalog_cache_key
+from .models import Product, Category, Banner, Collection
+from .serializers import ProductSerializer, CategorySerializer, SaleItemSerializer, BannerSerializer
+
+logger = logging.getLogger(__name__)
+
+LIMITED_COLLECTION = 'limited'
+LIMITED_PRODUCTS_LIMIT = 16
+
+
+def popular_products(request):
+    products = Product.objects.with_list_data().order_by('-sort_index', '-purchase_count')[:8]
+    return ProductSerializer(products, many=True, context={'request': request}).data
+
+
+def collection_products(slug):
+    """Товары активной подборки в порядке из админки; None, если подборки нет"""
+    collection = Collection.objects.filter(slug=slug, is_active=True).first()
+    if collection is None:
+        return None
+    ids = list(collection.items.values_list('product_id', flat=True)[:collection.limit])
+    products = Product.objects.with_list_data().in_bulk(ids)
+    return [products[product_id] for product_id in ids if product_id in products]
+
+
+def limited_products(request):
+    products = collection_products(LIMITED_COLLECTION)
+    if products is None:
+        products = Product.objects.with_list_data().filter(is_limited=True).order_by(
+            '-sort_index', '-purchase_count', 'id'
+        )[:LIMITED_PRODUCTS_LIMIT]
+    return ProductSerializer(products, many=True, context={'request': request}).data
+
+
+def featured_categories(request):
+    categories = Category.objects.filter(is_featured=True).order_by('id').prefetch_related('subcategories')[:3]
+    return CategorySerializer(categories, many=True).data
+
+
+def active_banners(request):
+    banners = Banner.objects.filter(is_active=True)
+    return BannerSerializer(banners, many=True, context={'request': request}).data
+
+
+def sale_page(request, page=1, fields=None):
+    sale_products = Product.objects.filter(sale_price__isnull=False).order_by('-date_from')
+    paginator = Paginator(sale_products, 5)
+    try:
+        page_obj = paginator.page(page)
+    except EmptyPage:
+        page_obj = paginator.page(1)
+    return {
+        "items": SaleItemSerializer(
+            page_obj.object_list, many=True, context={'request': request, 'fields': fields}
+        ).data,
+        "currentPage": page_obj.number,
+        "lastPage": paginator.num_pages,
+    }
+
+
+# Блок главной -> (построитель, TTL в секундах). Ключи кэша включают версию каталога,
+# TTL ограничивает устаревание данных, которые версию не меняют.
+HOME_BLOCKS = {
+    'banners': (active_banners, 300),
+    'categories': (featured_categories, 600),
+    'popular': (popular_products, 120),
+    'limited': (limited_products, 120),
+    'sales': (sale_page, 60),
+}
+
+
+def cached_block(request, name):
+    """Блок из кэша или заново с TTL блока"""
+    builder, ttl = HOME_BLOCKS[name]
+    key = catalog_cache_key('home-block', name)
+    data = cache.get(key)
+    if data is None:
+        data = builder(request)
+        cache.set(key, data, ttl)
+    return data
+
+
+def build_block(request, name):
+    """Как cached_block, но ошибка одного блока не ломает всю страницу"""
+    try:
+        return cached_block(request, name)
+    except Exception:
+        logger.exception("home block %s failed", name)
+        return None
+
+
+def render_home(request):
+    """Готовый JSON главной; кэшируется целиком, только если все блоки собрались"""
+    key = catalog_cache_key('home', 'page')
+    body = cache.get(key)
+    if body is not None:
+        return body
+
+    blocks = {name: build_block(request, name) for name in HOME_BLOCKS}
+    failed = [name for name, data in blocks.items() if data is None]
+    body = json.dumps({**blocks, "errors": failed}, cls=DjangoJSONEncoder, ensure_ascii=False)
+    if not failed:
+        cache.set(key, body, min(ttl for _, ttl in HOME_BLOCKS.values()))
+    return body
@@ -0,0 +1,157 @@
+import json
+import statistics
+import subprocess
+import time
+from datetime import datetime, timezone
+from urllib.request import Request, urlopen
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from order.models import Order
+from product.models import Product
+from user.tokens import issue_tokens
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def current_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        "Прогоняет эндпоинты /api/ и считает p50/p95/p99, запросы к БД и пропускную способность. "
+        "Данные готовит generate_catalog; для эндпоинтов с токеном нужен активный пользователь. "
+        "Вход по паролю замеряет bench_sign_in."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=50, help="Замеров на эндпоинт")
+        parser.add_argument('--warmup', type=int, default=5)
+        parser.add_argument('--server', help="Адрес запущенного сервера, например http://127.0.0.1:8000")
+        parser.add_argument('--output', help="Куда сохранить результаты в JSON")
+        parser.add_argument('--compare', help="JSON предыдущего прогона для сравнения")
+
+    def endpoints(self, requests):
+        """Пары (подпись, фабрика запроса); фабрика возвращает (метод, url, заголовки, тело)"""
+        product_id = Product.objects.values_list('id', flat=True).first()
+        order_id = Order.objects.values_list('id', flat=True).first()
+        urls = [
+            '/api/home',
+            '/api/banners',
+            '/api/categories',
+            '/api/popular',
+            '/api/limited',
+            '/api/sales',
+            '/api/catalog',
+            '/api/catalog?currentPage=2&sort=price&sortType=dec',
+            '/api/catalog/specifications',
+            '/api/tags',
+            '/api/basket',
+            '/api/orders',
+        ]
+        if product_id:
+            urls += [f'/api/product/{product_id}/', f'/api/product/{product_id}/reviews']
+        if order_id:
+            urls.append(f'/api/order/{order_id}')
+        endpoints = [(url, lambda url=url: ('GET', url, {}, None)) for url in urls]
+
+        user = User.objects.filter(is_active=True).order_by('id').first()
+        if user:
+            tokens = issue_tokens(user)
+            bearer = {'Authorization': f"Bearer {tokens['access']}"}
+            endpoints.append(('/api/profile (bearer)', lambda: ('GET', '/api/profile', bearer, None)))
+            # Refresh одноразовый: токены выпускаются заранее, чтобы подпись не попала в замер
+            refresh = iter([issue_tokens(user)['refresh'] for _ in range(requests)])
+            endpoints.append(('POST /api/token/refresh', lambda: (
+                'POST', '/api/token/refresh', {}, json.dumps({'refresh': next(refresh)}).encode()
+            )))
+        return endpoints
+
+    def handle(self, *args, **options):
+        client = None if options['server'] else Client(SERVER_NAME='localhost')
+        results = {}
+        for url, make_request in self.endpoints(options['requests'] + options['warmup']):
+            results[url] = self.measure(client, options['server'], make_request, options['requests'], options['warmup'])
+            row = results[url]
+            self.stdout.write(
+                f"{url:55} p50 {row['p50_ms']:8.2f}  p95 {row['p95_ms']:8.2f}  p99 {row['p99_ms']:8.2f} ms  "
+                f"queries {row['queries']}  {row['rps']:.0f} rps"
+            )
+
+        report = {
+            'commit': current_commit(),
+            'created_at': datetime.now(timezone.utc).isoformat(),
+            'products': Product.objects.count(),
+            'orders': Order.objects.count(),
+            'endpoints': results,
+        }
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                json.dump(report, f, indent=2)
+        if options['compare']:
+            self.compare(options['compare'], results)
+
+    def measure(self, client, server, make_request, requests, warmup):
+        for _ in range(warmup):
+            self.fetch(client, server, *make_request())
+
+        samples = []
+        queries = []
+        started = time.perf_counter()
+        for _ in range(requests):
+            request_started = time.perf_counter()
+            status, query_count = self.fetch(client, server, *make_request())
+            samples.append((time.perf_counter() - request_started) * 1000)
+            queries.append(query_count)
+        elapsed = time.perf_counter() - started
+
+        return {
+            'status': status,
+            'p50_ms': round(percentile(samples, 50), 3),
+            'p95_ms': round(percentile(samples, 95), 3),
+            'p99_ms': round(percentile(samples, 99), 3),
+            'mean_ms': round(statistics.fmean(samples), 3),
+            'queries': None if server else max(queries),
+            'rps': round(requests / elapsed, 1),
+        }
+
+    def fetch(self, client, server, method, url, headers, body):
+        if server:
+            request = Request(server.rstrip('/') + url, data=body, method=method,
+                              headers={'Content-Type': 'application/json', **headers})
+            with urlopen(request) as response:
+                response.read()
+                return response.status, None
+        with CaptureQueriesContext(connection) as captured:
+            if method == 'POST':
+                response = client.post(url, body, content_type='application/json', headers=headers)
+            else:
+                response = client.get(url, headers=headers)
+        return response.status_code, len(captured)
+
+    def compare(self, path, results):
+        with open(path, encoding='utf-8') as f:
+            baseline = json.load(f)['endpoints']
+        self.stdout.write(f"\nСравнение с {path}:")
+        for url, row in results.items():
+            before = baseline.get(url)
+            if not before:
+                continue
+            delta = (row['p95_ms'] - before['p95_ms']) / before['p95_ms'] * 100 if before['p95_ms'] else 0
+            style = self.style.ERROR if delta > 10 else self.style.SUCCESS
+            self.stdout.write(style(
+                f"{url:55} p95 {before['p95_ms']:8.2f} -> {row['p95_ms']:8.2f} ms ({delta:+.0f}%)  "
+                f"queries {before['queries']} -> {row['queries']}"
+            ))
@@ -0,0 +1,114 @@
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from django.core.management.base import BaseCommand
+
+PROFILES = {
+    'default': {
+        'pragmas': [],
+        'begin': 'BEGIN',
+        'timeout': 5,
+    },
+    'tuned': {
+        'pragmas': [
+            'PRAGMA journal_mode=WAL',
+            'PRAGMA synchronous=NORMAL',
+            'PRAGMA mmap_size=134217728',
+            'PRAGMA cache_size=-20000',
+            'PRAGMA temp_store=MEMORY',
+        ],
+        'begin': 'BEGIN IMMEDIATE',
+        'timeout': 20,
+    },
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Сравнивает пропускную способность SQLite при конкурентных чтениях и записях "
+        "в стандартном режиме и с профилем SQLITE_TUNING (WAL, pragma, IMMEDIATE)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--readers', type=int, default=8)
+        parser.add_argument('--writers', type=int, default=4)
+        parser.add_argument('--seconds', type=float, default=5)
+        parser.add_argument('--rows', type=int, default=10000)
+
+    def handle(self, *args, **options):
+        for name, profile in PROFILES.items():
+            with tempfile.TemporaryDirectory() as directory:
+                path = os.path.join(directory, 'bench.sqlite3')
+                self.prepare(path, profile, options['rows'])
+                result = self.run(path, profile, options)
+            self.stdout.write(
+                f"{name:8} чтений/с {result['reads'] / options['seconds']:9.0f}  "
+                f"записей/с {result['writes'] / options['seconds']:8.0f}  "
+                f"ошибок блокировки {result['locked']}"
+            )
+
+    def connect(self, path, profile):
+        connection = sqlite3.connect(path, timeout=profile['timeout'], isolation_level=None,
+                                     check_same_thread=False)
+        for pragma in profile['pragmas']:
+            connection.execute(pragma)
+        return connection
+
+    def prepare(self, path, profile, rows):
+        connection = self.connect(path, profile)
+        connection.execute("CREATE TABLE item (id INTEGER PRIMARY KEY, cart_id INTEGER, quantity INTEGER)")
+        connection.execute("CREATE INDEX item_cart ON item (cart_id)")
+        connection.executemany(
+            "INSERT INTO item (cart_id, quantity) VALUES (?, 1)",
+            ((i % 1000,) for i in range(rows))
+        )
+        connection.close()
+
+    def run(self, path, profile, options):
+        result = {'reads': 0, 'writes': 0, 'locked': 0}
+        lock = threading.Lock()
+        deadline = time.monotonic() + options['seconds']
+
+        def count(key):
+            with lock:
+                result[key] += 1
+
+        def reader(number):
+            connection = self.connect(path, profile)
+            while time.monotonic() < deadline:
+                try:
+                    connection.execute(
+                        "SELECT SUM(quantity) FROM item WHERE cart_id = ?", (number % 1000,)
+                    ).fetchone()
+                    count('reads')
+                except sqlite3.OperationalError:
+                    count('locked')
+                number += 1
+            connection.close()
+
+        def writer(number):
+            # Как корзина: прочитать позицию и обновить ее в одной транзакции
+            connection = self.connect(path, profile)
+            while time.monotonic() < deadline:
+                try:
+                    connection.execute(profile['begin'])
+                    connection.execute("SELECT quantity FROM item WHERE cart_id = ?", (number % 1000,)).fetchall()
+                    connection.execute("UPDATE item SET quantity = quantity + 1 WHERE cart_id = ?", (number % 1000,))
+                    connection.execute("COMMIT")
+                    count('writes')
+                except sqlite3.OperationalError:
+                    if connection.in_transaction:
+                        connection.execute("ROLLBACK")
+                    count('locked')
+                number += 7
+            connection.close()
+
+        threads = [threading.Thread(target=reader, args=(i,)) for i in range(options['readers'])]
+        threads += [threading.Thread(target=writer, args=(i,)) for i in range(options['writers'])]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return result
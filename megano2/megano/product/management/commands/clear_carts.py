@@ -0,0 +1,87 @@
+import logging
+import time
+from datetime import timedelta
+from django.apps import apps
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max, Min
+from django.utils import timezone
+from product.models import Cart
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = (
+        "Удаляет брошенные анонимные корзины и истекшие сессии небольшими пачками. "
+        "Для периодического запуска - cron или --every."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=30,
+                            help="Возраст последней активности корзины, после которого она удаляется")
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help="Ширина диапазона id в одном DELETE")
+        parser.add_argument('--pause', type=float, default=0.1,
+                            help="Пауза между пачками, секунд")
+        parser.add_argument('--skip-sessions', action='store_true',
+                            help="Не трогать таблицу django_session")
+        parser.add_argument('--every', type=int, default=0,
+                            help="Повторять каждые N секунд вместо однократного запуска")
+
+    def handle(self, *args, **options):
+        while True:
+            self.collect(options)
+            if not options['every']:
+                break
+            time.sleep(options['every'])
+
+    def collect(self, options):
+        started = time.monotonic()
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        carts, items = self.clear_carts(cutoff, options['batch_size'], options['pause'])
+        sessions = 0
+        if not options['skip_sessions'] and apps.is_installed('django.contrib.sessions'):
+            sessions = self.clear_sessions(options['batch_size'], options['pause'])
+
+        elapsed = time.monotonic() - started
+        logger.info(
+            "cart gc finished",
+            extra={'carts': carts, 'cart_items': items, 'sessions': sessions, 'seconds': round(elapsed, 3)}
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Удалено корзин: {carts}, позиций: {items}, сессий: {sessions} за {elapsed:.1f} с"
+        ))
+
+    def clear_carts(self, cutoff, batch_size, pause):
+        abandoned = Cart.objects.filter(user__isnull=True, updated_at__lt=cutoff)
+        bounds = abandoned.aggregate(low=Min('id'), high=Max('id'))
+        if bounds['low'] is None:
+            return 0, 0
+
+        carts = items = 0
+        low = bounds['low']
+        while low <= bounds['high']:
+            # Каждая пачка - отдельная короткая транзакция, чтобы не держать блокировку записи
+            with transaction.atomic():
+                _, deleted = abandoned.filter(id__gte=low, id__lt=low + batch_size).delete()
+            carts += deleted.get('product.Cart', 0)
+            items += deleted.get('product.CartItem', 0)
+            low += batch_size
+            if pause:
+                time.sleep(pause)
+        return carts, items
+
+    def clear_sessions(self, batch_size, pause):
+        from django.contrib.sessions.models import Session
+
+        expired = Session.objects.filter(expire_date__lt=timezone.now())
+        total = 0
+        while True:
+            keys = list(expired.values_list('session_key', flat=True)[:batch_size])
+            if not keys:
+                return total
+            with transaction.atomic():
+                total += Session.objects.filter(session_key__in=keys).delete()[0]
+            if pause:
+                time.sleep(pause)
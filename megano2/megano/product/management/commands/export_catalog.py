@@ -0,0 +1,31 @@
+import csv
+import json
+from django.core.management.base import BaseCommand
+from product.catalog_io import CSV_FIELDS, export_records, to_csv_row
+
+
+class Command(BaseCommand):
+    help = "Потоковая выгрузка каталога в CSV или JSONL"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', help="Файл выгрузки, по умолчанию stdout")
+        parser.add_argument('--format', choices=['csv', 'jsonl'], default='jsonl')
+        parser.add_argument('--chunk-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        stream = open(options['output'], 'w', encoding='utf-8', newline='') if options['output'] else self.stdout
+        records = export_records(chunk_size=options['chunk_size'])
+        # Строки уже заканчиваются переводом строки, OutputWrapper не должен добавлять свой
+        self.stdout.ending = ''
+        try:
+            if options['format'] == 'csv':
+                writer = csv.DictWriter(stream, fieldnames=CSV_FIELDS)
+                writer.writeheader()
+                for record in records:
+                    writer.writerow(to_csv_row(record))
+            else:
+                for record in records:
+                    stream.write(json.dumps(record, ensure_ascii=False) + '\n')
+        finally:
+            if stream is not self.stdout:
+                stream.close()
@@ -0,0 +1,32 @@
+import time
+from django.core.management.base import BaseCommand
+from product.fixtures.synthetic import generate_catalog
+
+
+class Command(BaseCommand):
+    help = "Заполняет базу синтетическим каталогом для нагрузочных замеров"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=1000)
+        parser.add_argument('--categories', type=int, default=50)
+        parser.add_argument('--reviews', type=int, default=3, help="Отзывов на товар")
+        parser.add_argument('--specs', type=int, default=4, help="Характеристик на товар")
+        parser.add_argument('--carts', type=int, default=100)
+        parser.add_argument('--orders', type=int, default=100)
+        parser.add_argument('--chunk-size', type=int, default=1000)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        stats = generate_catalog(
+            products=options['products'],
+            categories=options['categories'],
+            reviews_per_product=options['reviews'],
+            specs_per_product=options['specs'],
+            carts=options['carts'],
+            orders=options['orders'],
+            chunk_size=options['chunk_size'],
+            seed=options['seed'],
+        )
+        created = ", ".join(f"{name}: {count}" for name, count in stats.items())
+        self.stdout.write(self.style.SUCCESS(f"Создано {created} за {time.monotonic() - started:.1f} с"))
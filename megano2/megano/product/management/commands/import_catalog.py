@@ -0,0 +1,28 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from product.catalog_io import CatalogImporter, read_records
+
+
+class Command(BaseCommand):
+    help = "Потоковый импорт каталога из CSV или JSONL с upsert по артикулу (sku)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Файл фида")
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help="По умолчанию - по расширению файла")
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        fmt = options['format'] or ('csv' if options['path'].endswith('.csv') else 'jsonl')
+        started = time.monotonic()
+        try:
+            with open(options['path'], encoding='utf-8', newline='') as stream:
+                stats = CatalogImporter(batch_size=options['batch_size']).run(read_records(stream, fmt))
+        except (KeyError, ValueError) as e:
+            raise CommandError(f"Некорректная строка фида: {e}")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Товаров: {stats['products']}, новых категорий: {stats['categories']}, "
+            f"характеристик: {stats['specifications']} за {time.monotonic() - started:.1f} с"
+        ))
+        if stats['skipped']:
+            self.stderr.write(self.style.WARNING(f"Пропущено строк без артикула (sku): {stats['skipped']}"))
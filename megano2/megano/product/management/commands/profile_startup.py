@@ -0,0 +1,105 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Что делает воркер при старте: настройка Django, загрузка URL-ов и WSGI-приложения с middleware
+BOOT_SCRIPT = """
+import json, resource, time
+started = time.perf_counter()
+import django
+django.setup()
+from django.urls import get_resolver
+get_resolver().url_patterns
+from megano.wsgi import application
+print(json.dumps({
+    'boot_ms': (time.perf_counter() - started) * 1000,
+    'maxrss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    'modules': len(__import__('sys').modules),
+}))
+"""
+
+
+def parse_importtime(stderr):
+    """Строки -X importtime: 'import time: self [us] | cumulative | имя'"""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|', 2)
+        rows.append({
+            'module': name.strip(),
+            'self_ms': int(self_us) / 1000,
+            'cumulative_ms': int(cumulative_us) / 1000,
+        })
+    return rows
+
+
+class Command(BaseCommand):
+    help = (
+        "Замеряет холодный старт воркера для одного или нескольких профилей настроек: "
+        "время импорта по модулям (python -X importtime), время загрузки и память"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--settings-module', action='append', dest='profiles',
+            help="Профиль настроек; можно указать несколько раз. По умолчанию megano.settings и megano.settings_api",
+        )
+        parser.add_argument('--runs', type=int, default=5, help="Запусков для медианы времени старта")
+        parser.add_argument('--top', type=int, default=20, help="Сколько самых медленных модулей показать")
+        parser.add_argument('--output', help="Куда сохранить результаты в JSON")
+
+    def handle(self, *args, **options):
+        profiles = options['profiles'] or ['megano.settings', 'megano.settings_api']
+        report = {}
+        for profile in profiles:
+            report[profile] = self.profile(profile, options['runs'], options['top'])
+
+        if len(profiles) > 1:
+            base, *others = profiles
+            for other in others:
+                self.stdout.write(self.style.SUCCESS(
+                    f"{other} против {base}: старт {report[other]['boot_ms']:.0f} / {report[base]['boot_ms']:.0f} мс, "
+                    f"память {report[other]['maxrss_kb'] // 1024} / {report[base]['maxrss_kb'] // 1024} МБ, "
+                    f"модулей {report[other]['modules']} / {report[base]['modules']}"
+                ))
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                json.dump(report, f, indent=2)
+
+    def run_boot(self, profile, importtime=False):
+        env = {**os.environ, 'DJANGO_SETTINGS_MODULE': profile}
+        command = [sys.executable] + (['-X', 'importtime'] if importtime else []) + ['-c', BOOT_SCRIPT]
+        result = subprocess.run(command, cwd=settings.BASE_DIR, env=env, capture_output=True, text=True)
+        if result.returncode != 0:
+            raise CommandError(f"{profile}: воркер не стартовал\n{result.stderr[-2000:]}")
+        return json.loads(result.stdout.strip().splitlines()[-1]), result.stderr
+
+    def profile(self, profile, runs, top):
+        runs_data = [self.run_boot(profile)[0] for _ in range(runs)]
+        stats, stderr = self.run_boot(profile, importtime=True)
+        imports = parse_importtime(stderr)
+
+        result = {
+            'boot_ms': round(statistics.median(run['boot_ms'] for run in runs_data), 1),
+            'maxrss_kb': max(run['maxrss_kb'] for run in runs_data),
+            'modules': stats['modules'],
+            'top_imports': sorted(imports, key=lambda row: row['cumulative_ms'], reverse=True)[:top],
+        }
+
+        self.stdout.write(
+            f"\n{profile}: старт {result['boot_ms']:.0f} мс (медиана {runs}), "
+            f"память {result['maxrss_kb'] // 1024} МБ, модулей {result['modules']}"
+        )
+        # Верхнеуровневые пакеты проекта и зависимостей - по суммарному времени
+        packages = {}
+        for row in imports:
+            package = row['module'].split('.')[0]
+            packages[package] = packages.get(package, 0) + row['self_ms']
+        for package, ms in sorted(packages.items(), key=lambda item: item[1], reverse=True)[:top]:
+            self.stdout.write(f"  {package:40} {ms:8.1f} мс")
+        return result
@@ -0,0 +1,19 @@
+# Generated by Django 5.2 on 2026-10-19 14:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("product", "0003_product_version"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="specification",
+            index=models.Index(
+                fields=["name", "value", "product"], name="spec_name_value_product_idx"
+            ),
+        ),
+    ]
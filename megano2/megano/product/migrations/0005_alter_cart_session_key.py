@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-19 14:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("product", "0004_specification_name_value_product_idx"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="cart",
+            name="session_key",
+            field=models.CharField(blank=True, db_index=True, max_length=40, null=True),
+        ),
+    ]
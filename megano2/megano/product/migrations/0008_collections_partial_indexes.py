@@ -0,0 +1,99 @@
+# Generated by Django 5.2 on 2026-10-19 14:18
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("product", "0007_product_sku"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Collection",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("slug", models.SlugField(unique=True)),
+                ("title", models.CharField(max_length=255)),
+                (
+                    "limit",
+                    models.PositiveSmallIntegerField(
+                        default=16, verbose_name="Максимум товаров"
+                    ),
+                ),
+                ("is_active", models.BooleanField(default=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name="CollectionItem",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("position", models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                "ordering": ["position"],
+            },
+        ),
+        migrations.AddIndex(
+            model_name="category",
+            index=models.Index(
+                condition=models.Q(("is_featured", True)),
+                fields=["id"],
+                name="category_featured_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(
+                condition=models.Q(("is_limited", True)),
+                fields=["-sort_index", "-purchase_count"],
+                name="product_limited_idx",
+            ),
+        ),
+        migrations.AddField(
+            model_name="collectionitem",
+            name="collection",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="items",
+                to="product.collection",
+            ),
+        ),
+        migrations.AddField(
+            model_name="collectionitem",
+            name="product",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE, to="product.product"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="collectionitem",
+            index=models.Index(
+                fields=["collection", "position"], name="collection_item_position_idx"
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="collectionitem",
+            constraint=models.UniqueConstraint(
+                fields=("collection", "product"), name="collection_item_unique"
+            ),
+        ),
+    ]
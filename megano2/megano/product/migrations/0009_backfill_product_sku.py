@@ -0,0 +1,21 @@
+from django.db import migrations, models
+from django.db.models.functions import Cast, Concat
+
+
+def backfill_sku(apps, schema_editor):
+    """Артикул по id для товаров без него, чтобы выгрузка каталога загружалась обратно"""
+    Product = apps.get_model("product", "Product")
+    Product.objects.filter(models.Q(sku__isnull=True) | models.Q(sku="")).update(
+        sku=Concat(models.Value("P"), Cast("id", models.CharField()))
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("product", "0008_collections_partial_indexes"),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_sku, migrations.RunPython.noop),
+    ]
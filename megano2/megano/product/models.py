@@ -1,12 +1,15 @@
 from django.db import models
+from django.db.models import Count, F, Q
 from django.contrib.auth.models import User
 from django.apps import apps
+from .cache import bump_catalog_version
 
 
 class Cart(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, null=True, blank=True)
-    session_key = models.CharField(max_length=40, null=True, blank=True)
+    session_key = models.CharField(max_length=40, null=True, blank=True, db_index=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return f"Cart ({self.user or self.session_key})"
@@ -31,6 +34,14 @@ class Banner(models.Model):
     def __str__(self):
         return self.title
 
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        bump_catalog_version()
+
+    def delete(self, *args, **kwargs):
+        bump_catalog_version()
+        return super().delete(*args, **kwargs)
+
 
 class Category(models.Model):
     """Модель категории товара"""
@@ -45,12 +56,41 @@ class Category(models.Model):
     image = models.ImageField(upload_to='categories/', null=True, blank=True)
     is_featured = models.BooleanField("Избранная категория", default=False)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['id'], condition=Q(is_featured=True), name='category_featured_idx'),
+        ]
+
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        bump_catalog_version()
+
+    def delete(self, *args, **kwargs):
+        bump_catalog_version()
+        return super().delete(*args, **kwargs)
+
+    def get_descendant_ids(self):
+        """id категории и всех вложенных, по одному запросу на уровень дерева"""
+        ids = [self.pk]
+        level = [self.pk]
+        while level:
+            level = list(Category.objects.filter(parent_id__in=level).values_list('id', flat=True))
+            ids.extend(level)
+        return ids
+
+
+class ProductQuerySet(models.QuerySet):
+    def with_list_data(self):
+        """Все, что нужно ProductSerializer, без запроса на каждый товар"""
+        return self.prefetch_related('categories').annotate(reviews_count=Count('product_reviews'))
+
 
 class Product(models.Model):
     """Модель товара"""
+    sku = models.CharField("Артикул", max_length=64, unique=True, null=True, blank=True)
     name = models.CharField("Название", max_length=255)
     description = models.TextField(default="Описание отсутствует")
     full_description = models.TextField("Полное описание", default="")
@@ -77,13 +117,40 @@ class Product(models.Model):
             self.save()
     is_limited = models.BooleanField("Ограниченный тираж", default=False)
     categories = models.ManyToManyField(Category, related_name='products', verbose_name="Категории")
+    version = models.PositiveIntegerField("Версия", default=1, editable=False)
+
+    objects = ProductQuerySet.as_manager()
 
     class Meta:
         ordering = ['-sort_index', '-purchase_count']
+        indexes = [
+            models.Index(
+                fields=['-sort_index', '-purchase_count'],
+                condition=Q(is_limited=True),
+                name='product_limited_idx',
+            ),
+        ]
 
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        if self.pk and not self._state.adding:
+            # Инкремент в БД: устаревший экземпляр не затрет bump_version() отзывов и характеристик
+            self.version = F('version') + 1
+            if kwargs.get('update_fields') is not None:
+                kwargs['update_fields'] = {*kwargs['update_fields'], 'version'}
+        super().save(*args, **kwargs)
+        if hasattr(self.version, 'resolve_expression'):
+            self.refresh_from_db(fields=['version'])
+        bump_catalog_version()
+
+    @classmethod
+    def bump_version(cls, product_id):
+        """Инвалидирует ETag карточки товара без загрузки строки"""
+        cls.objects.filter(pk=product_id).update(version=F('version') + 1)
+        bump_catalog_version()
+
 
 class Review(models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='product_reviews')
@@ -100,11 +167,76 @@ class Review(models.Model):
     def __str__(self):
         return f"Review by {self.author} for {self.product.name}"
 
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        Product.bump_version(self.product_id)
+
+    def delete(self, *args, **kwargs):
+        Product.bump_version(self.product_id)
+        return super().delete(*args, **kwargs)
+
 
 class Specification(models.Model):
     product = models.ForeignKey(Product, related_name='specifications', on_delete=models.CASCADE)
     name = models.CharField(max_length=100, verbose_name="Характеристика")
     value = models.CharField(max_length=100)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['name', 'value', 'product'], name='spec_name_value_product_idx'),
+        ]
+
     def __str__(self):
-        return f"{self.product.name} - {self.name}: {self.value}"
\ No newline at end of file
+        return f"{self.product.name} - {self.name}: {self.value}"
+
+    def save(self, *args, **kwargs):
+        self.name = self.name.strip()
+        self.value = self.value.strip()
+        super().save(*args, **kwargs)
+        Product.bump_version(self.product_id)
+
+    def delete(self, *args, **kwargs):
+        Product.bump_version(self.product_id)
+        return super().delete(*args, **kwargs)
+
+
+class Collection(models.Model):
+    """Подборка товаров для витрины в заданном порядке"""
+    slug = models.SlugField(unique=True)
+    title = models.CharField(max_length=255)
+    limit = models.PositiveSmallIntegerField("Максимум товаров", default=16)
+    is_active = models.BooleanField(default=True)
+
+    def __str__(self):
+        return self.title
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        bump_catalog_version()
+
+    def delete(self, *args, **kwargs):
+        bump_catalog_version()
+        return super().delete(*args, **kwargs)
+
+
+class CollectionItem(models.Model):
+    collection = models.ForeignKey(Collection, related_name='items', on_delete=models.CASCADE)
+    product = models.ForeignKey(Product, on_delete=models.CASCADE)
+    position = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ['position']
+        constraints = [
+            models.UniqueConstraint(fields=['collection', 'product'], name='collection_item_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['collection', 'position'], name='collection_item_position_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        bump_catalog_version()
+
+    def delete(self, *args, **kwargs):
+        bump_catalog_version()
+        return super().delete(*args, **kwargs)
@@ -0,0 +1,71 @@
+from decimal import Decimal
+from django.db import transaction
+from django.db.models import F, Value
+from django.db.models.functions import Greatest, Round
+from .cache import bump_catalog_version
+from .models import Category, Product
+
+ZERO = Value(Decimal('0.00'))
+
+
+class InvalidPricing(ValueError):
+    pass
+
+
+def products_in_category(category_id):
+    category = Category.objects.get(pk=category_id)
+    return Product.objects.filter(categories__in=category.get_descendant_ids())
+
+
+def bulk_update(products, **changes):
+    """
+    Одно UPDATE по всей выборке в транзакции и одна инвалидация кэша каталога
+    вместо save() на каждый товар.
+    """
+    target = Product.objects.filter(pk__in=products.values('pk'))
+    with transaction.atomic():
+        updated = target.update(version=F('version') + 1, **changes)
+    bump_catalog_version()
+    return updated
+
+
+def reprice(products, percent=None, amount=None):
+    if percent is not None:
+        percent = Decimal(percent)
+        # -100% и ниже одной командой обнулили бы цены всей выборки
+        if not percent.is_finite() or percent <= -100:
+            raise InvalidPricing("percent must be greater than -100")
+        price = Round(F('price') * (1 + percent / 100), 2)
+    elif amount is not None:
+        amount = Decimal(amount)
+        if not amount.is_finite():
+            raise InvalidPricing("amount must be a number")
+        price = F('price') + amount
+    else:
+        raise InvalidPricing("percent or amount is required")
+    return bulk_update(products, price=Greatest(price, ZERO))
+
+
+def schedule_sale(products, percent, date_from, date_to):
+    percent = Decimal(percent)
+    if not percent.is_finite() or not 0 < percent < 100:
+        raise InvalidPricing("sale percent must be between 0 and 100")
+    if date_from > date_to:
+        raise InvalidPricing("dateFrom must not be later than dateTo")
+    return bulk_update(
+        products,
+        sale_price=Round(F('price') * (1 - percent / 100), 2),
+        date_from=date_from,
+        date_to=date_to,
+    )
+
+
+def clear_sale(products):
+    return bulk_update(products, sale_price=None, date_from=None, date_to=None)
+
+
+def restock(products, count, is_limited=None):
+    changes = {'count': F('count') + count}
+    if is_limited is not None:
+        changes['is_limited'] = is_limited
+    return bulk_update(products, **changes)
@@ -1,14 +1,28 @@
 from rest_framework import serializers
+from megano.sparse import DynamicFieldsMixin
 from .models import Product, Category, Banner, Review, CartItem
 
 
+def first_category_id(product):
+    """Аналог categories.first().id, использующий prefetch_related, если он был"""
+    return min((category.id for category in product.categories.all()), default=None)
+
+
+def review_count(product):
+    """Берет аннотацию reviews_count из with_list_data(), иначе считает запросом"""
+    count = getattr(product, 'reviews_count', None)
+    if count is None:
+        count = product.product_reviews.count()
+    return count
+
+
 class CategoryShortSerializer(serializers.ModelSerializer):
     class Meta:
         model = Category
         fields = ['id']
 
 
-class ProductSerializer(serializers.ModelSerializer):
+class ProductSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     price = serializers.FloatField()
     title = serializers.CharField(source='name')
     freeDelivery = serializers.BooleanField(source='free_delivery')
@@ -16,10 +30,7 @@ class ProductSerializer(serializers.ModelSerializer):
     tags = serializers.SerializerMethodField()
     reviews = serializers.SerializerMethodField()
     rating = serializers.SerializerMethodField()
-    category = serializers.PrimaryKeyRelatedField(
-        source='categories.first.id',
-        read_only=True
-    )
+    category = serializers.SerializerMethodField()
 
     class Meta:
         model = Product
@@ -29,6 +40,9 @@ class ProductSerializer(serializers.ModelSerializer):
             'images', 'tags', 'reviews', 'rating'
         ]
 
+    def get_category(self, obj):
+        return first_category_id(obj)
+
     def get_images(self, obj):
         if obj.image:
             return [{"src": f"/media/{obj.image.url.split('/media/')[-1]}", "alt": obj.name}]
@@ -40,14 +54,15 @@ class ProductSerializer(serializers.ModelSerializer):
         return [{"id": 1, "name": "string"}]
 
     def get_reviews(self, obj):
-        return obj.product_reviews.count()
+        return review_count(obj)
 
     def get_rating(self, obj):
         return float(obj.rating) if obj.rating else None
 
     def to_representation(self, instance):
         data = super().to_representation(instance)
-        data['date'] = instance.date.strftime("%a %b %d %Y %H:%M:%S GMT+0100 (Central European Standard Time)")
+        if 'date' in data:
+            data['date'] = instance.date.strftime("%a %b %d %Y %H:%M:%S GMT+0100 (Central European Standard Time)")
         return data
 
 
@@ -67,13 +82,16 @@ class ProductFullSerializer(ProductSerializer):
         return [{"name": spec.name, "value": spec.value} for spec in obj.specifications.all()]
 
     def get_full_reviews(self, obj):
+        reviews = getattr(obj, 'published_reviews', None)
+        if reviews is None:
+            reviews = obj.product_reviews.filter(is_published=True)
         return [{
             "author": review.author,
             "email": review.email,
             "text": review.text,
             "rate": review.rate,
             "date": review.created_at.strftime("%Y-%m-%d %H:%M")
-        } for review in obj.product_reviews.filter(is_published=True)]
+        } for review in reviews]
 
     def get_tags(self, obj):
         if isinstance(obj.tags, list):
@@ -96,7 +114,7 @@ class CategorySerializer(serializers.ModelSerializer):
         }
 
     def get_subcategories(self, obj):
-        return list(obj.subcategories.values_list('id', flat=True)) if obj.subcategories.exists() else []
+        return [subcategory.id for subcategory in obj.subcategories.all()]
 
 
 class BannerSerializer(serializers.ModelSerializer):
@@ -126,13 +144,16 @@ class BasketItemSerializer(serializers.ModelSerializer):
     id = serializers.IntegerField(source='product.id')
     title = serializers.CharField(source='product.name')
     price = serializers.DecimalField(source='product.price', max_digits=10, decimal_places=2)
-    category = serializers.PrimaryKeyRelatedField(source='product.categories.first', read_only=True)
+    category = serializers.SerializerMethodField()
     freeDelivery = serializers.BooleanField(source='product.free_delivery')
     images = serializers.SerializerMethodField()
     tags = serializers.SerializerMethodField()
     specifications = serializers.SerializerMethodField()
     count = serializers.IntegerField(source='quantity')
 
+    def get_category(self, obj):
+        return first_category_id(obj.product)
+
     def get_images(self, obj):
         request = self.context.get('request')
         if obj.product.image:
@@ -157,7 +178,7 @@ class BasketItemSerializer(serializers.ModelSerializer):
         ]
 
 
-class SaleItemSerializer(serializers.ModelSerializer):
+class SaleItemSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     id = serializers.CharField(source='pk')
     salePrice = serializers.DecimalField(source='sale_price', max_digits=10, decimal_places=2)
     dateFrom = serializers.SerializerMethodField()
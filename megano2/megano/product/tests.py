@@ -1,3 +1,640 @@
-from django.test import TestCase
+import gzip
+import json
+import os
+import shutil
+import tempfile
+from datetime import date, timedelta
+from decimal import Decimal
+from importlib import import_module
+from io import StringIO
+from unittest import mock
+from django.apps import apps as django_apps
+from django.conf import settings
+from django.contrib import messages
+from django.contrib.auth.models import User
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.http import QueryDict
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from megano.middleware import QueryBudgetExceeded, QueryStats, accepted_encodings
+from product.cache import bump_catalog_version
+from product.cart import CART_SESSION_KEY, touch_cart
+from product.catalog_io import export_records
+from product.filters import parse_specification_filters, specification_facets
+from product.fixtures.synthetic import generate_catalog
+from product.home import HOME_BLOCKS, LIMITED_COLLECTION, LIMITED_PRODUCTS_LIMIT, sale_page
+from product.models import Cart, Category, Collection, CollectionItem, Product, Specification
+from product.pricing import InvalidPricing, reprice, schedule_sale
 
-# Create your tests here.
+
+class QueryBudgetTestCase(TestCase):
+    """Эндпоинты витрины укладываются в QUERY_BUDGETS на холодном кэше"""
+
+    @classmethod
+    def setUpTestData(cls):
+        generate_catalog(products=40, categories=10, carts=0, orders=0)
+
+    def setUp(self):
+        cache.clear()
+
+    def assertWithinBudget(self, url_name, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertLessEqual(len(queries), settings.QUERY_BUDGETS[url_name], url)
+        return response
+
+
+class CatalogBudgetTest(QueryBudgetTestCase):
+    def test_strict_mode_under_test_runner(self):
+        self.assertTrue(settings.QUERY_BUDGET_STRICT)
+
+    @override_settings(QUERY_BUDGETS={'api-tags': 0})
+    def test_exceeded_budget_fails(self):
+        with self.assertRaises(QueryBudgetExceeded):
+            self.client.get('/api/tags')
+
+    def test_transaction_control_is_not_counted(self):
+        stats = QueryStats()
+        for sql in ('BEGIN', 'SAVEPOINT "s1"', 'SELECT 1', 'RELEASE SAVEPOINT "s1"', 'SELECT 2'):
+            stats(lambda *args: None, sql, None, False, {})
+        self.assertEqual(stats.count, 2)
+        self.assertEqual(stats.duplicates(), {'SELECT ?': 2})
+
+    def test_catalog(self):
+        self.assertWithinBudget('api-catalog', '/api/catalog')
+        self.assertWithinBudget('api-catalog', '/api/catalog?currentPage=2&sort=price&sortType=dec')
+
+    def test_home(self):
+        response = self.assertWithinBudget('api-home', '/api/home')
+        self.assertIn('popular', response.json())
+
+    def test_home_blocks(self):
+        for url_name in ['api-popular', 'api-limited', 'api-banners', 'api-categories', 'api-sales', 'api-tags']:
+            self.assertWithinBudget(url_name, '/api/' + url_name.removeprefix('api-'))
+
+
+class BasketBudgetTest(QueryBudgetTestCase):
+    def test_basket(self):
+        for product_id in Product.objects.values_list('id', flat=True)[:5]:
+            response = self.client.post(
+                '/api/basket', json.dumps({'id': product_id, 'count': 2}), content_type='application/json'
+            )
+            self.assertLess(response.status_code, 300)
+        response = self.assertWithinBudget('api-basket', '/api/basket')
+        self.assertEqual(len(response.json()), 5)
+
+
+class PricingTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_superuser('staff', password='password')
+        cls.product = Product.objects.create(name="Product", description="Description", price=200)
+
+    def setUp(self):
+        self.client.force_login(self.staff)
+
+    def products(self):
+        return Product.objects.filter(pk=self.product.pk)
+
+    def price(self):
+        self.product.refresh_from_db()
+        return self.product.price, self.product.sale_price
+
+    def bulk(self, **data):
+        return self.client.post('/api/products/bulk', json.dumps({'ids': [self.product.pk], **data}),
+                                content_type='application/json')
+
+    def test_reprice(self):
+        reprice(self.products(), percent='-25')
+        self.assertEqual(self.price()[0], Decimal('150.00'))
+        reprice(self.products(), amount='-500')
+        self.assertEqual(self.price()[0], Decimal('0.00'))
+
+    def test_reprice_cannot_zero_catalog(self):
+        for percent in ('-100', '-150', 'NaN'):
+            with self.subTest(percent=percent), self.assertRaises(InvalidPricing):
+                reprice(self.products(), percent=percent)
+        with self.assertRaises(InvalidPricing):
+            reprice(self.products())
+        self.assertEqual(self.price()[0], Decimal('200.00'))
+
+    def test_schedule_sale(self):
+        schedule_sale(self.products(), '10', date(2026, 1, 1), date(2026, 1, 31))
+        self.assertEqual(self.price()[1], Decimal('180.00'))
+        for percent in ('0', '100', '-5', '120'):
+            with self.subTest(percent=percent), self.assertRaises(InvalidPricing):
+                schedule_sale(self.products(), percent, date(2026, 1, 1), date(2026, 1, 31))
+        with self.assertRaises(InvalidPricing):
+            schedule_sale(self.products(), '10', date(2026, 2, 1), date(2026, 1, 1))
+
+    def test_bulk_view_validates(self):
+        response = self.bulk(operation='reprice', percent=-100)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('-100', response.json()['error'])
+        response = self.bulk(operation='sale', percent=10, dateFrom='2026-02-01', dateTo='2026-01-01')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.price(), (Decimal('200.00'), None))
+        self.assertEqual(self.bulk(operation='reprice', percent=10).json(), {'updated': 1})
+
+    def test_admin_action_validates(self):
+        url = '/admin/product/product/'
+        data = {'action': 'start_sale', '_selected_action': [self.product.pk], 'percent': '10',
+                'date_from': '2026-02-01', 'date_to': '2026-01-01'}
+        for params in ({}, {'percent': '100', 'date_from': '2026-01-01'}):
+            response = self.client.post(url, {**data, **params}, follow=True)
+            errors = [str(message) for message in response.context['messages'] if message.level == messages.ERROR]
+            self.assertEqual(len(errors), 1)
+            self.assertIn('Некорректные параметры', errors[0])
+        self.assertEqual(self.price()[1], None)
+
+
+class ProductConditionalGetTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.product = Product.objects.create(name="Product", description="Description", price=100)
+
+    def setUp(self):
+        cache.clear()
+
+    def url(self):
+        return f'/api/product/{self.product.pk}/'
+
+    def test_not_modified(self):
+        response = self.client.get(self.url())
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        self.assertIn(f'product-{self.product.pk}-v', etag)
+        # 304 отдается по версии, без загрузки товара со связями
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url(), headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        self.assertEqual(len(queries), 1)
+
+    def test_changes_bump_etag(self):
+        etag = self.client.get(self.url())['ETag']
+        Specification.objects.create(product=self.product, name="Память", value="8GB")
+        response = self.client.get(self.url(), headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+        etag = response['ETag']
+        stale = Product.objects.get(pk=self.product.pk)
+        Product.bump_version(self.product.pk)
+        stale.save()
+        # Сохранение устаревшего экземпляра не откатывает версию
+        self.assertEqual(Product.objects.get(pk=self.product.pk).version, stale.version)
+        versions = {etag, self.client.get(self.url())['ETag']}
+        self.assertEqual(len(versions), 2)
+
+    def test_missing_product(self):
+        response = self.client.get('/api/product/999999/', headers={'If-None-Match': '"product-999999-v1"'})
+        self.assertEqual(response.status_code, 404)
+
+
+class CachePolicyTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        generate_catalog(products=10, categories=3, carts=0, orders=0)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_headers(self):
+        response = self.client.get('/api/catalog')
+        self.assertEqual(response.status_code, 200)
+        cache_control = response['Cache-Control']
+        for directive in ('public', 'max-age=60', 'stale-while-revalidate=300'):
+            self.assertIn(directive, cache_control)
+        self.assertIn('max-age=300', self.client.get('/api/categories')['Cache-Control'])
+
+    def test_body_etag_without_shared_cache(self):
+        # Кэш в памяти процесса: ETag по телу, 304 экономит только трафик
+        etag = self.client.get('/api/catalog')['ETag']
+        self.assertNotIn('catalog-', etag)
+        self.assertEqual(self.client.get('/api/catalog', headers={'If-None-Match': etag}).status_code, 304)
+        Product.objects.update(price=1)
+        self.assertEqual(self.client.get('/api/catalog', headers={'If-None-Match': etag}).status_code, 200)
+
+    def test_catalog_version_etag(self):
+        with tempfile.TemporaryDirectory() as location, override_settings(CACHES={'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': location,
+        }}):
+            etag = self.client.get('/api/catalog')['ETag']
+            self.assertIn('catalog-', etag)
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get('/api/catalog', headers={'If-None-Match': etag})
+            self.assertEqual(response.status_code, 304)
+            self.assertEqual(len(queries), 0)
+            bump_catalog_version()
+            self.assertEqual(self.client.get('/api/catalog', headers={'If-None-Match': etag}).status_code, 200)
+
+    def test_post_is_not_cached(self):
+        response = self.client.post('/api/product/1/reviews', '{}', content_type='application/json')
+        self.assertFalse(response.has_header('ETag'))
+
+
+class SpecificationFilterTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        specs = {
+            'phone-8': {'Память': '8GB', 'Цвет': 'black'},
+            'phone-16': {'Память': '16GB', 'Цвет': 'black'},
+            'phone-white': {'Память': '8GB', 'Цвет': 'white'},
+            'cable': {},
+        }
+        cls.products = {}
+        for name, values in specs.items():
+            product = Product.objects.create(name=name, description="Description", price=100)
+            for spec_name, value in values.items():
+                Specification.objects.create(product=product, name=spec_name, value=value)
+            cls.products[name] = product
+
+    def setUp(self):
+        cache.clear()
+
+    def catalog(self, query):
+        response = self.client.get('/api/catalog?' + query)
+        self.assertEqual(response.status_code, 200)
+        return sorted(item['title'] for item in response.json()['items'])
+
+    def test_parse(self):
+        query = QueryDict('spec[Память]=8GB&spec[Память]=16GB&spec[ Цвет ]= black &spec[x]=&sort=price')
+        self.assertEqual(parse_specification_filters(query), {'Память': ['8GB', '16GB'], 'Цвет': ['black']})
+
+    def test_filter(self):
+        self.assertEqual(self.catalog('spec[Память]=8GB'), ['phone-8', 'phone-white'])
+        # Значения одной характеристики - ИЛИ, разные характеристики - И
+        self.assertEqual(self.catalog('spec[Память]=8GB&spec[Память]=16GB&spec[Цвет]=black'),
+                         ['phone-16', 'phone-8'])
+        self.assertEqual(self.catalog('spec[Цвет]=red'), [])
+        self.assertEqual(len(self.catalog('spec[Цвет]=')), 4)
+
+    def test_facets(self):
+        facets = self.client.get('/api/catalog/specifications').json()
+        self.assertEqual(facets, [
+            {'name': 'Память', 'values': [{'value': '16GB', 'count': 1}, {'value': '8GB', 'count': 2}]},
+            {'name': 'Цвет', 'values': [{'value': 'black', 'count': 2}, {'value': 'white', 'count': 1}]},
+        ])
+
+    def test_facets_follow_catalog_changes(self):
+        self.assertEqual(len(specification_facets()), 2)
+        Specification.objects.create(product=self.products['cable'], name='Длина', value='1m')
+        self.assertEqual([facet['name'] for facet in specification_facets()], ['Длина', 'Память', 'Цвет'])
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class CartTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('buyer', password='password')
+        cls.first, cls.second = [
+            Product.objects.create(name=name, description="Description", price=100) for name in ('first', 'second')
+        ]
+
+    def setUp(self):
+        cache.clear()
+
+    def add(self, product, count=1):
+        response = self.client.post('/api/basket', json.dumps({'id': product.pk, 'count': count}),
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def basket(self):
+        return {item['id']: item['count'] for item in self.client.get('/api/basket').json()}
+
+    def sign_in(self):
+        credentials = json.dumps({'username': 'buyer', 'password': 'password'})
+        response = self.client.post('/api/sign-in', f'{credentials}=', content_type='application/x-www-form-urlencoded')
+        self.assertEqual(response.status_code, 201)
+
+    def test_read_creates_nothing(self):
+        response = self.client.get('/api/basket')
+        self.assertEqual(response.json(), [])
+        self.assertNotIn(settings.SESSION_COOKIE_NAME, response.cookies)
+        self.assertFalse(Cart.objects.exists())
+
+    def test_cart_created_on_first_add(self):
+        self.add(self.first, 2)
+        cart = Cart.objects.get()
+        self.assertIsNone(cart.user)
+        self.assertEqual(self.client.session[CART_SESSION_KEY], cart.pk)
+        self.add(self.first)
+        self.assertEqual(self.basket(), {self.first.pk: 3})
+        self.assertEqual(Cart.objects.count(), 1)
+
+    def test_merge_on_sign_in(self):
+        Cart.objects.create(user=self.user).items.create(product=self.first, quantity=1)
+        self.add(self.first, 2)
+        self.add(self.second)
+        self.sign_in()
+        self.assertEqual(self.basket(), {self.first.pk: 3, self.second.pk: 1})
+        self.assertEqual(Cart.objects.get().user, self.user)
+        self.assertNotIn(CART_SESSION_KEY, self.client.session)
+
+    def test_anonymous_cart_becomes_user_cart(self):
+        self.add(self.second, 4)
+        cart = Cart.objects.get()
+        self.sign_in()
+        cart.refresh_from_db()
+        self.assertEqual(cart.user, self.user)
+        self.assertIsNone(cart.session_key)
+        self.assertEqual(self.basket(), {self.second.pk: 4})
+
+
+class ClearCartsTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.product = Product.objects.create(name="Product", description="Description", price=100)
+        cls.user = User.objects.create_user('buyer')
+
+    def make_cart(self, days_ago, user=None, items=1):
+        cart = Cart.objects.create(user=user)
+        for _ in range(items):
+            cart.items.create(product=self.product)
+        Cart.objects.filter(pk=cart.pk).update(updated_at=timezone.now() - timedelta(days=days_ago))
+        return cart
+
+    def clear(self, **options):
+        out = StringIO()
+        with CaptureQueriesContext(connection) as queries:
+            call_command('clear_carts', days=30, pause=0, stdout=out, **options)
+        deletes = [query['sql'] for query in queries if query['sql'].startswith('DELETE FROM "product_cart"')]
+        return out.getvalue(), deletes
+
+    def test_removes_only_abandoned_anonymous_carts(self):
+        old = [self.make_cart(40, items=2) for _ in range(5)]
+        fresh = self.make_cart(1)
+        owned = self.make_cart(40, user=self.user)
+        touched = self.make_cart(40)
+        touch_cart(touched)
+
+        output, deletes = self.clear(batch_size=2, skip_sessions=True)
+
+        self.assertIn('Удалено корзин: 5, позиций: 10', output)
+        self.assertFalse(Cart.objects.filter(pk__in=[cart.pk for cart in old]).exists())
+        self.assertEqual(set(Cart.objects.values_list('pk', flat=True)), {fresh.pk, owned.pk, touched.pk})
+        # Диапазон id обходится окнами по batch_size, а не одним DELETE
+        self.assertEqual(len(deletes), 3)
+
+    def test_nothing_to_remove(self):
+        self.make_cart(1)
+        output, deletes = self.clear(skip_sessions=True)
+        self.assertIn('Удалено корзин: 0', output)
+        self.assertEqual(deletes, [])
+
+    def test_expired_sessions(self):
+        now = timezone.now()
+        for index in range(5):
+            Session.objects.create(session_key=f'expired{index}', session_data='', expire_date=now - timedelta(days=1))
+        Session.objects.create(session_key='active', session_data='', expire_date=now + timedelta(days=1))
+        output, _ = self.clear(batch_size=2)
+        self.assertIn('сессий: 5', output)
+        self.assertEqual(list(Session.objects.values_list('session_key', flat=True)), ['active'])
+
+
+class CatalogImportExportTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        generate_catalog(products=30, categories=5, carts=0, orders=0)
+
+    def backfill_sku(self):
+        migration = import_module('product.migrations.0009_backfill_product_sku')
+        migration.backfill_sku(django_apps, None)
+
+    def export(self, fmt):
+        path = os.path.join(self.tmpdir, f'catalog.{fmt}')
+        call_command('export_catalog', output=path, format=fmt, chunk_size=7)
+        return path
+
+    def import_(self, path):
+        out, err = StringIO(), StringIO()
+        call_command('import_catalog', path, batch_size=8, stdout=out, stderr=err)
+        return out.getvalue(), err.getvalue()
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir)
+
+    def test_backfill_sku(self):
+        self.assertTrue(Product.objects.filter(sku__isnull=True).exists())
+        self.backfill_sku()
+        self.assertEqual(
+            dict(Product.objects.values_list('id', 'sku')),
+            {pk: f'P{pk}' for pk in Product.objects.values_list('id', flat=True)},
+        )
+
+    def test_rows_without_sku_are_reported(self):
+        path = self.export('jsonl')
+        output, errors = self.import_(path)
+        self.assertIn('Товаров: 0', output)
+        self.assertIn('Пропущено строк без артикула (sku): 30', errors)
+
+    def test_round_trip(self):
+        self.backfill_sku()
+        for fmt in ('jsonl', 'csv'):
+            with self.subTest(fmt=fmt):
+                expected = list(export_records())
+                path = self.export(fmt)
+                Product.objects.all().delete()
+                output, errors = self.import_(path)
+                self.assertIn('Товаров: 30', output)
+                self.assertEqual(errors, '')
+                self.assertEqual(list(export_records()), expected)
+
+    def test_upsert_by_sku(self):
+        self.backfill_sku()
+        product = Product.objects.order_by('pk').first()
+        version = product.version
+        record = {'sku': product.sku, 'name': 'Renamed', 'price': '10.00',
+                  'categories': ['Новая категория'], 'specifications': {'Цвет': 'red'}}
+        path = os.path.join(self.tmpdir, 'feed.jsonl')
+        with open(path, 'w', encoding='utf-8') as stream:
+            stream.write(json.dumps(record, ensure_ascii=False) + '\n')
+        output, _ = self.import_(path)
+        self.assertIn('новых категорий: 1', output)
+        product.refresh_from_db()
+        self.assertEqual((product.name, product.price), ('Renamed', Decimal('10.00')))
+        self.assertGreater(product.version, version)
+        self.assertEqual(list(product.categories.values_list('name', flat=True)), ['Новая категория'])
+        self.assertEqual(list(product.specifications.values_list('name', 'value')), [('Цвет', 'red')])
+        self.assertEqual(Product.objects.count(), 30)
+
+
+class SessionFreeTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        generate_catalog(products=5, categories=2, carts=0, orders=0)
+        cls.user = User.objects.create_user('buyer')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_no_cookies_for_anonymous(self):
+        for url in ('/api/catalog', '/api/home', '/api/categories', '/api/tags', '/api/catalog/specifications'):
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.cookies, {})
+                self.assertNotIn('Cookie', response.get('Vary', ''))
+
+    def test_session_is_not_loaded(self):
+        self.client.force_login(self.user)
+        session_key = self.client.session.session_key
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/catalog')
+        self.assertNotIn(settings.SESSION_COOKIE_NAME, response.cookies)
+        self.assertFalse(any('django_session' in query['sql'] for query in queries))
+        self.assertIn('public', response['Cache-Control'])
+        # Сессия пользователя не тронута
+        self.assertEqual(self.client.session.session_key, session_key)
+
+    def test_regular_views_keep_session(self):
+        response = self.client.post('/api/basket', json.dumps({'id': Product.objects.first().pk}),
+                                    content_type='application/json')
+        self.assertIn(settings.SESSION_COOKIE_NAME, response.cookies)
+
+
+class CompressionTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        generate_catalog(products=30, categories=3, carts=0, orders=0)
+
+    def setUp(self):
+        cache.clear()
+
+    def get(self, accept_encoding, **headers):
+        return self.client.get('/api/catalog', headers={'Accept-Encoding': accept_encoding, **headers})
+
+    def test_accepted_encodings(self):
+        self.assertEqual(accepted_encodings('gzip, br;q=0.5, deflate;q=0'), {'gzip', 'br'})
+        self.assertEqual(accepted_encodings('gzip;q=bad, identity'), {'identity'})
+        self.assertEqual(accepted_encodings(''), set())
+
+    def test_gzip(self):
+        plain = self.get('identity')
+        self.assertFalse(plain.has_header('Content-Encoding'))
+        response = self.get('gzip, deflate')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertEqual(gzip.decompress(response.content), plain.content)
+        self.assertEqual(int(response['Content-Length']), len(response.content))
+
+    def test_refused_encoding(self):
+        self.assertFalse(self.get('gzip;q=0').has_header('Content-Encoding'))
+
+    def test_small_responses_are_not_compressed(self):
+        with override_settings(COMPRESSION_MIN_SIZE=10 ** 7):
+            response = self.client.get('/api/catalog', headers={'Accept-Encoding': 'gzip'})
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+    def test_brotli_preferred(self):
+        fake = mock.Mock()
+        fake.compress.side_effect = lambda body, quality: b'br' + gzip.compress(body)
+        with mock.patch('megano.middleware.brotli', fake):
+            response = self.get('gzip, br')
+        self.assertEqual(response['Content-Encoding'], 'br')
+        self.assertTrue(response.content.startswith(b'br'))
+
+    def test_weak_etag(self):
+        plain_etag = self.get('identity')['ETag']
+        response = self.get('gzip')
+        self.assertEqual(response['ETag'], f'W/{plain_etag}')
+        # Слабый ETag сжатого ответа подходит для условного запроса
+        for etag in (response['ETag'], plain_etag):
+            self.assertEqual(self.get('gzip', **{'If-None-Match': etag}).status_code, 304)
+
+
+class HomeTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        generate_catalog(products=20, categories=5, carts=0, orders=0)
+
+    def setUp(self):
+        cache.clear()
+
+    def home(self):
+        response = self.client.get('/api/home')
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_blocks(self):
+        data = self.home()
+        self.assertEqual(set(data), {*HOME_BLOCKS, 'errors'})
+        self.assertEqual(data['errors'], [])
+        self.assertEqual(data['sales'], sale_page(None))
+        self.assertEqual(data['popular'], self.client.get('/api/popular').json())
+
+    def test_cached_page(self):
+        self.home()
+        with CaptureQueriesContext(connection) as queries:
+            self.home()
+        self.assertEqual(len(queries), 0)
+
+    def test_catalog_change_invalidates(self):
+        popular = self.home()['popular'][0]
+        product = Product.objects.get(pk=popular['id'])
+        product.name = 'Renamed'
+        product.save()
+        self.assertEqual(self.home()['popular'][0]['title'], 'Renamed')
+
+    def test_failed_block(self):
+        def broken(request):
+            raise RuntimeError("banners are down")
+
+        with mock.patch.dict(HOME_BLOCKS, {'banners': (broken, 300)}), self.assertLogs('product.home', 'ERROR'):
+            data = self.home()
+            self.assertEqual(data['errors'], ['banners'])
+            self.assertIsNone(data['banners'])
+            self.assertTrue(data['popular'])
+            # Неполная страница не кэшируется
+            self.assertEqual(self.home()['errors'], ['banners'])
+        self.assertEqual(self.home()['errors'], [])
+
+
+class CollectionTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.products = [
+            Product.objects.create(name=f"Product {index}", description="Description", price=100, is_limited=True)
+            for index in range(20)
+        ]
+
+    def setUp(self):
+        cache.clear()
+
+    def limited(self):
+        return [item['id'] for item in self.client.get('/api/limited').json()]
+
+    def test_fallback_is_bounded(self):
+        self.assertEqual(len(self.limited()), LIMITED_PRODUCTS_LIMIT)
+
+    def test_collection_order_and_limit(self):
+        collection = Collection.objects.create(slug=LIMITED_COLLECTION, title="Limited", limit=3)
+        chosen = self.products[5:1:-1]
+        for position, product in enumerate(chosen):
+            collection.items.create(product=product, position=position)
+        self.assertEqual(self.limited(), [product.pk for product in chosen[:3]])
+
+    def test_edits_invalidate_block(self):
+        collection = Collection.objects.create(slug=LIMITED_COLLECTION, title="Limited")
+        CollectionItem.objects.create(collection=collection, product=self.products[0])
+        self.assertEqual(self.limited(), [self.products[0].pk])
+        CollectionItem.objects.create(collection=collection, product=self.products[1], position=1)
+        self.assertEqual(self.limited(), [self.products[0].pk, self.products[1].pk])
+        collection.is_active = False
+        collection.save()
+        self.assertEqual(len(self.limited()), LIMITED_PRODUCTS_LIMIT)
+
+    def test_featured_categories(self):
+        for index in range(5):
+            Category.objects.create(name=f"Category {index}", is_featured=index != 0)
+        names = [category['name'] for category in self.client.get('/api/categories').json()]
+        self.assertEqual(names, ['Category 1', 'Category 2', 'Category 3'])
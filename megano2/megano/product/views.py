@@ -1,42 +1,66 @@
 import json
-from django.http import JsonResponse
-from django.db.models import Q
+from datetime import date
+from django.http import HttpResponse, JsonResponse
+from django.db.models import Q, Prefetch
 from .models import Product, Category, Cart, CartItem, Banner, Review
 from .serializers import ProductSerializer, CategorySerializer, ProductSerializer, SaleItemSerializer, ProductFullSerializer, BannerSerializer, ReviewSerializer, BasketItemSerializer
+from megano.db import retry_on_lock
+from megano.caching import cache_policy
+from megano.middleware import session_free
+from megano.routers import replica_read
+from megano.sparse import requested_fields, sparse
+from .cache import catalog_etag
+from .cart import get_cart, touch_cart
+from .home import cached_block, sale_page, render_home
+from .pricing import InvalidPricing, products_in_category, reprice, schedule_sale, clear_sale, restock
+from .filters import parse_specification_filters, filter_by_specifications, specification_facets
 from django.views import View
 from django.core.paginator import Paginator
 from django.utils.decorators import method_decorator
 from django.views.decorators.csrf import csrf_exempt
 
 
+def product_etag(request, product_id):
+    """ETag карточки товара по счетчику версии, без загрузки связанных данных"""
+    version = Product.objects.filter(id=product_id).values_list('version', flat=True).first()
+    if version is None:
+        return None
+    return f"product-{product_id}-v{version}"
+
+
+# Списки витрины меняются вместе с версией каталога; навигация - реже всего
+CATALOG_POLICY = cache_policy(max_age=60, stale_while_revalidate=300, etag=catalog_etag)
+NAVIGATION_POLICY = cache_policy(max_age=300, stale_while_revalidate=600, etag=catalog_etag)
+PRODUCT_POLICY = cache_policy(max_age=60, stale_while_revalidate=300, etag=product_etag)
+
+
+@replica_read
+@session_free
+@CATALOG_POLICY
 class ProductPopularView(View):
     def get(self, request):
-        products = Product.objects.order_by('-sort_index', '-purchase_count')[:8]
-        serializer = ProductSerializer(
-            products,
-            many=True,
-            context={'request': request}
-        )
-        return JsonResponse(serializer.data, safe=False)
+        return JsonResponse(sparse(cached_block(request, 'popular'), requested_fields(request)), safe=False)
 
 
+@replica_read
+@session_free
+@CATALOG_POLICY
 class ProductLimitedView(View):
     def get(self, request):
-        limited_edition = Product.objects.filter(is_limited=True)
-        serializer = ProductSerializer(
-            limited_edition,
-            many=True,
-            context={'request': request}
-        )
-        return JsonResponse(serializer.data, safe=False)
+        return JsonResponse(sparse(cached_block(request, 'limited'), requested_fields(request)), safe=False)
 
 
+@replica_read
+@session_free
+@NAVIGATION_POLICY
 class CategoryListView(View):
     def get(self, request):
-        featured_categories = Category.objects.filter(is_featured=True)[:3]
-        return JsonResponse(CategorySerializer(featured_categories, many=True).data, safe=False)
+        return JsonResponse(sparse(cached_block(request, 'categories'), requested_fields(request)), safe=False)
 
 
+@replica_read
+@session_free
+@PRODUCT_POLICY
 class ProductReviewsView(View):
     def get(self, request, product_id):
         try:
@@ -83,11 +107,24 @@ class ProductReviewsView(View):
             return JsonResponse({"error": "Server error"}, status=500)
 
 
+@replica_read
+@session_free
+@PRODUCT_POLICY
 class ProductDetailView(View):
     def get(self, request, product_id):
         try:
-            product = Product.objects.get(id=product_id)
-            serializer = ProductFullSerializer(product, context={'request': request})
+            product = Product.objects.prefetch_related(
+                'categories',
+                'specifications',
+                Prefetch(
+                    'product_reviews',
+                    queryset=Review.objects.filter(is_published=True),
+                    to_attr='published_reviews'
+                ),
+            ).get(id=product_id)
+            serializer = ProductFullSerializer(
+                product, context={'request': request, 'fields': requested_fields(request)}
+            )
             return JsonResponse(serializer.data)
         except Product.DoesNotExist:
             return JsonResponse({"error": "Product not found"}, status=404)
@@ -95,30 +132,26 @@ class ProductDetailView(View):
 
 @method_decorator(csrf_exempt, name='dispatch')
 class BasketView(View):
-    def get_cart(self, request):
-        if request.user.is_authenticated:
-            cart, created = Cart.objects.get_or_create(user=request.user)
-        else:
-            session_key = request.session.session_key
-            if not session_key:
-                request.session.create()
-                session_key = request.session.session_key
-            cart, created = Cart.objects.get_or_create(session_key=session_key)
-        return cart
-
     def get(self, request):
         try:
-            cart = self.get_cart(request)
-            items = cart.items.all()
-            serializer = BasketItemSerializer(
-                items,
-                many=True,
-                context={'request': request}
-            )
-            return JsonResponse(serializer.data, safe=False)
+            return self.render_cart(request, get_cart(request))
         except Exception as e:
             return JsonResponse({"error": str(e)}, status=500)
 
+    def render_cart(self, request, cart):
+        if cart is None:
+            return JsonResponse([], safe=False)
+        items = cart.items.select_related('product').prefetch_related(
+            'product__categories',
+            'product__specifications'
+        )
+        serializer = BasketItemSerializer(
+            items,
+            many=True,
+            context={'request': request}
+        )
+        return JsonResponse(serializer.data, safe=False)
+
     def post(self, request):
         try:
             if request.content_type != 'application/json':
@@ -145,20 +178,11 @@ class BasketView(View):
             except (ValueError, TypeError):
                 return JsonResponse({"error": "Quantity must be positive integer"}, status=400)
 
-            cart = self.get_cart(request)
             product = Product.objects.get(id=product_id)
+            # Корзина уже загружена при записи - не ищем ее повторно
+            cart = self.add_item(request, product, quantity)
 
-            cart_item, item_created = CartItem.objects.get_or_create(
-                cart=cart,
-                product=product,
-                defaults={'quantity': quantity}
-            )
-
-            if not item_created:
-                cart_item.quantity += quantity
-                cart_item.save()
-
-            return self.get(request)
+            return self.render_cart(request, cart)
 
         except Product.DoesNotExist:
             return JsonResponse({"error": "Product not found"}, status=404)
@@ -175,36 +199,70 @@ class BasketView(View):
                 return JsonResponse({"error": "Product ID is required"}, status=400)
 
             quantity = int(quantity)
-            cart = self.get_cart(request)
-            product = Product.objects.get(id=product_id)
-            cart_item = CartItem.objects.get(cart=cart, product=product)
-
-            if cart_item.quantity <= quantity:
-                cart_item.delete()
-            else:
-                cart_item.quantity -= quantity
-                cart_item.save()
+            cart = self.remove_item(request, product_id, quantity)
 
-            return self.get(request)
+            return self.render_cart(request, cart)
 
         except (Cart.DoesNotExist, Product.DoesNotExist, CartItem.DoesNotExist):
             return JsonResponse({"error": "Not found"}, status=404)
         except Exception as e:
             return JsonResponse({"error": str(e)}, status=500)
 
+    @retry_on_lock()
+    def add_item(self, request, product, quantity):
+        cart = get_cart(request, create=True)
+        cart_item, item_created = CartItem.objects.get_or_create(
+            cart=cart,
+            product=product,
+            defaults={'quantity': quantity}
+        )
 
+        if not item_created:
+            cart_item.quantity += quantity
+            cart_item.save()
+        touch_cart(cart)
+        return cart
+
+    @retry_on_lock()
+    def remove_item(self, request, product_id, quantity):
+        cart = get_cart(request)
+        if cart is None:
+            raise Cart.DoesNotExist
+        cart_item = CartItem.objects.get(cart=cart, product_id=product_id)
+
+        if cart_item.quantity <= quantity:
+            cart_item.delete()
+        else:
+            cart_item.quantity -= quantity
+            cart_item.save()
+        touch_cart(cart)
+        return cart
+
+
+@replica_read
+@session_free
+@NAVIGATION_POLICY
 class BannerListView(View):
     def get(self, request):
-        banners = Banner.objects.filter(is_active=True)
-        serializer = BannerSerializer(banners, many=True, context={'request': request})
-        return JsonResponse(serializer.data, safe=False)
+        return JsonResponse(sparse(cached_block(request, 'banners'), requested_fields(request)), safe=False)
+
+
+@replica_read
+@session_free
+@CATALOG_POLICY
+class HomeView(View):
+    """Все блоки главной одним запросом вместо пяти"""
+
+    def get(self, request):
+        return HttpResponse(render_home(request), content_type='application/json')
 
 
+@replica_read
+@session_free
+@CATALOG_POLICY
 class SaleView(View):
     def get(self, request):
         try:
-            sale_products = Product.objects.filter(sale_price__isnull=False).order_by('-date_from')
-
             current_page = request.GET.get('currentPage', 1)
             try:
                 current_page = int(current_page)
@@ -213,30 +271,15 @@ class SaleView(View):
             except ValueError:
                 current_page = 1
 
-            paginator = Paginator(sale_products, 5)
-            try:
-                page_obj = paginator.page(current_page)
-            except:
-                page_obj = paginator.page(1)
-
-            serializer = SaleItemSerializer(
-                page_obj.object_list,
-                many=True,
-                context={'request': request}
-            )
-
-            response_data = {
-                "items": serializer.data,
-                "currentPage": page_obj.number,
-                "lastPage": paginator.num_pages
-            }
-
-            return JsonResponse(response_data)
+            return JsonResponse(sale_page(request, current_page, fields=requested_fields(request)))
 
         except Exception as e:
             return JsonResponse({"error": str(e)}, status=500)
 
 
+@replica_read
+@session_free
+@CATALOG_POLICY
 class CatalogView(View):
     def get(self, request):
         try:
@@ -253,7 +296,7 @@ class CatalogView(View):
             current_page = int(request.GET.get('currentPage', 1))
             limit = int(request.GET.get('limit', 20))
 
-            products = Product.objects.all()
+            products = Product.objects.with_list_data()
 
             if name_filter:
                 products = products.filter(name__icontains=name_filter)
@@ -269,6 +312,10 @@ class CatalogView(View):
             if available:
                 products = products.filter(count__gt=0)
 
+            spec_filters = parse_specification_filters(request.GET)
+            if spec_filters:
+                products = filter_by_specifications(products, spec_filters)
+
             if sort_type == 'dec':
                 sort_field = f'-{sort_field}'
             products = products.order_by(sort_field)
@@ -279,7 +326,7 @@ class CatalogView(View):
             serializer = ProductSerializer(
                 page_obj.object_list,
                 many=True,
-                context={'request': request}
+                context={'request': request, 'fields': requested_fields(request)}
             )
 
             return JsonResponse({
@@ -292,13 +339,73 @@ class CatalogView(View):
             return JsonResponse({"error": str(e)}, status=500)
 
 
+class BulkProductUpdateView(View):
+    """Массовое изменение цен, распродаж и остатков для выборки товаров или ветки категорий"""
+
+    def post(self, request):
+        if not request.user.is_staff:
+            return JsonResponse({"error": "Forbidden"}, status=403)
+
+        try:
+            data = json.loads(request.body)
+        except json.JSONDecodeError:
+            return JsonResponse({"error": "Invalid JSON"}, status=400)
+
+        try:
+            if data.get('category'):
+                products = products_in_category(int(data['category']))
+            elif data.get('ids'):
+                products = Product.objects.filter(id__in=[int(pk) for pk in data['ids']])
+            else:
+                return JsonResponse({"error": "ids or category is required"}, status=400)
+
+            operation = data.get('operation')
+            if operation == 'reprice' and data.get('percent') is not None:
+                updated = reprice(products, percent=str(data['percent']))
+            elif operation == 'reprice' and data.get('amount') is not None:
+                updated = reprice(products, amount=str(data['amount']))
+            elif operation == 'sale':
+                updated = schedule_sale(
+                    products,
+                    str(data['percent']),
+                    date.fromisoformat(data['dateFrom']),
+                    date.fromisoformat(data['dateTo'])
+                )
+            elif operation == 'clear_sale':
+                updated = clear_sale(products)
+            elif operation == 'restock':
+                updated = restock(products, int(data['count']), data.get('isLimited'))
+            else:
+                return JsonResponse({"error": "Unknown operation or missing parameters"}, status=400)
+
+        except Category.DoesNotExist:
+            return JsonResponse({"error": "Category not found"}, status=404)
+        except InvalidPricing as e:
+            return JsonResponse({"error": str(e)}, status=400)
+        except (KeyError, TypeError, ValueError, ArithmeticError):
+            return JsonResponse({"error": "Invalid operation parameters"}, status=400)
+
+        return JsonResponse({"updated": updated})
+
+
+@replica_read
+@session_free
+@CATALOG_POLICY
+class SpecificationFacetsView(View):
+    def get(self, request):
+        return JsonResponse(specification_facets(), safe=False)
+
+
+@replica_read
+@session_free
+@NAVIGATION_POLICY
 class TagsView(View):
     def get(self, request):
         try:
             tags = set()
-            for product in Product.objects.all():
-                if isinstance(product.tags, list):
-                    tags.update(str(tag) for tag in product.tags if tag)
+            for product_tags in Product.objects.values_list('tags', flat=True):
+                if isinstance(product_tags, list):
+                    tags.update(str(tag) for tag in product_tags if tag)
 
             formatted_tags = [
                 {"id": idx, "name": tag}
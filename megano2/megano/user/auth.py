@@ -0,0 +1,150 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from django.conf import settings
+from django.contrib.auth.hashers import check_password, get_hasher, identify_hasher, make_password
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+MODEL_BACKEND = 'django.contrib.auth.backends.ModelBackend'
+
+
+class RateLimited(Exception):
+    def __init__(self, retry_after):
+        super().__init__(f"Too many attempts, retry after {retry_after} s")
+        self.retry_after = retry_after
+
+
+class HashingBusy(Exception):
+    pass
+
+
+def take_token(key, capacity, rate):
+    """
+    Лимит capacity попыток на окно capacity / rate секунд (в среднем rate
+    попыток в секунду). Счетчик окна растет атомарно через cache.add/incr,
+    поэтому параллельные попытки не видят одно и то же значение.
+    Возвращает 0 или через сколько секунд откроется следующее окно.
+    """
+    window = capacity / rate
+    now = time.time()
+    window_start = now // window * window
+    key = f'{key}:{int(window_start)}'
+    timeout = int(window) + 1
+    cache.add(key, 0, timeout=timeout)
+    try:
+        attempts = cache.incr(key)
+    except ValueError:
+        # Ключ вытеснили между add и incr
+        cache.add(key, 1, timeout=timeout)
+        attempts = 1
+    if attempts > capacity:
+        return window_start + window - now
+    return 0
+
+
+def check_rate_limit(request, username):
+    """Проверяет лимиты по IP и по логину до любых запросов к БД и хэширования"""
+    limits = getattr(settings, 'SIGN_IN_RATE_LIMITS', {})
+    buckets = {
+        'ip': request.META.get('REMOTE_ADDR', ''),
+        'username': (username or '').lower(),
+    }
+    for scope, ident in buckets.items():
+        if scope not in limits:
+            continue
+        capacity, rate = limits[scope]
+        wait = take_token(f'auth:bucket:{scope}:{ident}', capacity, rate)
+        if wait:
+            raise RateLimited(int(wait) + 1)
+
+
+_executor = None
+_slots = None
+_executor_lock = threading.Lock()
+
+
+def hashing_pool():
+    global _executor, _slots
+    with _executor_lock:
+        if _executor is None:
+            workers = getattr(settings, 'AUTH_HASH_WORKERS', 4)
+            _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password-hash')
+            _slots = threading.BoundedSemaphore(workers + getattr(settings, 'AUTH_HASH_QUEUE', 16))
+    return _executor, _slots
+
+
+@receiver(setting_changed)
+def reset_hashing_pool(setting, **kwargs):
+    global _executor, _slots
+    if setting in ('AUTH_HASH_WORKERS', 'AUTH_HASH_QUEUE'):
+        with _executor_lock:
+            if _executor is not None:
+                _executor.shutdown(wait=False)
+            _executor = _slots = None
+
+
+def run_hashing(func, *args):
+    """
+    Выполняет хэширование в общем пуле потоков. Одновременно считается
+    не больше AUTH_HASH_WORKERS хэшей; если очередь тоже занята, запрос
+    сразу получает HashingBusy, а не ждет, занимая воркер. Слот занят,
+    пока хэш действительно считается, даже если запрос перестал ждать
+    по AUTH_HASH_TIMEOUT.
+    """
+    executor, slots = hashing_pool()
+    if not slots.acquire(blocking=False):
+        raise HashingBusy("Password hashing queue is full")
+    try:
+        future = executor.submit(func, *args)
+    except BaseException:
+        slots.release()
+        raise
+    future.add_done_callback(lambda _: slots.release())
+    try:
+        return future.result(timeout=getattr(settings, 'AUTH_HASH_TIMEOUT', 10))
+    except FutureTimeout:
+        # Еще не начатую задачу снимаем с очереди, начатая досчитается и освободит слот
+        future.cancel()
+        raise HashingBusy("Password hashing timed out")
+
+
+def hash_password(password):
+    return run_hashing(make_password, password)
+
+
+def must_rehash(encoded):
+    preferred = get_hasher('default')
+    try:
+        hasher = identify_hasher(encoded)
+    except ValueError:
+        return False
+    return hasher.algorithm != preferred.algorithm or preferred.must_update(encoded)
+
+
+def authenticate_user(request, username, password):
+    """
+    Аналог authenticate() для входа по логину и паролю: с лимитами,
+    хэшированием в пуле и пересчетом хэша под текущие настройки.
+    Для неизвестного логина хэш тоже считается, чтобы время ответа не выдавало,
+    есть ли такой пользователь; дешево отсекаются только запросы сверх лимита.
+    """
+    check_rate_limit(request, username)
+    if not username or password is None:
+        return None
+
+    user = User.objects.filter(**{User.USERNAME_FIELD: username}).first()
+    if user is None:
+        run_hashing(make_password, password)
+        return None
+
+    if not run_hashing(check_password, password, user.password) or not user.is_active:
+        return None
+
+    if must_rehash(user.password):
+        user.password = hash_password(password)
+        user.save(update_fields=['password'])
+    user.backend = MODEL_BACKEND
+    return user
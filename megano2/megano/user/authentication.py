@@ -0,0 +1,23 @@
+from rest_framework.authentication import BaseAuthentication
+from rest_framework.exceptions import AuthenticationFailed
+from .tokens import ACCESS, InvalidToken, bearer_token, read_token, token_user
+
+
+class SignedTokenAuthentication(BaseAuthentication):
+    """Bearer-токен для DRF-вьюх; если токен уже разобран middleware, повторно не проверяет"""
+
+    def authenticate(self, request):
+        django_request = request._request
+        if getattr(django_request, 'auth_token', None) is not None:
+            return django_request.user, django_request.auth_token
+        token = bearer_token(django_request)
+        if token is None:
+            return None
+        try:
+            payload = read_token(token, ACCESS)
+        except InvalidToken as e:
+            raise AuthenticationFailed(str(e))
+        return token_user(payload), payload
+
+    def authenticate_header(self, request):
+        return 'Bearer'
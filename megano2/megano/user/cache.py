@@ -0,0 +1,30 @@
+from django.core.cache import cache
+
+PROFILE_CACHE_TIMEOUT = 60 * 60
+
+
+def profile_version_key(user_id):
+    return f'profile:{user_id}:version'
+
+
+def profile_version(user_id):
+    """Версия профиля пользователя, входящая в ключ его кэша"""
+    key = profile_version_key(user_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, 1, timeout=None)
+        version = cache.get(key, 1)
+    return version
+
+
+def bump_profile_version(user_id):
+    """Сбрасывает кэш профиля без удаления по конкретным ключам"""
+    try:
+        cache.incr(profile_version_key(user_id))
+    except ValueError:
+        cache.set(profile_version_key(user_id), 2, timeout=None)
+
+
+def profile_cache_key(user_id, host):
+    # URL аватара абсолютный, поэтому в ключе есть хост
+    return f'profile:{user_id}:v{profile_version(user_id)}:{host}'
@@ -0,0 +1,16 @@
+from django.conf import settings
+from django.core.checks import Tags, Warning, register
+from megano.caching import cache_is_shared
+
+
+@register(Tags.security, Tags.caches, deploy=True)
+def check_shared_cache(app_configs, **kwargs):
+    """Лимиты входа считаются в кэше; в памяти процесса у каждого воркера свой счетчик"""
+    if not getattr(settings, 'SIGN_IN_RATE_LIMITS', None) or cache_is_shared():
+        return []
+    return [Warning(
+        "SIGN_IN_RATE_LIMITS are counted in a process-local cache, "
+        "so every worker has its own limit.",
+        hint="Configure a shared cache backend, e.g. set REDIS_URL.",
+        id='user.W001',
+    )]
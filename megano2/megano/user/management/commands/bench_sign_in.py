@@ -0,0 +1,78 @@
+import json
+import random
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.test import Client
+from product.management.commands.bench_api import percentile
+from user.auth import hash_password
+
+BENCH_PASSWORD = 'bench-password'
+
+
+class Command(BaseCommand):
+    help = (
+        "Нагрузочный тест входа: настоящие пользователи с разных IP вперемешку "
+        "с подбором паролей к случайным логинам с нескольких IP"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200)
+        parser.add_argument('--concurrency', type=int, default=16)
+        parser.add_argument('--attack-ratio', type=float, default=0.8, help="Доля атакующих запросов")
+        parser.add_argument('--attack-ips', type=int, default=3)
+        parser.add_argument('--users', type=int, default=50)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        rnd = random.Random(options['seed'])
+        usernames = self.ensure_users(options['users'])
+        cache.clear()
+
+        plan = []
+        for n in range(options['requests']):
+            if rnd.random() < options['attack_ratio']:
+                ip = f"10.66.0.{rnd.randrange(options['attack_ips'])}"
+                plan.append(('attack', ip, f"victim{rnd.randrange(10 ** 6)}", f"guess{n}"))
+            else:
+                plan.append(('user', f"192.168.{n // 250}.{n % 250}", rnd.choice(usernames), BENCH_PASSWORD))
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['concurrency']) as pool:
+            results = list(pool.map(self.sign_in, plan))
+        elapsed = time.perf_counter() - started
+
+        self.stdout.write(f"{len(plan)} запросов за {elapsed:.2f} с, {len(plan) / elapsed:.0f} rps")
+        for kind in ('user', 'attack'):
+            rows = [(status, ms) for row_kind, status, ms in results if row_kind == kind]
+            if not rows:
+                continue
+            samples = [ms for _, ms in rows]
+            statuses = dict(sorted(Counter(status for status, _ in rows).items()))
+            self.stdout.write(
+                f"{kind:7} {len(rows):5}  p50 {percentile(samples, 50):8.1f}  p95 {percentile(samples, 95):8.1f}  "
+                f"p99 {percentile(samples, 99):8.1f} ms  statuses {statuses}"
+            )
+
+    def ensure_users(self, count):
+        usernames = [f"bench-user-{n}" for n in range(count)]
+        existing = set(User.objects.filter(username__in=usernames).values_list('username', flat=True))
+        for username in usernames:
+            if username not in existing:
+                User.objects.create(username=username, password=hash_password(BENCH_PASSWORD))
+        return usernames
+
+    def sign_in(self, attempt):
+        kind, ip, username, password = attempt
+        client = Client(SERVER_NAME='localhost', REMOTE_ADDR=ip)
+        body = json.dumps({'username': username, 'password': password})
+        started = time.perf_counter()
+        try:
+            response = client.post('/api/sign-in', body, content_type='application/x-www-form-urlencoded')
+        finally:
+            connections.close_all()
+        return kind, response.status_code, (time.perf_counter() - started) * 1000
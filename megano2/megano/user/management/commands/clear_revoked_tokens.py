@@ -0,0 +1,9 @@
+from django.core.management.base import BaseCommand
+from user.tokens import clear_expired_revocations
+
+
+class Command(BaseCommand):
+    help = "Удаляет из списка отзыва токены, срок которых истек"
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.SUCCESS(f"Удалено записей: {clear_expired_revocations()}"))
@@ -1,5 +1,6 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import User
+from .cache import bump_profile_version
 
 
 class Avatar(models.Model):
@@ -39,3 +40,28 @@ class Profile(models.Model):
 
     def __str__(self):
         return self.fullName
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        user_id = self.user_id
+        transaction.on_commit(lambda: bump_profile_version(user_id))
+
+
+class RevokedToken(models.Model):
+    """Отозванный токен; хранится, пока токен иначе был бы действителен"""
+    jti = models.CharField(max_length=32, unique=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return self.jti
+
+
+class TokenVersion(models.Model):
+    """Версия учетных данных для токенов; растет при выходе пользователя"""
+    user = models.OneToOneField(
+        User, on_delete=models.CASCADE, primary_key=True, related_name='token_version'
+    )
+    version = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f'{self.user_id}:{self.version}'
@@ -1,3 +1,200 @@
-from django.test import TestCase
+import threading
+import time
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from .auth import HashingBusy, RateLimited, authenticate_user, run_hashing, take_token
+from .cache import bump_profile_version, profile_version
+from .models import Profile
+from .tokens import ACCESS, REFRESH, InvalidToken, issue_tokens, read_token, revoke_user_tokens
 
-# Create your tests here.
+FAST_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class TokenTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('buyer', password='old-password')
+
+    def setUp(self):
+        cache.clear()
+
+    def obtain(self, password='old-password'):
+        return self.client.post('/api/token', {'username': 'buyer', 'password': password},
+                                content_type='application/json')
+
+    def refresh(self, token):
+        return self.client.post('/api/token/refresh', {'refresh': token}, content_type='application/json')
+
+    def profile(self, access):
+        return self.client.get('/api/profile', headers={'Authorization': f'Bearer {access}'})
+
+    def test_obtain(self):
+        response = self.obtain()
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(read_token(response.json()['access'], ACCESS)['uid'], self.user.pk)
+        self.assertEqual(self.obtain('wrong').status_code, 401)
+
+    def test_refresh_rotation(self):
+        tokens = self.obtain().json()
+        response = self.refresh(tokens['refresh'])
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.json()['refresh'], tokens['refresh'])
+        # Старый refresh обменивается только один раз
+        self.assertEqual(self.refresh(tokens['refresh']).status_code, 401)
+        self.assertEqual(self.refresh(response.json()['refresh']).status_code, 200)
+
+    def test_revoke(self):
+        tokens = self.obtain().json()
+        response = self.client.post('/api/token/revoke', {'refresh': tokens['refresh']},
+                                    content_type='application/json',
+                                    headers={'Authorization': f"Bearer {tokens['access']}"})
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(self.refresh(tokens['refresh']).status_code, 401)
+        self.assertEqual(self.profile(tokens['access']).status_code, 401)
+
+    def test_password_change_invalidates_tokens(self):
+        tokens = self.obtain().json()
+        response = self.client.post('/api/profile/password',
+                                    {'currentPassword': 'old-password', 'newPassword': 'new-password'},
+                                    content_type='application/json',
+                                    headers={'Authorization': f"Bearer {tokens['access']}"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.profile(tokens['access']).status_code, 401)
+        self.assertEqual(self.refresh(tokens['refresh']).status_code, 401)
+        self.assertEqual(self.obtain('new-password').status_code, 201)
+
+    def test_sign_out_invalidates_tokens(self):
+        tokens = self.obtain().json()
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.post('/api/sign-out').status_code, 200)
+        with self.assertRaises(InvalidToken):
+            read_token(tokens['access'], ACCESS)
+        self.assertEqual(self.refresh(tokens['refresh']).status_code, 401)
+
+    def test_revoke_user_tokens(self):
+        tokens = issue_tokens(self.user)
+        revoke_user_tokens(self.user.pk)
+        with self.assertRaises(InvalidToken):
+            read_token(tokens['refresh'], REFRESH)
+        read_token(issue_tokens(self.user)['access'], ACCESS)
+
+    def test_inactive_user(self):
+        tokens = issue_tokens(self.user)
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        self.assertEqual(self.profile(tokens['access']).status_code, 401)
+        self.assertEqual(self.refresh(tokens['refresh']).status_code, 401)
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS, SIGN_IN_RATE_LIMITS={'ip': (20, 0.5), 'username': (3, 1 / 60)})
+class RateLimitTest(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_take_token(self):
+        self.assertEqual([take_token('test', 3, 1 / 60) for _ in range(3)], [0, 0, 0])
+        wait = take_token('test', 3, 1 / 60)
+        self.assertGreater(wait, 0)
+        self.assertLessEqual(wait, 180)
+
+    def test_username_limit(self):
+        User.objects.create_user('buyer', password='password')
+        request = self.client.request().wsgi_request
+        for _ in range(3):
+            self.assertIsNone(authenticate_user(request, 'buyer', 'wrong'))
+        # Сверх лимита не проходит даже верный пароль
+        with self.assertRaises(RateLimited):
+            authenticate_user(request, 'Buyer', 'password')
+
+    def test_token_endpoint_returns_429(self):
+        for _ in range(3):
+            self.client.post('/api/token', {'username': 'nobody', 'password': 'x'}, content_type='application/json')
+        response = self.client.post('/api/token', {'username': 'nobody', 'password': 'x'},
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 429)
+        self.assertGreater(int(response['Retry-After']), 0)
+
+
+@override_settings(AUTH_HASH_WORKERS=1, AUTH_HASH_QUEUE=0, AUTH_HASH_TIMEOUT=5)
+class HashingPoolTest(SimpleTestCase):
+    def test_result(self):
+        self.assertEqual(run_hashing(len, 'abc'), 3)
+
+    def test_busy_when_queue_is_full(self):
+        started, release = threading.Event(), threading.Event()
+
+        def slow():
+            started.set()
+            release.wait(5)
+
+        worker = threading.Thread(target=run_hashing, args=(slow,))
+        worker.start()
+        started.wait(5)
+        try:
+            with self.assertRaises(HashingBusy):
+                run_hashing(len, 'abc')
+        finally:
+            release.set()
+            worker.join()
+        # Слот освобождает колбэк future уже после того, как ждущий получил результат
+        time.sleep(0.05)
+        self.assertEqual(run_hashing(len, 'abc'), 3)
+
+    @override_settings(AUTH_HASH_TIMEOUT=0.05)
+    def test_timeout_keeps_slot_until_done(self):
+        with self.assertRaises(HashingBusy):
+            run_hashing(time.sleep, 0.3)
+        # Хэш еще считается, слот не освобожден
+        with self.assertRaises(HashingBusy):
+            run_hashing(len, 'abc')
+        time.sleep(0.4)
+        self.assertEqual(run_hashing(len, 'abc'), 3)
+
+
+class ProfileCacheTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('buyer')
+        cls.profile = Profile.objects.create(user=cls.user, fullName="Old Name")
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def get_profile(self):
+        response = self.client.get('/api/profile')
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_cached(self):
+        self.get_profile()
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.get_profile()['fullName'], "Old Name")
+        self.assertFalse(any('user_profile' in query['sql'] for query in queries))
+
+    def test_update_invalidates(self):
+        self.get_profile()
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/profile', {'fullName': "New Name", 'email': 'buyer@example.com'},
+                                        content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        profile = self.get_profile()
+        self.assertEqual((profile['fullName'], profile['email']), ("New Name", 'buyer@example.com'))
+
+    def test_save_elsewhere_invalidates(self):
+        self.get_profile()
+        with self.captureOnCommitCallbacks(execute=True):
+            profile = Profile.objects.get(pk=self.profile.pk)
+            profile.fullName = "Admin Edit"
+            profile.save()
+        self.assertEqual(self.get_profile()['fullName'], "Admin Edit")
+
+    def test_other_users_are_not_affected(self):
+        version = profile_version(self.user.pk)
+        bump_profile_version(self.user.pk + 1)
+        self.assertEqual(profile_version(self.user.pk), version)
+        bump_profile_version(self.user.pk)
+        self.assertNotEqual(profile_version(self.user.pk), version)
@@ -0,0 +1,184 @@
+import uuid
+from datetime import timedelta
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core import signing
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+from django.utils.crypto import salted_hmac
+from megano.caching import cache_is_shared
+from .models import RevokedToken, TokenVersion
+
+ACCESS = 'access'
+REFRESH = 'refresh'
+SALT = 'user.tokens'
+
+# Поля пользователя, которые лежат в токене; остальные догрузятся из БД при обращении
+TOKEN_USER_FIELDS = ['id', 'username', 'is_staff', 'is_superuser', 'is_active']
+
+
+class InvalidToken(Exception):
+    pass
+
+
+def token_lifetime(kind):
+    if kind == ACCESS:
+        return getattr(settings, 'ACCESS_TOKEN_LIFETIME', 15 * 60)
+    return getattr(settings, 'REFRESH_TOKEN_LIFETIME', 14 * 24 * 60 * 60)
+
+
+def issue_token(user, kind, stamp=None):
+    payload = {
+        'typ': kind,
+        'jti': uuid.uuid4().hex,
+        'uid': user.pk,
+        'usr': user.username,
+        'stf': user.is_staff,
+        'su': user.is_superuser,
+        'cst': stamp if stamp is not None else credential_stamp(user.pk),
+    }
+    return signing.dumps(payload, salt=f'{SALT}.{kind}', compress=True)
+
+
+def issue_tokens(user):
+    stamp = credential_stamp(user.pk)
+    return {
+        'access': issue_token(user, ACCESS, stamp),
+        'refresh': issue_token(user, REFRESH, stamp),
+        'expiresIn': token_lifetime(ACCESS),
+    }
+
+
+def revoked_key(jti):
+    return f'auth:revoked:{jti}'
+
+
+def read_token(token, kind):
+    """
+    Проверяет подпись, срок, отзыв токена и штамп учетных данных. С общим
+    кэшем access-токен проверяется без запросов к БД.
+    """
+    try:
+        payload = signing.loads(token, salt=f'{SALT}.{kind}', max_age=token_lifetime(kind))
+    except signing.SignatureExpired:
+        raise InvalidToken("Token expired")
+    except signing.BadSignature:
+        raise InvalidToken("Invalid token")
+    if payload.get('typ') != kind:
+        raise InvalidToken("Invalid token type")
+    if is_revoked(payload):
+        raise InvalidToken("Token revoked")
+    if payload.get('cst') != credential_stamp(payload['uid']):
+        raise InvalidToken("Token revoked")
+    return payload
+
+
+def stamp_key(user_id):
+    return f'auth:stamp:{user_id}'
+
+
+def credential_stamp(user_id):
+    """
+    Штамп учетных данных: HMAC от хэша пароля и версии токенов. Меняется
+    при смене пароля и выходе, поэтому выданные раньше токены перестают
+    проходить проверку. Для удаленного или неактивного пользователя - ''.
+    Кэш в памяти процесса не видит сброс в других воркерах, тогда штамп
+    читается из БД.
+    """
+    shared = cache_is_shared()
+    if shared:
+        stamp = cache.get(stamp_key(user_id))
+        if stamp is not None:
+            return stamp
+    row = (
+        User.objects.filter(pk=user_id)
+        .values_list('password', 'is_active', 'token_version__version')
+        .first()
+    )
+    stamp = ''
+    if row is not None and row[1]:
+        stamp = salted_hmac(SALT, f'{row[0]}:{row[2] or 0}').hexdigest()[:32]
+    if shared:
+        cache.set(stamp_key(user_id), stamp, timeout=token_lifetime(ACCESS))
+    return stamp
+
+
+def revoke_user_tokens(user_id):
+    """Отзывает все выданные пользователю токены (выход со всех устройств)"""
+    TokenVersion.objects.get_or_create(user_id=user_id)
+    TokenVersion.objects.filter(user_id=user_id).update(version=F('version') + 1)
+    cache.delete(stamp_key(user_id))
+    transaction.on_commit(lambda: cache.delete(stamp_key(user_id)))
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def reset_credential_stamp(sender, instance, **kwargs):
+    # Пароль и is_active могли измениться где угодно, в том числе в admin
+    cache.delete(stamp_key(instance.pk))
+
+
+def is_revoked(payload):
+    """
+    Список отзыва хранится в БД, кэш лишь ускоряет проверку. Access-токен
+    проверяется по общему кэшу без запроса к БД; refresh-токены и кэш
+    в памяти процесса (свой у каждого воркера) проверяются по таблице.
+    """
+    if cache.get(revoked_key(payload['jti'])):
+        return True
+    if payload['typ'] == ACCESS and cache_is_shared():
+        return False
+    return RevokedToken.objects.filter(jti=payload['jti']).exists()
+
+
+def revoke(payload):
+    """Отзывает токен; False, если он уже был отозван (повторное использование refresh)"""
+    lifetime = token_lifetime(payload['typ'])
+    try:
+        with transaction.atomic():
+            RevokedToken.objects.create(
+                jti=payload['jti'],
+                expires_at=timezone.now() + timedelta(seconds=lifetime),
+            )
+        created = True
+    except IntegrityError:
+        created = False
+    cache.set(revoked_key(payload['jti']), 1, timeout=lifetime)
+    return created
+
+
+def clear_expired_revocations():
+    return RevokedToken.objects.filter(expires_at__lt=timezone.now()).delete()[0]
+
+
+def token_user(payload):
+    """
+    Пользователь из токена; password, email и т.п. отложены и читаются только
+    по требованию. is_active проверен штампом в read_token.
+    """
+    values = [payload['uid'], payload['usr'], payload['stf'], payload['su'], True]
+    return User.from_db('default', TOKEN_USER_FIELDS, values)
+
+
+def refresh_tokens(refresh):
+    """Ротация: старый refresh отзывается, пользователь проверяется в БД"""
+    payload = read_token(refresh, REFRESH)
+    user = User.objects.filter(pk=payload['uid'], is_active=True).first()
+    if user is None:
+        raise InvalidToken("User is inactive")
+    # Уникальный jti в таблице не даст двум параллельным запросам обменять один refresh
+    if not revoke(payload):
+        raise InvalidToken("Token revoked")
+    return issue_tokens(user)
+
+
+def bearer_token(request):
+    header = request.META.get('HTTP_AUTHORIZATION', '')
+    scheme, _, token = header.partition(' ')
+    if scheme.lower() != 'bearer' or not token:
+        return None
+    return token.strip()
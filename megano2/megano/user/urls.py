@@ -8,6 +8,9 @@ urlpatterns = [
     path("profile/avatar", views.ProfileAvatarView.as_view(), name="profile-avatar"),
     path("profile/password", views.UpdatePasswordView.as_view(), name="update-password"),
     path("sign-in", views.SignInView.as_view(), name="sign-in"),
+    path("token", views.TokenObtainView.as_view(), name="token-obtain"),
+    path("token/refresh", views.TokenRefreshView.as_view(), name="token-refresh"),
+    path("token/revoke", views.TokenRevokeView.as_view(), name="token-revoke"),
     path("sign-up", views.SignUpView.as_view(), name="sign-up"),
     path('sign-out', views.signOut, name='sign-out'),
 
@@ -1,15 +1,30 @@
-from django.contrib.auth import authenticate, login, logout
+from django.contrib.auth import login, logout
+from django.contrib.auth.hashers import check_password
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework import permissions
 from rest_framework.parsers import MultiPartParser, FormParser
 from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import transaction
 from django.http import JsonResponse, HttpResponse
 import json
 from rest_framework.permissions import IsAuthenticated
 from .models import Profile, Avatar
 from .serializers import ProfileSerializer
+from .auth import MODEL_BACKEND, HashingBusy, RateLimited, authenticate_user, check_rate_limit, hash_password, run_hashing
+from .tokens import REFRESH, InvalidToken, issue_tokens, read_token, refresh_tokens, revoke, revoke_user_tokens
+from .cache import PROFILE_CACHE_TIMEOUT, bump_profile_version, profile_cache_key
+from product.cart import claim_anonymous_cart, attach_cart_to_user
+
+def throttled_response(exc):
+    if isinstance(exc, RateLimited):
+        return Response({"error": str(exc)}, status=status.HTTP_429_TOO_MANY_REQUESTS,
+                        headers={'Retry-After': str(exc.retry_after)})
+    return Response({"error": str(exc)}, status=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    headers={'Retry-After': '1'})
+
 
 class SignInView(APIView):
     def post(self, request):
@@ -19,13 +34,57 @@ class SignInView(APIView):
         username = user_data.get("username")
         password = user_data.get("password")
 
-        user = authenticate(request, username=username, password=password)
+        try:
+            user = authenticate_user(request, username, password)
+        except (RateLimited, HashingBusy) as e:
+            return throttled_response(e)
         if user is not None:
+            anonymous_cart = claim_anonymous_cart(request)
             login(request, user)
+            attach_cart_to_user(request, anonymous_cart)
             return Response(status=status.HTTP_201_CREATED)
         return Response(status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+class TokenObtainView(APIView):
+    authentication_classes = []
+
+    def post(self, request):
+        """Выдает access и refresh токены по логину и паролю"""
+        try:
+            user = authenticate_user(request, request.data.get('username'), request.data.get('password'))
+        except (RateLimited, HashingBusy) as e:
+            return throttled_response(e)
+        if user is None:
+            return Response({"error": "Invalid credentials"}, status=status.HTTP_401_UNAUTHORIZED)
+        return Response(issue_tokens(user), status=status.HTTP_201_CREATED)
+
+
+class TokenRefreshView(APIView):
+    authentication_classes = []
+
+    def post(self, request):
+        """Меняет refresh токен на новую пару"""
+        try:
+            return Response(refresh_tokens(request.data.get('refresh', '')))
+        except InvalidToken as e:
+            return Response({"error": str(e)}, status=status.HTTP_401_UNAUTHORIZED)
+
+
+class TokenRevokeView(APIView):
+    authentication_classes = []
+
+    def post(self, request):
+        """Отзывает refresh токен и текущий access токен"""
+        try:
+            revoke(read_token(request.data.get('refresh', ''), REFRESH))
+        except InvalidToken as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        if request._request.auth_token is not None:
+            revoke(request._request.auth_token)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
 class SignUpView(APIView):
     def post(self, request):
         """Регистрация пользователя"""
@@ -36,12 +95,18 @@ class SignUpView(APIView):
         name = user_data.get("name")
 
         try:
-            user = User.objects.create_user(username=username, password=password)
+            check_rate_limit(request, username)
+            user = User.objects.create(
+                username=User.normalize_username(username),
+                password=hash_password(password),
+            )
             profile = Profile.objects.create(user=user, fullName=name)
-            user = authenticate(request, username=username, password=password)
-            if user is not None:
-                login(request, user)
+            anonymous_cart = claim_anonymous_cart(request)
+            login(request, user, backend=MODEL_BACKEND)
+            attach_cart_to_user(request, anonymous_cart)
             return Response(status=status.HTTP_201_CREATED)
+        except (RateLimited, HashingBusy) as e:
+            return throttled_response(e)
         except Exception as e:
             return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
@@ -56,11 +121,13 @@ class UpdatePasswordView(APIView):
 
         user = request.user
 
-        if not user.check_password(current_password):
-            return Response({"error": "Incorrect current password"}, status=status.HTTP_400_BAD_REQUEST)
-
-        user.set_password(new_password)
-        user.save()
+        try:
+            if not run_hashing(check_password, current_password, user.password):
+                return Response({"error": "Incorrect current password"}, status=status.HTTP_400_BAD_REQUEST)
+            user.password = hash_password(new_password)
+        except HashingBusy as e:
+            return throttled_response(e)
+        user.save(update_fields=['password'])
 
         return Response({"message": "Password updated successfully"}, status=status.HTTP_200_OK)
 
@@ -70,40 +137,52 @@ class ProfileView(APIView):
 
     def get(self, request):
         """Возвращает профиль пользователя"""
-        profile = Profile.objects.get(user=request.user)
-        serializer = ProfileSerializer(profile, context={'request': request})
-        return Response(serializer.data)
+        key = profile_cache_key(request.user.id, request.get_host())
+        data = cache.get(key)
+        if data is None:
+            profile = Profile.objects.select_related('avatar').get(user=request.user)
+            data = ProfileSerializer(profile, context={'request': request}).data
+            cache.set(key, data, PROFILE_CACHE_TIMEOUT)
+        return Response(data)
 
     def post(self, request):
         """Обновляет профиль пользователя"""
         user = request.user
-        profile = Profile.objects.get(user=user)
-
         current_password = request.data.get('currentPassword')
         new_password = request.data.get('newPassword')
+        password_hash = None
         if current_password and new_password:
-            if not user.check_password(current_password):
-                return Response({"error": "Incorrect current password"}, status=status.HTTP_400_BAD_REQUEST)
-            user.set_password(new_password)
-            user.save()
-
-        if 'email' in request.data:
-            profile.email = request.data['email']
-            profile.save()
-
-        profile.fullName = request.data.get('fullName', profile.fullName)
-        profile.phone = request.data.get('phone', profile.phone)
-
-        avatar = request.FILES.get('avatar')
-        if avatar:
-            if profile.avatar is None:
-                profile.avatar = Avatar.objects.create(src=avatar, alt="User Avatar")
-            else:
-                profile.avatar.src = avatar
-                profile.avatar.save()
-            profile.save()
-
-        profile.save()
+            try:
+                if not run_hashing(check_password, current_password, user.password):
+                    return Response({"error": "Incorrect current password"}, status=status.HTTP_400_BAD_REQUEST)
+                password_hash = hash_password(new_password)
+            except HashingBusy as e:
+                return throttled_response(e)
+
+        with transaction.atomic():
+            profile = Profile.objects.select_related('avatar').get(user=user)
+            if password_hash:
+                user.password = password_hash
+                user.save(update_fields=['password'])
+
+            update_fields = []
+            for field in ('email', 'fullName', 'phone'):
+                if field in request.data:
+                    setattr(profile, field, request.data[field])
+                    update_fields.append(field)
+
+            avatar = request.FILES.get('avatar')
+            if avatar:
+                if profile.avatar is None:
+                    profile.avatar = Avatar.objects.create(src=avatar, alt="User Avatar")
+                    update_fields.append('avatar')
+                else:
+                    profile.avatar.src = avatar
+                    profile.avatar.save(update_fields=['src'])
+
+            if update_fields:
+                profile.save(update_fields=update_fields)
+            transaction.on_commit(lambda: bump_profile_version(user.id))
         return Response(ProfileSerializer(profile, context={'request': request}).data)
 
 
@@ -113,22 +192,22 @@ class ProfileAvatarView(APIView):
 
     def post(self, request):
         """Обновляет аватар пользователя"""
-        profile = Profile.objects.get(user=request.user)
-
         avatar = request.FILES.get('avatar')
+        if not avatar:
+            return Response({"error": "No avatar uploaded"}, status=status.HTTP_400_BAD_REQUEST)
 
-        if avatar:
+        with transaction.atomic():
+            profile = Profile.objects.select_related('avatar').get(user=request.user)
             if not profile.avatar:
-                avatar_instance = Avatar.objects.create(src=avatar, alt="User Avatar")
-                profile.avatar = avatar_instance
+                profile.avatar = Avatar.objects.create(src=avatar, alt="User Avatar")
+                profile.save(update_fields=['avatar'])
             else:
                 profile.avatar.src = avatar
                 profile.avatar.alt = "Updated User Avatar"
-            profile.avatar.save()
-            profile.save()
-            return Response({"message": "Avatar updated successfully"}, status=status.HTTP_200_OK)
-
-        return Response({"error": "No avatar uploaded"}, status=status.HTTP_400_BAD_REQUEST)
+                profile.avatar.save(update_fields=['src', 'alt'])
+            user_id = request.user.id
+            transaction.on_commit(lambda: bump_profile_version(user_id))
+        return Response({"message": "Avatar updated successfully"}, status=status.HTTP_200_OK)
 
 
 def signUp(request):
@@ -138,8 +217,11 @@ def signUp(request):
             username = body.get('username')
             email = body.get('email')
             password = body.get('password')
-            user = User.objects.create_user(username=username, email=email, password=password)
-            user.save()
+            user = User.objects.create(
+                username=User.normalize_username(username),
+                email=User.objects.normalize_email(email),
+                password=hash_password(password),
+            )
             profile = Profile.objects.create(user=user, fullName=username)
             profile.save()
 
@@ -151,5 +233,7 @@ def signUp(request):
 
 def signOut(request):
     """Разлогинивание пользователя"""
+    if request.user.is_authenticated:
+        revoke_user_tokens(request.user.pk)
     logout(request)
-    return Response(status=status.HTTP_200_OK)
\ No newline at end of file
+    return HttpResponse(status=200)
\ No newline at end of file